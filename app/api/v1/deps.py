@@ -1,11 +1,19 @@
-from fastapi import HTTPException, status
+import hmac
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import ValidationError
+
+from app.core.admission import AdmissionRejected, AdmissionTicket, get_admission_controller, retry_after_header
+from app.core.config import settings
+from app.core.security import InvalidTokenError, get_token_verifier, user_profile_cache
+from app.db.repository import get_repository
 from app.models.user import User # Assuming User model has user_id
 
 # --- Placeholder Authentication Dependency ---
-# This is a temporary placeholder. In a real application, this would involve:
-# - Extracting a Firebase ID token from the request Authorization header.
-# - Verifying the token using firebase_admin.auth.verify_id_token().
-# - Optionally, fetching user details from Firestore based on the decoded token's UID.
+# Development-only stand-in for get_current_user (below), used when AUTH_DEV_BYPASS is enabled.
 
 async def get_current_user_placeholder() -> User:
     """
@@ -26,71 +34,103 @@ async def get_current_user_placeholder() -> User:
         created_at="2023-01-01T12:00:00Z" # Needs to be a valid ISO 8601 datetime string or datetime object
     )
 
-# --- Actual Firebase Auth Dependency (to be implemented later) ---
-# from fastapi import Depends, Security
-# from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-# import firebase_admin
-# from firebase_admin import auth
-# from app.core.config import settings # If needed for specific settings
-# from app.db.firestore import get_firestore_client # If you fetch user from DB
-
-# oauth2_scheme = HTTPBearer()
-
-# async def get_current_user(token: HTTPAuthorizationCredentials = Security(oauth2_scheme)) -> User:
-#     if not token:
-#         raise HTTPException(
-#             status_code=status.HTTP_403_FORBIDDEN,
-#             detail="Not authenticated - No token provided",
-#             headers={"WWW-Authenticate": "Bearer"},
-#         )
-    
-#     id_token = token.credentials
-#     try:
-#         decoded_token = auth.verify_id_token(id_token)
-#         uid = decoded_token['uid']
-        
-        # Option 1: Return a User model based only on token data
-        # return User(
-        #     user_id=uid,
-        #     email=decoded_token.get('email'),
-        #     display_name=decoded_token.get('name'),
-        #     # photo_url=decoded_token.get('picture') # if available in token
-        #     # created_at will not be available from token, needs db fetch or omit for this model instance
-        # )
-
-        # Option 2: Fetch full user profile from Firestore (preferred for more details)
-#         db = get_firestore_client()
-#         user_ref = db.collection("users").document(uid)
-#         user_doc = user_ref.get()
-#         if user_doc.exists:
-#             user_data = user_doc.to_dict()
-#             # Ensure created_at is a datetime object if fetched from Firestore as a Timestamp
-#             # Pydantic should handle the conversion if the type hint is datetime
-#             return User(user_id=uid, **user_data)
-#         else:
-            # This case means a user exists in Firebase Auth but not in your Firestore user collection.
-            # You might want to create it here, or raise an error.
-#             raise HTTPException(
-#                 status_code=status.HTTP_404_NOT_FOUND, 
-#                 detail=f"User with ID {uid} not found in Firestore."
-#             )
-
-#     except firebase_admin.auth.RevokedIdTokenError:
-#         raise HTTPException(
-#             status_code=status.HTTP_401_UNAUTHORIZED,
-#             detail="Token revoked, user is signed out",
-#             headers={"WWW-Authenticate": "Bearer"},
-#         )
-#     except firebase_admin.auth.UserDisabledError:
-#         raise HTTPException(
-#             status_code=status.HTTP_403_FORBIDDEN,
-#             detail="User account has been disabled",
-#             headers={"WWW-Authenticate": "Bearer"},
-#         )
-#     except (firebase_admin.auth.InvalidIdTokenError, Exception) as e:
-#         print(f"Token verification failed: {e}")
-#         raise HTTPException(
-#             status_code=status.HTTP_403_FORBIDDEN,
-#             detail="Could not validate credentials: Invalid token",
-#             headers={"WWW-Authenticate": "Bearer"},
-#         )
+# --- Firebase Auth Dependency ---
+# Verification and caching live in app.core.security: signing keys are cached until they expire,
+# verified tokens until their `exp`, and user profiles for AUTH_USER_CACHE_TTL_SECONDS.
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def _load_user_profile(uid: str, claims: Dict[str, Any]) -> User:
+    cached_user = user_profile_cache.get(uid)
+    if cached_user is not None:
+        return cached_user
+
+    # Full profile from users/{uid}
+    user_data = await get_repository().get_user(uid)
+    try:
+        if user_data is not None:
+            # Pydantic handles Firestore Timestamps for the datetime fields
+            user = User(**{**user_data, "user_id": uid})
+        else:
+            # Fall back to the token claims: the user exists in Firebase Auth but has no stored profile yet.
+            auth_time = claims.get("auth_time") or claims.get("iat")
+            user = User(
+                user_id=uid,
+                email=claims.get("email"),
+                display_name=claims.get("name"),
+                photo_url=claims.get("picture"),
+                created_at=datetime.fromtimestamp(auth_time, tz=timezone.utc),
+            )
+    except ValidationError as e:
+        print(f"Could not build user profile for {uid}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User profile is incomplete (an email address is required)",
+        )
+    user_profile_cache.set(uid, user)
+    return user
+
+async def get_current_user(token: Optional[HTTPAuthorizationCredentials] = Security(bearer_scheme)) -> User:
+    if settings.AUTH_DEV_BYPASS:
+        return await get_current_user_placeholder()
+
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated - No token provided",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    try:
+        claims = await get_token_verifier().verify(token.credentials)
+    except InvalidTokenError as e:
+        print(f"Token verification failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials: Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except Exception as e:
+        # E.g. the signing keys could not be fetched; not the client's fault.
+        print(f"Token verification unavailable: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is temporarily unavailable",
+        )
+
+    return await _load_user_profile(claims["uid"], claims)
+
+# --- Operational endpoints ---
+
+async def require_ops_access(token: Optional[HTTPAuthorizationCredentials] = Security(bearer_scheme)):
+    """
+    Guards /metrics and /api/v1/system/*: they expose queue depths, cache contents and upstream state,
+    so they are hidden unless OPS_ENDPOINTS_ENABLED, and need METRICS_TOKEN as a bearer token if one is set.
+    """
+    if not settings.OPS_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if settings.METRICS_TOKEN and (
+        token is None or not hmac.compare_digest(token.credentials.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8"))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+# --- Admission control ---
+
+async def admit_generation(user: User, cost: int = 1) -> AdmissionTicket:
+    """
+    Admits `cost` notebook generations for the user (see app.core.admission), or fails fast with
+    429 (user rate limit) / 503 (service saturated) and a Retry-After header.
+    """
+    try:
+        return await get_admission_controller().admit(user.user_id, cost)
+    except AdmissionRejected as e:
+        retry_after = retry_after_header(e.retry_after)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": retry_after} if retry_after else None,
+        )
@@ -0,0 +1,75 @@
+import re
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.api.v1.responses import etag_matches, immutable_file_response
+from app.services.image_store import get_image_store, is_asset_id
+from app.services.image_variants import get_variant_service
+
+router = APIRouter()
+
+# Images are content-addressed, so a URL always returns the same bytes: cache forever.
+IMMUTABLE = "public, max-age=31536000, immutable"
+VARIANT_NAME = re.compile(r"^(\d{1,5})\.([a-z]+)$") # "{width}.{extension}", e.g. "640.webp"
+
+def _not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+@router.get("/{asset_id}", responses={304: {"description": "Not modified"}, 404: {"description": "Unknown image"}})
+async def get_image(asset_id: str, request: Request):
+    """
+    A stored copy of a validated image (see app.services.image_store). Public: these URLs are
+    embedded in notebook pages.
+    """
+    store = get_image_store()
+    if store is None or not is_asset_id(asset_id):
+        raise _not_found()
+
+    etag = f'"{asset_id}"'
+    headers = {"Cache-Control": IMMUTABLE}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": etag})
+
+    asset = await store.get_asset(asset_id)
+    if asset is None:
+        raise _not_found()
+    path = store.blobs.local_path(asset_id)
+    if path is not None:
+        return await immutable_file_response(request, path, asset["content_type"], etag, headers)
+    data = await store.blobs.get(asset_id)
+    if data is None:
+        raise _not_found()
+    return Response(content=data, media_type=asset["content_type"], headers={**headers, "ETag": etag})
+
+@router.get("/{asset_id}/{variant}", responses={304: {"description": "Not modified"}, 404: {"description": "Unknown image or format"}})
+async def get_image_variant(asset_id: str, variant: str, request: Request):
+    """
+    The image scaled down to a width bucket and re-encoded, e.g. /images/{id}/640.webp
+    (webp, jpg, or avif where the server supports it). Encoded on first request, then served
+    from the disk cache; supports Range and conditional requests.
+    """
+    service = get_variant_service()
+    match = VARIANT_NAME.match(variant)
+    if service is None or match is None or not is_asset_id(asset_id):
+        raise _not_found()
+    width, extension = int(match.group(1)), match.group(2)
+
+    etag = f'"{asset_id}-{width}-{extension}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": IMMUTABLE})
+    for attempt in range(2):
+        try:
+            found = await service.get_variant(asset_id, width, extension)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except FileNotFoundError:
+            raise _not_found()
+        if found is None:
+            raise _not_found()
+        path, media_type = found
+        try:
+            return await immutable_file_response(request, path, media_type, etag, {"Cache-Control": IMMUTABLE})
+        except FileNotFoundError:
+            # Evicted from the disk cache before we opened it (e.g. by another request's render): encode it again
+            if attempt:
+                raise _not_found()
@@ -0,0 +1,109 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.background import scheduler as scheduler_module
+from app.background.notebook_tasks import validation_batcher
+from app.core import admission, events, http_clients
+from app.core.metrics import registry
+from app.core.resilience import CircuitBreaker, upstream_clients
+from app.db.read_cache import document_cache
+from app.services.ai.llm import llm_service
+from app.services.ai.image_scraper import image_scraper_service
+from app.services.ai.image_validator import image_validator_service
+
+router = APIRouter()
+
+# Gauges and counters kept elsewhere as plain attributes/stats, read at scrape time.
+
+def _stage_stat(key: str):
+    def collect():
+        scheduler = scheduler_module.scheduler
+        if scheduler is None:
+            return []
+        return [((stage.value,), pool.stats()[key]) for stage, pool in scheduler.pools.items()]
+    return collect
+
+registry.gauge_callback("mineshear_stage_queue_depth", "Jobs waiting per stage.", ["stage"], _stage_stat("queue_depth"))
+registry.gauge_callback("mineshear_stage_busy_workers", "Workers currently running a job, per stage.", ["stage"], _stage_stat("busy"))
+registry.gauge_callback("mineshear_stage_workers", "Worker pool size per stage.", ["stage"], _stage_stat("workers"))
+registry.gauge_callback(
+    "mineshear_pipelines_in_flight", "Notebook pipelines currently running.", [],
+    lambda: [((), scheduler_module.scheduler.in_flight if scheduler_module.scheduler else 0)],
+)
+registry.gauge_callback(
+    "mineshear_validation_batch_pending", "Images waiting for the next validation batch.", [],
+    lambda: [((), validation_batcher.stats()["pending"])],
+)
+registry.gauge_callback(
+    "mineshear_event_subscribers", "Open task event subscriptions (SSE streams).", [],
+    lambda: [((), events.event_bus.stats()["subscribers"] if events.event_bus else 0)],
+)
+
+def _cache_stats():
+    return {
+        "llm": llm_service.cache_stats(),
+        "image_scrape": image_scraper_service.cache_stats(),
+        "image_validation": image_validator_service.cache_stats(),
+        "documents": document_cache.stats(),
+    }
+
+registry.counter_callback(
+    "mineshear_cache_hits_total", "Cache hits per cache.", ["cache"],
+    lambda: [((name,), stats.get("hits", 0)) for name, stats in _cache_stats().items()],
+)
+registry.counter_callback(
+    "mineshear_cache_misses_total", "Cache misses per cache.", ["cache"],
+    lambda: [((name,), stats.get("misses", 0)) for name, stats in _cache_stats().items()],
+)
+
+registry.counter_callback(
+    "mineshear_upstream_calls_total", "Calls that reached the LLM or the validation model (cache misses).", ["service"],
+    lambda: [(("llm",), llm_service.upstream_calls), (("image_validation",), image_validator_service.model_calls)],
+)
+
+registry.counter_callback(
+    "mineshear_admission_admitted_total", "Notebook generations admitted by admission control.", [],
+    lambda: [((), admission.admission_controller.admitted if admission.admission_controller else 0)],
+)
+
+BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+registry.gauge_callback(
+    "mineshear_upstream_circuit_state", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).", ["upstream"],
+    lambda: [((name,), BREAKER_STATES[client.breaker.state]) for name, client in upstream_clients.items()],
+)
+registry.gauge_callback(
+    "mineshear_upstream_concurrency_limit", "Current adaptive concurrency limit per upstream.", ["upstream"],
+    lambda: [((name,), int(client.limiter.limit)) for name, client in upstream_clients.items()],
+)
+registry.gauge_callback(
+    "mineshear_upstream_in_flight", "Calls currently running against each upstream.", ["upstream"],
+    lambda: [((name,), client.limiter.in_flight) for name, client in upstream_clients.items()],
+)
+
+def _http_stats():
+    return http_clients.http_clients.stats() if http_clients.http_clients else {}
+
+registry.counter_callback(
+    "mineshear_http_requests_total", "Requests sent through each upstream's pooled HTTP client.", ["upstream"],
+    lambda: [((name,), stats["requests"]) for name, stats in _http_stats().items()],
+)
+registry.counter_callback(
+    "mineshear_http_connections_opened_total", "New connections opened per upstream (requests minus this were served on reused connections).", ["upstream"],
+    lambda: [((name,), stats["new_connections"]) for name, stats in _http_stats().items()],
+)
+registry.gauge_callback(
+    "mineshear_http_pool_active_connections", "Connections currently serving a request, per upstream pool.", ["upstream"],
+    lambda: [((name,), stats["pool"]["active"]) for name, stats in _http_stats().items()],
+)
+registry.gauge_callback(
+    "mineshear_http_pool_idle_connections", "Kept-alive idle connections, per upstream pool.", ["upstream"],
+    lambda: [((name,), stats["pool"]["idle"]) for name, stats in _http_stats().items()],
+)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """
+    Prometheus text exposition of stage latencies, Firestore latencies, queue depths and cache counters.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,18 +1,51 @@
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from pydantic import BaseModel, field_validator
 
-from app.models.notebook import Notebook # For response model hint
-from app.models.task import Task # For response model hint
+from app.core.config import settings
+from app.models.batch import BatchItem, NotebookBatchStatus
+
+from app.models.notebook import Notebook, NotebookContent, NotebookPage, NotebookStatus # For response model hint
+from app.models.task import Task, TaskStatus # For response model hint
 from app.services import notebook_service # Import the service
+from app.services.listing import InvalidCursorError
+from app.api.v1.responses import conditional_json_response
 
-# Placeholder for authentication dependency
-from app.api.v1.deps import get_current_user_placeholder # Using placeholder for now
+from app.api.v1.deps import admit_generation, get_current_user # Firebase ID token auth
 from app.models.user import User # For type hinting current_user
 
 router = APIRouter()
 
 class NotebookGenerateRequest(BaseModel):
     topic: str
+    bypass_cache: bool = False # Force a fresh LLM generation instead of reusing a cached one for this topic
+
+class NotebookBatchGenerateRequest(BaseModel):
+    topics: List[str]
+    bypass_cache: bool = False
+
+    @field_validator("topics")
+    @classmethod
+    def validate_topics(cls, topics: List[str]) -> List[str]:
+        # All topics are checked before anything is written, so a bad topic rejects the whole batch.
+        if not topics:
+            raise ValueError("At least one topic is required")
+        if len(topics) > settings.BULK_GENERATE_MAX_TOPICS:
+            raise ValueError(f"At most {settings.BULK_GENERATE_MAX_TOPICS} topics can be submitted at once")
+        cleaned = [topic.strip() for topic in topics]
+        for i, topic in enumerate(cleaned):
+            if not topic:
+                raise ValueError(f"Topic {i} is empty")
+            if len(topic) > settings.NOTEBOOK_TOPIC_MAX_LENGTH:
+                raise ValueError(f"Topic {i} is longer than {settings.NOTEBOOK_TOPIC_MAX_LENGTH} characters")
+        return cleaned
+
+class NotebookBatchGenerateResponse(BaseModel):
+    batch_id: str
+    items: List[BatchItem] # Same order as the submitted topics
+    notebook_initial_status: str
+    task_initial_status: str
 
 class NotebookGenerateResponse(BaseModel):
     task_id: str
@@ -23,16 +56,17 @@ class NotebookGenerateResponse(BaseModel):
 
 @router.post("/generate", 
              response_model=NotebookGenerateResponse, 
-             status_code=status.HTTP_202_ACCEPTED)
+             status_code=status.HTTP_202_ACCEPTED,
+             responses={429: {"description": "Per-user rate limit exceeded (see Retry-After)"},
+                        503: {"description": "Too many generations in progress (see Retry-After)"}})
 async def generate_notebook_request(
     request_data: NotebookGenerateRequest,
-    background_tasks: BackgroundTasks,
-    # Use the placeholder dependency for now. Replace with actual Firebase auth dep later.
-    current_user: User = Depends(get_current_user_placeholder) 
+    current_user: User = Depends(get_current_user)
 ):
     """
     Accepts a topic, creates a task and a notebook document,
-    and triggers a background task for notebook generation.
+    and submits the notebook generation pipeline to the background scheduler.
+    Subject to admission control: 429 or 503 with Retry-After when over the limits.
     """
     if not current_user or not current_user.user_id:
         # This check is more for verbosity with the placeholder.
@@ -45,14 +79,17 @@ async def generate_notebook_request(
     
     user_id = current_user.user_id
     print(f"User {user_id} requested to generate notebook for topic: {request_data.topic}")
+    ticket = await admit_generation(current_user) # Rejected requests never touch the database
 
     try:
         created_notebook, created_task = await notebook_service.create_notebook_and_task(
             topic=request_data.topic, 
             user_id=user_id,
-            background_tasks=background_tasks
+            bypass_cache=request_data.bypass_cache,
+            ticket=ticket
         )
     except Exception as e:
+        await ticket.release()
         # Handle exceptions from the service layer, e.g., Firestore connection issues
         print(f"Error calling notebook_service.create_notebook_and_task: {e}")
         raise HTTPException(
@@ -69,16 +106,115 @@ async def generate_notebook_request(
         task_initial_status=created_task.status.value
     )
 
-# GET /api/v1/notebooks/{notebook_id} - To fetch notebook status/content
-@router.get("/{notebook_id}", response_model=Notebook)
+@router.post("/generate/batch",
+             response_model=NotebookBatchGenerateResponse,
+             status_code=status.HTTP_202_ACCEPTED,
+             responses={429: {"description": "Per-user rate limit exceeded (see Retry-After)"},
+                        503: {"description": "Too many generations in progress (see Retry-After)"}})
+async def generate_notebook_batch_request(
+    request_data: NotebookBatchGenerateRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Accepts many topics at once, creates all notebook and task documents with chunked
+    batch writes and submits every generation pipeline under a single batch ID.
+    Track progress with GET /notebooks/batches/{batch_id}.
+    Each topic counts against the user's rate limit; the batch is admitted or rejected as a whole.
+    A batch larger than the rate limit's burst is admitted once the user's allowance is full.
+    """
+    user_id = current_user.user_id
+    print(f"User {user_id} requested a batch of {len(request_data.topics)} notebooks")
+    ticket = await admit_generation(current_user, cost=len(request_data.topics))
+
+    try:
+        batch = await notebook_service.create_notebook_batch(
+            topics=request_data.topics,
+            user_id=user_id,
+            bypass_cache=request_data.bypass_cache,
+            ticket=ticket
+        )
+    except Exception as e:
+        await ticket.release()
+        print(f"Error calling notebook_service.create_notebook_batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to initiate batch notebook generation: {str(e)}"
+        )
+
+    return NotebookBatchGenerateResponse(
+        batch_id=batch.batch_id,
+        items=batch.items,
+        notebook_initial_status=NotebookStatus.PENDING.value,
+        task_initial_status=TaskStatus.PENDING.value
+    )
+
+# GET /api/v1/notebooks/batches/{batch_id} - Aggregated progress of a batch, one request instead of N task polls
+@router.get("/batches/{batch_id}", response_model=NotebookBatchStatus, responses={304: {"description": "Not modified since the given ETag"}})
+async def get_notebook_batch_status(
+    batch_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    document = await notebook_service.get_batch_status(batch_id=batch_id, user_id=current_user.user_id)
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found or access denied")
+    return conditional_json_response(request, document)
+
+# GET /api/v1/notebooks - Paginated listing (summaries only, no notebook content)
+@router.get("", response_model=NotebookPage)
+async def list_notebooks(
+    limit: int = Query(settings.LIST_PAGE_SIZE_DEFAULT, ge=1, le=settings.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status_filter: Optional[NotebookStatus] = Query(None, alias="status"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        return await notebook_service.list_notebooks(
+            user_id=current_user.user_id,
+            limit=limit,
+            cursor=cursor,
+            status=status_filter,
+            created_after=created_after,
+            created_before=created_before
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# GET /api/v1/notebooks/{notebook_id} - To fetch notebook status (and, on request, content)
+# Supports conditional polling: send the last ETag in If-None-Match to get 304 when nothing changed.
+@router.get("/{notebook_id}", response_model=Notebook, responses={304: {"description": "Not modified since the given ETag"}})
 async def get_notebook(
     notebook_id: str,
-    current_user: User = Depends(get_current_user_placeholder)
+    request: Request,
+    include_content: bool = Query(False, description="Also load the notebook body (text, images, final content)"),
+    current_user: User = Depends(get_current_user)
 ):
+    """
+    Notebook metadata and status. The body is stored separately and only loaded with
+    include_content=true (or via GET /notebooks/{notebook_id}/content), so status polls stay
+    small no matter how long the notebook is.
+    """
     if not current_user or not current_user.user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
 
-    notebook = await notebook_service.get_notebook_by_id(notebook_id=notebook_id, user_id=current_user.user_id)
-    if not notebook:
+    if include_content:
+        document = await notebook_service.get_notebook_with_content(notebook_id=notebook_id, user_id=current_user.user_id)
+    else:
+        document = await notebook_service.get_notebook_document(notebook_id=notebook_id, user_id=current_user.user_id)
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found or access denied")
+    return conditional_json_response(request, document)
+
+# GET /api/v1/notebooks/{notebook_id}/content - The notebook body only
+@router.get("/{notebook_id}/content", response_model=NotebookContent, responses={304: {"description": "Not modified since the given ETag"}})
+async def get_notebook_content(
+    notebook_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    document = await notebook_service.get_notebook_content_document(notebook_id=notebook_id, user_id=current_user.user_id)
+    if not document:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notebook not found or access denied")
-    return notebook
+    return conditional_json_response(request, document)
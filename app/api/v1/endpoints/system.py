@@ -0,0 +1,103 @@
+from fastapi import APIRouter
+
+from app.background.scheduler import current_scheduler
+from app.background.notebook_tasks import validation_batcher
+from app.core import security
+from app.core.admission import get_admission_controller
+from app.core.events import get_event_bus
+from app.core.http_clients import get_http_clients
+from app.core.resilience import upstream_clients
+from app.db.read_cache import document_cache
+from app.services.ai.llm import llm_service
+from app.services.ai.image_scraper import image_scraper_service
+from app.services.ai.image_validator import image_validator_service
+from app.services.image_store import get_image_store
+from app.services.image_variants import get_variant_service
+
+router = APIRouter()
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """
+    Queue depth, busy workers and utilization for each background pipeline stage
+    (empty when the scheduler isn't running, e.g. after shutdown).
+    """
+    scheduler = current_scheduler()
+    return scheduler.stats() if scheduler is not None else {}
+
+@router.get("/caches")
+async def get_cache_stats():
+    """
+    Hit/miss counters and sizes for the service-level caches.
+    """
+    return {
+        "llm": llm_service.cache_stats(),
+        "image_scrape": image_scraper_service.cache_stats(),
+        "image_validation": image_validator_service.cache_stats(),
+        "documents": document_cache.stats(),
+        "auth": {
+            "verifier": security.token_verifier.stats() if security.token_verifier else None,
+            "user_profiles": security.user_profile_cache.stats(),
+        },
+    }
+
+@router.get("/batching")
+async def get_batching_stats():
+    """
+    Micro-batching statistics for image validation.
+    """
+    return {
+        "image_validation": {
+            **validation_batcher.stats(),
+            "model_calls": image_validator_service.model_calls,
+        },
+    }
+
+@router.get("/validator")
+async def get_validator_stats():
+    """
+    Image validation backend: mock or local CLIP model (embedding cache hit rates, fetch errors).
+    """
+    return image_validator_service.backend_stats()
+
+@router.get("/events")
+async def get_event_bus_stats():
+    """
+    Task progress event bus: backend, published/dropped counts and live subscribers.
+    """
+    return (await get_event_bus()).stats()
+
+@router.get("/admission")
+async def get_admission_stats():
+    """
+    Admission control for notebook generation: limits, in-flight generations and store health.
+    """
+    return await get_admission_controller().stats()
+
+@router.get("/upstreams")
+async def get_upstream_stats():
+    """
+    Per upstream AI service: circuit breaker state, adaptive concurrency limit, retries and timeouts.
+    """
+    return {name: client.stats() for name, client in upstream_clients.items()}
+
+@router.get("/images")
+async def get_image_store_stats():
+    """
+    Image store: how ingested images were resolved (known source, exact or near duplicate, new)
+    and download counts; image variants: encodes and disk cache usage.
+    """
+    store = get_image_store()
+    if store is None:
+        return {"backend": "none"}
+    variants = get_variant_service()
+    return {**store.stats(), "variants": variants.stats() if variants is not None else None}
+
+@router.get("/http")
+async def get_http_client_stats():
+    """
+    Pooled HTTP clients per upstream: pool limits and utilization, requests and how many of them
+    had to open a new connection (connection_reuse_ratio).
+    """
+    registry = get_http_clients()
+    return registry.stats() if registry is not None else {}
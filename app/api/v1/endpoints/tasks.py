@@ -1,21 +1,57 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 
-from app.models.task import Task # Response model
+from app.core.config import settings
+from app.api.v1.responses import conditional_json_response
+from app.core.events import get_event_bus
+from app.models.event import TaskEvent, TaskEventType
+from app.models.task import Task, TaskPage, TaskStatus, ToolType # Response model
 from app.services import task_service # Import the new service
+from app.services.listing import InvalidCursorError
 
-# Placeholder for authentication dependency
-from app.api.v1.deps import get_current_user_placeholder
+from app.api.v1.deps import get_current_user # Firebase ID token auth
 from app.models.user import User # For type hinting current_user
 
 router = APIRouter()
 
-@router.get("/{task_id}", response_model=Task)
+@router.get("", response_model=TaskPage)
+async def list_tasks(
+    limit: int = Query(settings.LIST_PAGE_SIZE_DEFAULT, ge=1, le=settings.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status_filter: Optional[TaskStatus] = Query(None, alias="status"),
+    tool_type: Optional[ToolType] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The user's tasks, newest first, as summaries (no input payload). Page with `cursor`.
+    """
+    try:
+        return await task_service.list_tasks(
+            user_id=current_user.user_id,
+            limit=limit,
+            cursor=cursor,
+            status=status_filter,
+            tool_type=tool_type,
+            created_after=created_after,
+            created_before=created_before
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/{task_id}", response_model=Task, responses={304: {"description": "Not modified since the given ETag"}})
 async def get_task_status(
     task_id: str,
-    current_user: User = Depends(get_current_user_placeholder) # Use placeholder auth
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get the status and details of a specific task.
+    Supports conditional polling: send the last ETag in If-None-Match to get 304 when nothing changed.
     """
     if not current_user or not current_user.user_id:
         # This check is more for verbosity with the placeholder.
@@ -27,12 +63,87 @@ async def get_task_status(
         )
 
     user_id = current_user.user_id
-    task = await task_service.get_task_by_id(task_id=task_id, user_id=user_id)
+    document = await task_service.get_task_document(task_id=task_id, user_id=user_id)
 
-    if not task:
+    if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail=f"Task with ID {task_id} not found or access denied."
         )
     
-    return task
+    return conditional_json_response(request, document)
+
+def _format_sse(event: TaskEvent) -> str:
+    return f"event: {event.type.value}\ndata: {event.model_dump_json()}\n\n"
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-sent events stream of a task's progress: STATUS events for notebook/task transitions
+    (PROCESSING_TEXT, PROCESSING_IMAGES, COMPLETED, FAILED) and IMAGE events for each image
+    (FETCHED, VALIDATED, FAILED). The stream ends after the task completes or fails.
+    Replaces polling GET /tasks/{task_id}.
+    """
+    if not current_user or not current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
+
+    event_bus = await get_event_bus()
+    # Subscribe before reading the current state so no transition can slip in between. History is
+    # taken at the same moment (not replayed into the queue): its STATUS events predate the snapshot.
+    queue = event_bus.open_subscription(task_id, replay=False)
+    history = event_bus.history(task_id)
+    try:
+        found = await task_service.get_task_snapshot(task_id=task_id, user_id=current_user.user_id)
+    except BaseException:
+        event_bus.close_subscription(task_id, queue)
+        raise
+    if not found:
+        event_bus.close_subscription(task_id, queue)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task with ID {task_id} not found or access denied."
+        )
+    task, notebook_status = found
+
+    async def event_stream():
+        try:
+            # Initial snapshot, so clients don't need a separate GET to learn the current state.
+            snapshot = TaskEvent(
+                task_id=task.task_id,
+                notebook_id=task.result_document_id,
+                type=TaskEventType.STATUS,
+                notebook_status=notebook_status,
+                task_status=task.status.value,
+                error_message=task.error_message,
+            )
+            yield _format_sse(snapshot)
+            if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                return
+            # Image progress isn't part of the snapshot, so catch up on it; older status transitions are
+            # superseded, except a terminal one the snapshot missed (e.g. a write still in flight).
+            for event in history:
+                if event.type == TaskEventType.IMAGE or event.is_terminal:
+                    yield _format_sse(event)
+                if event.is_terminal:
+                    return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Comment line; keeps proxies from closing an idle stream
+                    continue
+                yield _format_sse(event)
+                if event.is_terminal:
+                    return
+        finally:
+            event_bus.close_subscription(task_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import re
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.db.read_cache import CachedDocument
+
+# Conditional GET support for polled documents (tasks, notebooks), and conditional/Range
+# responses for immutable files (images).
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+def conditional_json_response(request: Request, document: CachedDocument) -> Response:
+    """
+    Returns 304 Not Modified if the client already has this version, else the cached JSON body.
+    Either way the ETag is sent so the next poll can be conditional.
+    """
+    headers = {"ETag": document.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), document.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+def _byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end inclusive) for a single "bytes=" range; (size, size) if it is unsatisfiable.
+    None means serve the whole file (no header, multiple ranges or an unparsable one).
+    """
+    match = BYTE_RANGE.match(range_header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "": # Suffix range: the last N bytes
+        length = int(last)
+        return (max(0, size - length), size - 1) if length > 0 and size > 0 else (size, size)
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return (size, size)
+    return start, end
+
+def _read_range(f: BinaryIO, start: int, length: int) -> bytes:
+    f.seek(start)
+    return f.read(length)
+
+async def _iter_file(f: BinaryIO, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+async def immutable_file_response(request: Request, path: str, media_type: str, etag: str, headers: Dict[str, str]) -> Response:
+    """
+    Serves a file that never changes under its URL: 304 for a matching If-None-Match, 206 for a
+    single byte range (unless If-Range names another version), 416 for an unsatisfiable one.
+    The file is opened before control returns to the event loop, so a cache eviction (unlink) after
+    that doesn't affect the response; FileNotFoundError if it is already gone.
+    """
+    headers = {**headers, "ETag": etag, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    f: Optional[BinaryIO] = open(path, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            byte_range = _byte_range(range_header, size)
+            if byte_range == (size, size):
+                return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                body = await asyncio.to_thread(_read_range, f, start, end - start + 1)
+                return Response(
+                    content=body,
+                    status_code=status.HTTP_206_PARTIAL_CONTENT,
+                    media_type=media_type,
+                    headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+                )
+        response = StreamingResponse(_iter_file(f), media_type=media_type, headers={**headers, "Content-Length": str(size)})
+        f = None # Closed by _iter_file
+        return response
+    finally:
+        if f is not None:
+            f.close()
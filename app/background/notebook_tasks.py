@@ -1,122 +1,299 @@
 import time
 import asyncio
-from app.db.firestore import get_firestore_client
+from app.db.repository import get_repository
+from app.db.unit_of_work import NotebookTaskUnitOfWork
+from app.background.scheduler import Stage, get_scheduler
 from app.models.notebook import NotebookStatus, NotebookUpdate, ImageRequest
 from app.models.task import TaskStatus, TaskUpdate
+from app.core.config import settings
 from datetime import datetime
-import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+import functools
 
 from app.services.ai.llm import llm_service
 from app.services.ai.image_scraper import image_scraper_service
-from app.services.ai.image_validator import image_validator_service # Import the new image validator service
-
-def update_notebook_status(db, user_id: str, notebook_id: str, status: NotebookStatus, error_message: str = None):
-    notebook_ref = db.collection("users").document(user_id).collection("notebooks").document(notebook_id)
-    update_data = {"status": status.value, "updated_at": datetime.utcnow()}
-    if error_message: update_data["error_message"] = error_message
-    notebook_ref.update(update_data)
-    print(f"Notebook {notebook_id} status updated to {status.value}")
-
-def update_task_status(db, task_id: str, status: TaskStatus, error_message: str = None):
-    task_ref = db.collection("tasks").document(task_id)
-    update_data = {"status": status.value, "updated_at": datetime.utcnow()}
-    if error_message: update_data["error_message"] = error_message
-    task_ref.update(update_data)
-    print(f"Task {task_id} status updated to {status.value}")
-
-async def generate_notebook_content_task(task_id: str, user_id: str, notebook_id: str, topic: str):
+from app.services.ai.image_validator import image_validator_service, ValidationCandidate
+from app.services.image_store import get_image_store
+from app.services.image_variants import get_variant_service
+from app.core.batching import MicroBatcher
+from app.core.racing import race_candidates
+from app.services.placeholder_parser import IncrementalPlaceholderParser, Placeholder
+from app.services.notebook_compiler import CompiledNotebook, FailedImagePolicy, compile_notebook
+from app.core.events import get_event_bus
+from app.core.metrics import PIPELINE_DURATION, current_task_id, registry
+from app.models.event import TaskEvent, TaskEventType
+
+IMAGE_DURATION = registry.histogram(
+    "mineshear_image_processing_seconds", "Scrape plus validation time per image placeholder.", ["status"]
+)
+IMAGE_CANDIDATES = registry.counter(
+    "mineshear_image_candidates_total", "Scraped image candidates by race outcome (accepted, unused, rejected, cancelled).", ["outcome"]
+)
+
+async def _dispatch_validation_batch(batch: list) -> list:
+    # One VALIDATE stage job per batch, which may span several notebooks, so it belongs to no single task.
+    current_task_id.set(None) # Runs in the batcher's own asyncio task
+    return await get_scheduler().run(Stage.VALIDATE, image_validator_service.validate_images, batch)
+
+# Collects concurrent single-image validations from all pipelines into batched model calls.
+validation_batcher = MicroBatcher(
+    _dispatch_validation_batch,
+    max_batch_size=settings.IMAGE_VALIDATION_BATCH_MAX_SIZE,
+    max_wait_ms=settings.IMAGE_VALIDATION_BATCH_MAX_WAIT_MS,
+    name="image-validation",
+)
+
+async def publish_status_event(task_id: str, notebook_id: str, notebook_status: NotebookStatus, task_status: TaskStatus, error_message: str = None):
+    event_bus = await get_event_bus()
+    await event_bus.publish(TaskEvent(
+        task_id=task_id,
+        notebook_id=notebook_id,
+        type=TaskEventType.STATUS,
+        notebook_status=notebook_status.value,
+        task_status=task_status.value,
+        error_message=error_message,
+    ))
+
+async def publish_image_event(task_id: str, notebook_id: str, image_index: int, image_request: ImageRequest):
+    event_bus = await get_event_bus()
+    await event_bus.publish(TaskEvent(
+        task_id=task_id,
+        notebook_id=notebook_id,
+        type=TaskEventType.IMAGE,
+        image_index=image_index,
+        image=image_request.model_copy(),
+        error_message=image_request.error_message,
+    ))
+
+async def _validate_candidate(url: str, query: str, text_context: str) -> Tuple[bool, Optional[str]]:
+    # Via the micro-batcher, batched with other in-flight images
+    return await validation_batcher.submit(ValidationCandidate(
+        image_url=url,
+        text_context=text_context, # Pass full text for context
+        query_context=query
+    ))
+
+async def _store_validated_image(image_request: ImageRequest):
+    """
+    Swaps the validated URL for our own copy if the image store is enabled (a resized variant, plus
+    a srcset, if image variants are too). Keeps the remote URL if storing fails.
+    """
+    store = get_image_store()
+    if store is None:
+        return
+    try:
+        asset_id = await get_scheduler().run(Stage.SCRAPE, store.ingest, image_request.validated_image_url)
+    except Exception as e:
+        print(f"Could not store image {image_request.validated_image_url}: {e}")
+        return
+    asset = await store.get_asset(asset_id) or {}
+    image_request.asset_id = asset_id
+    image_request.width, image_request.height = asset.get("width"), asset.get("height")
+    image_request.validated_image_url = store.url_for(asset_id)
+    variants = get_variant_service()
+    if variants is not None:
+        image_request.validated_image_url = variants.src(asset_id, image_request.width)
+        image_request.srcset = variants.srcset(asset_id, image_request.width)
+
+async def process_image_query(
+    query: str,
+    text_context: str,
+    notebook_semaphore: asyncio.Semaphore,
+    on_progress: Optional[Callable[[ImageRequest], Awaitable[None]]] = None,
+) -> ImageRequest:
+    """
+    Scrapes IMAGE_CANDIDATES candidates for a single image placeholder as a SCRAPE stage job,
+    then races their validations through the micro-batcher (which dispatches VALIDATE stage jobs):
+    the first candidate that validates wins and the others are cancelled (see app.core.racing).
+    Never raises: failures are recorded on the returned ImageRequest so sibling queries are unaffected.
+    The per-notebook semaphore bounds this notebook's fan-out; the stage pools bound it worker-wide.
+    `on_progress` is awaited with the request once it is FETCHED and again when it is final.
+    """
+    scheduler = get_scheduler()
+    current_image_request = ImageRequest(query=query, status="PENDING")
+    started = time.perf_counter()
+    budget = settings.IMAGE_QUERY_BUDGET_SECONDS or None
+    async with notebook_semaphore:
+        try:
+            scraped_urls = await asyncio.wait_for(
+                scheduler.run(Stage.SCRAPE, image_scraper_service.scrape_images, query, count=max(1, settings.IMAGE_CANDIDATES)),
+                budget,
+            )
+
+            if scraped_urls:
+                current_image_request.original_url = scraped_urls[0]
+                current_image_request.status = "FETCHED"
+                print(f"Image fetched for '{query}': {len(scraped_urls)} candidates, first {current_image_request.original_url}")
+                if on_progress: await on_progress(current_image_request)
+
+                race = await race_candidates(
+                    scraped_urls,
+                    functools.partial(_validate_candidate, query=query, text_context=text_context),
+                    accept=lambda verdict: verdict[0] and bool(verdict[1]),
+                    hedge_delay=settings.IMAGE_CANDIDATE_HEDGE_DELAY_SECONDS,
+                    budget=budget - (time.perf_counter() - started) if budget else None,
+                )
+                IMAGE_CANDIDATES.inc(1 if race.winner is not None else 0, outcome="accepted")
+                IMAGE_CANDIDATES.inc(race.unused, outcome="unused")
+                IMAGE_CANDIDATES.inc(race.rejected, outcome="rejected")
+                IMAGE_CANDIDATES.inc(race.cancelled, outcome="cancelled")
+
+                if race.winner is not None:
+                    current_image_request.original_url = scraped_urls[race.winner]
+                    current_image_request.validated_image_url = race.result[1]
+                    await _store_validated_image(current_image_request)
+                    current_image_request.status = "VALIDATED"
+                    print(f"Image validated for '{query}' (candidate {race.winner + 1} of {len(scraped_urls)}): {current_image_request.validated_image_url}")
+                else:
+                    current_image_request.status = "FAILED"
+                    if race.timed_out:
+                        current_image_request.error_message = f"No image validated within {settings.IMAGE_QUERY_BUDGET_SECONDS:g}s"
+                    elif race.errors and len(race.errors) == race.started:
+                        current_image_request.error_message = str(race.errors[-1])
+                    else:
+                        current_image_request.error_message = "Image validation failed or not suitable"
+                    print(f"Image validation failed for '{query}' ({race.started} candidates tried): {current_image_request.error_message}")
+            else:
+                current_image_request.status = "FAILED"
+                current_image_request.error_message = "No images found by scraper"
+                print(f"No images found by scraper for '{query}'")
+
+        except asyncio.TimeoutError:
+            print(f"Scraping '{query}' exceeded the {settings.IMAGE_QUERY_BUDGET_SECONDS:g}s image budget")
+            current_image_request.status = "FAILED"
+            current_image_request.error_message = f"No image found within {settings.IMAGE_QUERY_BUDGET_SECONDS:g}s"
+        except Exception as img_exc:
+            print(f"Error processing image query '{query}': {img_exc}")
+            current_image_request.status = "FAILED"
+            current_image_request.error_message = str(img_exc)
+
+    IMAGE_DURATION.observe(time.perf_counter() - started, status=current_image_request.status)
+    if on_progress: await on_progress(current_image_request)
+    return current_image_request
+
+async def assemble_notebook_content(llm_output_with_placeholders: str, placeholders: List[Placeholder], processed_image_requests: list) -> CompiledNotebook:
+    """ASSEMBLE stage: builds the final document in one pass from the placeholder span index."""
+    return compile_notebook(
+        llm_output_with_placeholders,
+        placeholders,
+        processed_image_requests,
+        failed_policy=FailedImagePolicy(settings.NOTEBOOK_FAILED_IMAGE_POLICY),
+        with_html=settings.NOTEBOOK_RENDER_HTML,
+        variants=get_variant_service(),
+    )
+
+async def stream_llm_text(topic: str, bypass_cache: bool, on_placeholder: Callable[[Placeholder, str], None]) -> str:
+    """
+    LLM stage job: consumes the streamed generation and calls `on_placeholder(placeholder, text_so_far)`
+    as soon as each image placeholder is complete. Returns the full text.
+    """
+    parser = IncrementalPlaceholderParser()
+    async for chunk in llm_service.stream_text_with_image_cues(topic, bypass_cache=bypass_cache):
+        for placeholder in parser.feed(chunk):
+            on_placeholder(placeholder, parser.text)
+    return parser.close()
+
+async def generate_notebook_content_task(task_id: str, user_id: str, notebook_id: str, topic: str, bypass_cache: bool = False):
+    """
+    Pipeline driver, started via StageScheduler.submit_pipeline(). Every unit of work runs as a
+    job on its stage pool: LLM -> SCRAPE/VALIDATE per image -> ASSEMBLE. Status and progress
+    writes are awaited directly, so they never queue behind other notebooks' assembly work.
+    Image work for a placeholder starts while the LLM is still streaming the rest of the text.
+    """
     print(f"[TASK_STARTED_ASYNC] Task ID: {task_id}, Notebook ID: {notebook_id}, User ID: {user_id}, Topic: {topic}")
-    db = get_firestore_client()
+    current_task_id.set(task_id) # This driver runs in its own asyncio task, so this tags only its own spans
+    started = time.perf_counter()
+    outcome = "cancelled" # Until the pipeline completes or fails
+    scheduler = get_scheduler()
+    # Field changes are collected here and written as one batch per stage boundary.
+    uow = NotebookTaskUnitOfWork(get_repository(), user_id=user_id, notebook_id=notebook_id, task_id=task_id)
+    placeholders: List[Placeholder] = [] # Span index, in text order; image_tasks[i] belongs to placeholders[i]
+    image_tasks: List[asyncio.Task] = []
+    finished = False # Set once the driver exits; a still-running LLM job must not start image work after that
 
     try:
-        update_task_status(db, task_id, TaskStatus.PROCESSING)
-        update_notebook_status(db, user_id, notebook_id, NotebookStatus.PROCESSING_TEXT)
-        
-        llm_output_with_placeholders = await llm_service.generate_text_with_image_cues(topic)
-        
-        notebook_ref = db.collection("users").document(user_id).collection("notebooks").document(notebook_id)
-        notebook_ref.update({
-            "llm_generated_text_with_placeholders": llm_output_with_placeholders,
-            "updated_at": datetime.utcnow()
-        })
-        print(f"LLM text generated for notebook {notebook_id}.")
-
-        image_queries = []
-        for match in re.finditer(r"image - \[(.*?)\]", llm_output_with_placeholders):
-            image_queries.append(match.group(1))
+        uow.set_status(NotebookStatus.PROCESSING_TEXT, TaskStatus.PROCESSING)
+        await uow.flush(milestone=True)
+        await publish_status_event(task_id, notebook_id, NotebookStatus.PROCESSING_TEXT, TaskStatus.PROCESSING)
+
+        notebook_semaphore = asyncio.Semaphore(max(1, settings.IMAGE_PIPELINE_PER_NOTEBOOK_CONCURRENCY))
+
+        def start_image_processing(placeholder: Placeholder, text_so_far: str):
+            # The text generated so far (which ends with this placeholder) is the validation context.
+            if finished:
+                return
+            placeholders.append(placeholder)
+            report_progress = functools.partial(publish_image_event, task_id, notebook_id, placeholder.index)
+            image_tasks.append(asyncio.create_task(
+                process_image_query(placeholder.query, text_so_far, notebook_semaphore, on_progress=report_progress)
+            ))
+
+        llm_output_with_placeholders = await scheduler.run(
+            Stage.LLM, stream_llm_text, topic, bypass_cache, start_image_processing
+        )
+        print(f"LLM text generated for notebook {notebook_id}; {len(image_tasks)} image queries already in flight.")
+
+        uow.update_notebook(llm_generated_text_with_placeholders=llm_output_with_placeholders)
+        if placeholders:
+            uow.set_status(NotebookStatus.PROCESSING_IMAGES)
+        await uow.flush()
+        if placeholders:
+            await publish_status_event(task_id, notebook_id, NotebookStatus.PROCESSING_IMAGES, TaskStatus.PROCESSING)
 
         processed_image_requests = []
 
-        if image_queries:
-            update_notebook_status(db, user_id, notebook_id, NotebookStatus.PROCESSING_IMAGES)
-            print(f"Processing {len(image_queries)} image queries: {image_queries}")
-            
-            for query in image_queries:
-                current_image_request = ImageRequest(query=query, status="PENDING")
-                try:
-                    scraped_urls = await image_scraper_service.scrape_images(query, count=1)
-                    
-                    if scraped_urls:
-                        current_image_request.original_url = scraped_urls[0]
-                        current_image_request.status = "FETCHED"
-                        print(f"Image fetched for '{query}': {current_image_request.original_url}")
-                        
-                        # *** Call the image validator service ***
-                        is_valid, validated_url = await image_validator_service.validate_image(
-                            image_url=current_image_request.original_url,
-                            text_context=llm_output_with_placeholders, # Pass full text for context
-                            query_context=query
-                        )
-
-                        if is_valid and validated_url:
-                            current_image_request.validated_image_url = validated_url
-                            current_image_request.status = "VALIDATED"
-                            print(f"Image validated for '{query}': {current_image_request.validated_image_url}")
-                        else:
-                            current_image_request.status = "FAILED"
-                            current_image_request.error_message = "Image validation failed or not suitable"
-                            print(f"Image validation failed for '{query}'. Reason (mocked): Not suitable.")
-                    else:
-                        current_image_request.status = "FAILED"
-                        current_image_request.error_message = "No images found by scraper"
-                        print(f"No images found by scraper for '{query}'")
-                
-                except Exception as img_exc:
-                    print(f"Error processing image query '{query}': {img_exc}")
-                    current_image_request.status = "FAILED"
-                    current_image_request.error_message = str(img_exc)
-                
-                processed_image_requests.append(current_image_request.model_dump(mode='json'))
+        if image_tasks:
+            # gather() preserves placeholder order. return_exceptions=True keeps one failed query from
+            # cancelling its siblings.
+            results = await asyncio.gather(*image_tasks, return_exceptions=True)
+
+            for placeholder, result in zip(placeholders, results):
+                if isinstance(result, BaseException):
+                    # process_image_query handles its own errors; this only catches the unexpected.
+                    print(f"Unexpected error processing image query '{placeholder.query}': {result}")
+                    result = ImageRequest(query=placeholder.query, status="FAILED", error_message=str(result))
+                processed_image_requests.append(result.model_dump(mode='json'))
             
-            notebook_ref.update({"image_requests": processed_image_requests, "updated_at": datetime.utcnow()})
+            uow.update_notebook(image_requests=processed_image_requests)
+            await uow.flush()
             print(f"Image processing phase completed for notebook {notebook_id}")
         else:
             print(f"No image placeholders found in notebook {notebook_id}")
 
-        final_content = llm_output_with_placeholders
-        for img_req_data in processed_image_requests:
-            if img_req_data.get("status") == "VALIDATED" and img_req_data.get("validated_image_url"):
-                placeholder = f"image - [{img_req_data['query']}]"
-                image_embed_code = f"![{img_req_data['query']}]({img_req_data['validated_image_url']})" # Markdown
-                final_content = final_content.replace(placeholder, image_embed_code, 1)
-            # else: # Optionally handle failed/unvalidated images, e.g. remove placeholder or add a note
-                # placeholder = f"image - [{img_req_data['query']}]"
-                # final_content = final_content.replace(placeholder, "[Image not available]", 1)
-
-        notebook_ref.update({"final_content": final_content, "updated_at": datetime.utcnow()})
+        compiled = await scheduler.run(
+            Stage.ASSEMBLE, assemble_notebook_content, llm_output_with_placeholders, placeholders, processed_image_requests
+        )
         print(f"Final content assembled for notebook {notebook_id}")
 
-        update_notebook_status(db, user_id, notebook_id, NotebookStatus.COMPLETED)
-        update_task_status(db, task_id, TaskStatus.COMPLETED)
+        # Content and both COMPLETED transitions land in the same atomic write.
+        uow.update_notebook(final_content=compiled.markdown)
+        if compiled.html is not None:
+            uow.update_notebook(final_content_html=compiled.html)
+        uow.set_status(NotebookStatus.COMPLETED, TaskStatus.COMPLETED)
+        await uow.flush(milestone=True)
+        await publish_status_event(task_id, notebook_id, NotebookStatus.COMPLETED, TaskStatus.COMPLETED)
+        outcome = "ok"
         print(f"[TASK_COMPLETED_ASYNC] Notebook {notebook_id} generation successful.")
 
     except Exception as e:
+        outcome = "error"
         print(f"[TASK_FAILED_ASYNC] Error during notebook generation for task {task_id}, notebook {notebook_id}: {e}")
         import traceback
         traceback.print_exc()
         error_message = str(e)
         try:
-            update_notebook_status(db, user_id, notebook_id, NotebookStatus.FAILED, error_message=error_message)
-            update_task_status(db, task_id, TaskStatus.FAILED, error_message=error_message)
+            # Pending changes may be what failed to write, so only the failure itself is recorded.
+            uow.discard()
+            uow.set_status(NotebookStatus.FAILED, TaskStatus.FAILED, error_message=error_message)
+            await uow.flush(milestone=True)
         except Exception as db_update_e:
             print(f"Critical: Failed to update statuses to FAILED for task {task_id}, notebook {notebook_id}: {db_update_e}")
+        # Published even if the write failed, so followers are not left waiting forever.
+        await publish_status_event(task_id, notebook_id, NotebookStatus.FAILED, TaskStatus.FAILED, error_message=error_message)
+    finally:
+        finished = True
+        PIPELINE_DURATION.observe(time.perf_counter() - started, outcome=outcome)
+        # Image work started mid-stream is orphaned if the pipeline failed or was cancelled.
+        for image_task in image_tasks:
+            if not image_task.done():
+                image_task.cancel()
@@ -0,0 +1,191 @@
+import asyncio
+import enum
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import STAGE_DURATION, STAGE_QUEUE_WAIT, current_task_id, span
+
+# In-process, stage-pipelined scheduler for background generation work.
+# Each pipeline stage (LLM generation, image scraping, image validation, assembly)
+# owns a bounded pool of worker coroutines fed by its own queue. A notebook pipeline is a
+# driver coroutine that hands each unit of work to the right stage and awaits the result,
+# so different notebooks overlap across stages while no single stage can grow without bound.
+
+
+class Stage(str, enum.Enum):
+    LLM = "llm"
+    SCRAPE = "scrape"
+    VALIDATE = "validate"
+    ASSEMBLE = "assemble"
+
+
+class StagePool:
+    def __init__(self, stage: Stage, workers: int):
+        self.stage = stage
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._started_at = time.monotonic()
+        self._worker_tasks: list = []
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.stage.value}-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def _worker(self):
+        while True:
+            fn, args, kwargs, future, task_id, queued_at = await self.queue.get()
+            try:
+                if future.cancelled(): # The caller gave up while the job was queued
+                    continue
+                self.busy += 1
+                started = time.monotonic()
+                STAGE_QUEUE_WAIT.observe(started - queued_at, stage=self.stage.value)
+                token = current_task_id.set(task_id) # Spans inside the job are tagged with the submitting task
+                try:
+                    job = asyncio.create_task(self._run_job(fn, args, kwargs))
+                finally:
+                    current_task_id.reset(token)
+                # A caller that gives up (e.g. its pipeline was cancelled) cancels the running job too.
+                future.add_done_callback(lambda f, job=job: job.cancel() if f.cancelled() else None)
+                try:
+                    await asyncio.wait({job})
+                except asyncio.CancelledError:
+                    # The worker itself is stopping: take the job down with it.
+                    job.cancel()
+                    future.cancel()
+                    await asyncio.gather(job, return_exceptions=True)
+                    raise
+                finally:
+                    self.busy -= 1
+                    self.busy_seconds += time.monotonic() - started
+                # A job that ended in CancelledError is a failed job; the worker carries on.
+                if job.cancelled():
+                    self.failed += 1
+                    future.cancel()
+                elif job.exception() is not None:
+                    self.failed += 1
+                    if not future.done(): future.set_exception(job.exception())
+                else:
+                    self.completed += 1
+                    if not future.done(): future.set_result(job.result())
+            finally:
+                self.queue.task_done()
+
+    async def _run_job(self, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: dict) -> Any:
+        with span(f"stage.{self.stage.value}", STAGE_DURATION, stage=self.stage.value):
+            return await fn(*args, **kwargs)
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        # Fail anything still queued so awaiting callers don't hang.
+        while not self.queue.empty():
+            future = self.queue.get_nowait()[3]
+            future.cancel()
+            self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queue_depth": self.queue.qsize(),
+            "utilization": round(self.busy / self.workers, 3), # Instantaneous
+            "avg_utilization": round(min(self.busy_seconds / (elapsed * self.workers), 1.0), 3), # Since start
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+class StageScheduler:
+    def __init__(self, pool_sizes: Dict[Stage, int]):
+        self.pools: Dict[Stage, StagePool] = {stage: StagePool(stage, size) for stage, size in pool_sizes.items()}
+        self._pipelines: Set[asyncio.Task] = set()
+        self.running = False
+
+    def start(self):
+        for pool in self.pools.values():
+            pool.start()
+        self.running = True
+        print(f"StageScheduler started: { {stage.value: pool.workers for stage, pool in self.pools.items()} }")
+
+    async def run(self, stage: Stage, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Queues `fn(*args, **kwargs)` on the given stage's pool and waits for its result. Cancelling
+        the caller cancels the job, whether it is still queued or already running.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.pools[stage].queue.put((fn, args, kwargs, future, current_task_id.get(), time.monotonic()))
+        return await future
+
+    def submit_pipeline(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Task:
+        """Starts a pipeline driver coroutine. Its stage work goes through run(), not a stage worker."""
+        task = asyncio.create_task(fn(*args, **kwargs))
+        self._pipelines.add(task)
+        task.add_done_callback(self._pipelines.discard)
+        return task
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pipelines)
+
+    async def stop(self, timeout: float = 0):
+        """Waits up to `timeout` seconds for in-flight pipelines, then cancels whatever is left."""
+        if self._pipelines and timeout > 0:
+            print(f"StageScheduler draining {len(self._pipelines)} in-flight pipelines...")
+            await asyncio.wait(set(self._pipelines), timeout=timeout)
+        for task in list(self._pipelines):
+            task.cancel()
+        await asyncio.gather(*self._pipelines, return_exceptions=True)
+        for pool in self.pools.values():
+            await pool.stop()
+        self.running = False
+        print("StageScheduler stopped.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight_pipelines": self.in_flight,
+            "stages": {stage.value: pool.stats() for stage, pool in self.pools.items()},
+        }
+
+
+# Global scheduler, started and stopped by the FastAPI lifespan.
+scheduler: Optional[StageScheduler] = None
+
+def start_scheduler() -> StageScheduler:
+    global scheduler
+    if scheduler is None or not scheduler.running:
+        scheduler = StageScheduler({
+            Stage.LLM: settings.SCHEDULER_LLM_WORKERS,
+            Stage.SCRAPE: settings.SCHEDULER_SCRAPE_WORKERS,
+            Stage.VALIDATE: settings.SCHEDULER_VALIDATE_WORKERS,
+            Stage.ASSEMBLE: settings.SCHEDULER_ASSEMBLE_WORKERS,
+        })
+        scheduler.start()
+    return scheduler
+
+def get_scheduler() -> StageScheduler:
+    # Must be called from within the running event loop; starts the scheduler lazily if needed.
+    if scheduler is None or not scheduler.running:
+        return start_scheduler()
+    return scheduler
+
+def current_scheduler() -> Optional[StageScheduler]:
+    """The running scheduler, if any. Unlike get_scheduler(), never starts one (e.g. for stats)."""
+    return scheduler if scheduler is not None and scheduler.running else None
+
+async def stop_scheduler():
+    global scheduler
+    if scheduler is not None:
+        await scheduler.stop(timeout=settings.SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS)
+        scheduler = None
@@ -0,0 +1,312 @@
+import asyncio
+import math
+import time
+import uuid
+from typing import List, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Admission control for notebook generation.
+# Every accepted /generate request starts a background pipeline, so admission is decided up
+# front, before anything is written:
+# 1. a global cap on in-flight generations: over it, 503 + Retry-After (the service is saturated),
+# 2. a per-user token bucket (ADMISSION_USER_RATE_PER_MINUTE, bursts up to ADMISSION_USER_BURST):
+#    when empty, 429 + Retry-After (exactly when enough tokens will have refilled). A batch larger
+#    than the bucket is admitted when the bucket is full and leaves it in debt, so it costs the
+#    user the same refill time as the equivalent series of smaller requests.
+# Each admitted notebook holds one in-flight lease until its pipeline finishes. Limiter state
+# lives in a pluggable AdmissionStore: in-process (per worker), or Redis so that limits and the
+# in-flight cap hold across all workers. Redis leases expire after ADMISSION_LEASE_TTL_SECONDS,
+# so slots held by a crashed worker are reclaimed.
+
+ADMISSION_REJECTIONS = registry.counter(
+    "mineshear_admission_rejections_total", "Generation requests rejected by admission control.", ["reason"]
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason # "saturated", "rate_limited" or "too_large"
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionStore:
+    """Limiter state: per-key token buckets and a set of in-flight leases."""
+    name = "base"
+
+    async def take_tokens(self, key: str, cost: float, rate_per_second: float, burst: float) -> Tuple[bool, float]:
+        """
+        Takes `cost` tokens if available, or if the bucket is full when `cost` exceeds `burst`
+        (the balance then goes negative). Returns (allowed, seconds until they would be).
+        """
+        raise NotImplementedError
+
+    async def acquire_leases(self, lease_ids: List[str], limit: int, ttl_seconds: float) -> bool:
+        """Adds all leases if that keeps the in-flight count within `limit`, else none."""
+        raise NotImplementedError
+
+    async def release_leases(self, lease_ids: List[str]):
+        raise NotImplementedError
+
+    async def in_flight(self) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryAdmissionStore(AdmissionStore):
+    """Per-worker state. Safe without locks: every method completes without awaiting."""
+    name = "memory"
+
+    def __init__(self, max_buckets: int = 100_000):
+        # key -> (tokens, updated_at). A bucket left alone long enough is full again, so it can expire.
+        self._buckets = TTLCache(max_entries=max_buckets, ttl_seconds=3600)
+        self._leases: Set[str] = set()
+
+    async def take_tokens(self, key: str, cost: float, rate_per_second: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated_at) * rate_per_second)
+        needed = min(cost, burst)
+        allowed = tokens >= needed
+        if allowed:
+            tokens -= cost
+        self._buckets.set(key, (tokens, now), ttl_seconds=(burst - tokens) / rate_per_second)
+        return allowed, 0.0 if allowed else (needed - tokens) / rate_per_second
+
+    async def acquire_leases(self, lease_ids: List[str], limit: int, ttl_seconds: float) -> bool:
+        if len(self._leases) + len(lease_ids) > limit:
+            return False
+        self._leases.update(lease_ids)
+        return True
+
+    async def release_leases(self, lease_ids: List[str]):
+        self._leases.difference_update(lease_ids)
+
+    async def in_flight(self) -> int:
+        return len(self._leases)
+
+
+# Both scripts use the Redis server clock, so workers with skewed clocks agree.
+TOKEN_BUCKET_SCRIPT = """
+local cost, rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local needed = math.min(cost, burst)
+local allowed, retry = 0, (needed - tokens) / rate
+if tokens >= needed then
+    tokens, allowed, retry = tokens - cost, 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+ACQUIRE_LEASES_SCRIPT = """
+local limit, ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) + #ARGV - 2 > limit then
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[i])
+end
+return 1
+"""
+
+
+class RedisAdmissionStore(AdmissionStore):
+    """Shared state for multi-worker deployments. Requires the optional `redis` package."""
+    name = "redis"
+    prefix = "admission:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("ADMISSION_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self._redis = redis_asyncio.from_url(url)
+        self._take_tokens = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._acquire_leases = self._redis.register_script(ACQUIRE_LEASES_SCRIPT)
+        self._leases_key = f"{self.prefix}in-flight"
+
+    async def take_tokens(self, key: str, cost: float, rate_per_second: float, burst: float) -> Tuple[bool, float]:
+        allowed, retry_after = await self._take_tokens(keys=[f"{self.prefix}bucket:{key}"], args=[cost, rate_per_second, burst])
+        return bool(int(allowed)), float(retry_after)
+
+    async def acquire_leases(self, lease_ids: List[str], limit: int, ttl_seconds: float) -> bool:
+        return bool(int(await self._acquire_leases(keys=[self._leases_key], args=[limit, ttl_seconds, *lease_ids])))
+
+    async def release_leases(self, lease_ids: List[str]):
+        if lease_ids:
+            await self._redis.zrem(self._leases_key, *lease_ids)
+
+    async def in_flight(self) -> int:
+        await self._redis.zremrangebyscore(self._leases_key, "-inf", time.time())
+        return int(await self._redis.zcard(self._leases_key))
+
+    async def close(self):
+        await self._redis.close()
+
+
+class AdmissionTicket:
+    """In-flight leases held by one admitted request; each pipeline releases its own when it finishes."""
+
+    def __init__(self, controller: "AdmissionController", lease_ids: List[str]):
+        self.controller = controller
+        self._unbound = list(lease_ids)
+
+    def bind(self, pipeline: asyncio.Task):
+        """Hands one lease to a started pipeline; it is released when the pipeline task is done."""
+        if not self._unbound:
+            return
+        lease_id = self._unbound.pop()
+        pipeline.add_done_callback(lambda _: self.controller.release_later([lease_id]))
+
+    async def release(self):
+        """Releases leases no pipeline took, e.g. when creating the documents failed."""
+        lease_ids, self._unbound = self._unbound, []
+        await self.controller.release(lease_ids)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        store: AdmissionStore,
+        enabled: bool = True,
+        user_rate_per_minute: float = 30,
+        user_burst: int = 60,
+        max_in_flight: int = 500,
+        lease_ttl_seconds: float = 1800,
+        saturated_retry_after: float = 10,
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.user_rate_per_second = max(user_rate_per_minute, 1e-6) / 60
+        self.user_burst = max(1, user_burst)
+        self.max_in_flight = max(1, max_in_flight)
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.saturated_retry_after = saturated_retry_after
+        self._pending_releases: Set[asyncio.Task] = set()
+        self.admitted = 0
+        self.store_errors = 0
+
+    def _reject(self, status_code: int, reason: str, detail: str, retry_after: Optional[float] = None) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        return AdmissionRejected(status_code, reason, detail, retry_after)
+
+    async def admit(self, user_id: str, cost: int = 1) -> AdmissionTicket:
+        """
+        Admits `cost` notebook generations for the user or raises AdmissionRejected.
+        The in-flight cap is checked first, so a saturated service doesn't also drain the user's tokens.
+        """
+        if not self.enabled:
+            return AdmissionTicket(self, [])
+        if cost > self.max_in_flight:
+            # Could never be admitted, so this is not worth retrying.
+            raise self._reject(422, "too_large", f"At most {self.max_in_flight} notebooks can be requested at once")
+
+        lease_ids = [uuid.uuid4().hex for _ in range(cost)]
+        try:
+            if not await self.store.acquire_leases(lease_ids, self.max_in_flight, self.lease_ttl_seconds):
+                raise self._reject(503, "saturated", "Too many notebook generations in progress, try again later", self.saturated_retry_after)
+            allowed, retry_after = await self.store.take_tokens(f"user:{user_id}", cost, self.user_rate_per_second, self.user_burst)
+            if not allowed:
+                await self.store.release_leases(lease_ids)
+                raise self._reject(429, "rate_limited", "Notebook generation rate limit exceeded", retry_after)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            # An unreachable limiter store must not take generation down with it: fail open.
+            self.store_errors += 1
+            print(f"Admission: {self.store.name} store failed, admitting without limits: {e}")
+            return AdmissionTicket(self, [])
+        self.admitted += cost
+        return AdmissionTicket(self, lease_ids)
+
+    async def release(self, lease_ids: List[str]):
+        if not lease_ids:
+            return
+        try:
+            await self.store.release_leases(lease_ids)
+        except Exception as e:
+            # Redis leases expire on their own; in-process release cannot fail.
+            self.store_errors += 1
+            print(f"Admission: releasing {len(lease_ids)} leases failed: {e}")
+
+    def release_later(self, lease_ids: List[str]):
+        # Called from task done-callbacks, which can't await.
+        task = asyncio.get_running_loop().create_task(self.release(lease_ids))
+        self._pending_releases.add(task)
+        task.add_done_callback(self._pending_releases.discard)
+
+    async def stats(self):
+        try:
+            in_flight = await self.store.in_flight()
+        except Exception as e:
+            in_flight = None
+            print(f"Admission: reading in-flight count failed: {e}")
+        return {
+            "enabled": self.enabled,
+            "backend": self.store.name,
+            "in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "user_rate_per_minute": round(self.user_rate_per_second * 60, 3),
+            "user_burst": self.user_burst,
+            "admitted": self.admitted,
+            "store_errors": self.store_errors,
+        }
+
+    async def close(self):
+        await asyncio.gather(*self._pending_releases, return_exceptions=True)
+        await self.store.close()
+
+
+# Global admission controller, created and closed by the FastAPI lifespan.
+admission_controller: Optional[AdmissionController] = None
+
+def _build_store() -> AdmissionStore:
+    if settings.ADMISSION_BACKEND == "redis":
+        return RedisAdmissionStore(settings.REDIS_URL)
+    return MemoryAdmissionStore()
+
+def start_admission_controller() -> AdmissionController:
+    global admission_controller
+    if admission_controller is None:
+        admission_controller = AdmissionController(
+            _build_store(),
+            enabled=settings.ADMISSION_CONTROL_ENABLED,
+            user_rate_per_minute=settings.ADMISSION_USER_RATE_PER_MINUTE,
+            user_burst=settings.ADMISSION_USER_BURST,
+            max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+            lease_ttl_seconds=settings.ADMISSION_LEASE_TTL_SECONDS,
+            saturated_retry_after=settings.ADMISSION_SATURATED_RETRY_AFTER_SECONDS,
+        )
+        print(f"Admission control {'enabled' if admission_controller.enabled else 'disabled'} ('{admission_controller.store.name}' store).")
+    return admission_controller
+
+def get_admission_controller() -> AdmissionController:
+    # Created lazily if the lifespan hook didn't run (e.g. scripts).
+    return admission_controller if admission_controller is not None else start_admission_controller()
+
+async def close_admission_controller():
+    global admission_controller
+    if admission_controller is not None:
+        await admission_controller.close()
+        admission_controller = None
+
+def retry_after_header(seconds: Optional[float]) -> Optional[str]:
+    # Retry-After takes whole seconds; round up so clients never retry too early.
+    return None if seconds is None else str(max(1, math.ceil(seconds)))
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+# Micro-batching collector: gathers concurrent single-item requests for a few milliseconds
+# (or until a batch fills up) and hands them to a batch function in one call. Each caller
+# still awaits only its own result.
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        dispatch: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5,
+        name: str = "batcher",
+    ):
+        # `dispatch` must return one result per item, in the same order.
+        self.dispatch = dispatch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dispatch_tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item: T) -> R:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers that gave up while waiting don't need a slot in the batch.
+        pending = [(item, future) for item, future in self._pending if not future.cancelled()]
+        self._pending = []
+        if not pending:
+            return
+        self.batches += 1
+        self.items += len(pending)
+        self.largest_batch = max(self.largest_batch, len(pending))
+        task = asyncio.create_task(self._run_batch(pending))
+        self._dispatch_tasks.add(task) # Keep a reference until the batch completes
+        task.add_done_callback(self._dispatch_tasks.discard)
+
+    async def _run_batch(self, pending: List[Tuple[T, asyncio.Future]]):
+        try:
+            results = await self.dispatch([item for item, _ in pending])
+            if len(results) != len(pending):
+                raise RuntimeError(f"{self.name}: dispatch returned {len(results)} results for {len(pending)} items")
+        except asyncio.CancelledError:
+            for _, future in pending:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in pending:
+                if not future.done(): future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done(): future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+        }
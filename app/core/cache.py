@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Shared caching primitives: an in-memory LRU with TTL, pluggable async cache tiers
+# (memory, local disk, Firestore) and a single-flight helper that collapses identical
+# concurrent calls into one.
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl_seconds`.
+    Not thread-safe: meant to be used from the event loop.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Stores a value. `ttl_seconds` overrides the default TTL for this entry only."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of free text (topics, image queries) for cache keys."""
+    return " ".join(text.split()).casefold()
+
+
+def hash_key(*parts: Any) -> str:
+    """Stable hex digest for arbitrary JSON-serializable key parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --- Pluggable cache tiers ---
+
+class CacheBackend:
+    """Interface for one cache tier. Keys are strings, values must be JSON-serializable."""
+    name = "base"
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl_seconds: float):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float):
+        self._cache.set(key, value, ttl_seconds=ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    One JSON file per entry under `directory`, evicted least recently used first once their
+    total size exceeds `max_bytes` (expired entries go the same way if nobody reads them again).
+    The index lives in memory, rebuilt from the directory at startup; file I/O runs in a worker thread.
+    """
+    name = "disk"
+
+    def __init__(self, directory: str, max_bytes: int = 500_000_000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict() # key -> file size, least recently used first
+        self.total_bytes = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".json"): # Not .tmp-* files another worker is still writing
+                stat = os.stat(os.path.join(directory, file_name))
+                found.append((stat.st_atime, file_name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Any:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return _MISSING
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return _MISSING
+        return entry.get("value")
+
+    def _write(self, key: str, value: Any, ttl_seconds: float) -> int:
+        # A private temp file per write, then rename: concurrent writers of one key can't interleave
+        # and readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": time.time() + ttl_seconds, "value": value}, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return size
+
+    async def get(self, key: str) -> Any:
+        value = await asyncio.to_thread(self._read, key)
+        if value is _MISSING:
+            if key in self.entries: # Expired, or evicted by another worker sharing the directory
+                self.total_bytes -= self.entries.pop(key)
+            return None
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl_seconds: float):
+        size = await asyncio.to_thread(self._write, key, value, ttl_seconds)
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        self.entries[key] = size
+        self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class FirestoreCacheBackend(CacheBackend):
+    """Shared tier in a Firestore collection, so all workers benefit from each other's results."""
+    name = "firestore"
+
+    def __init__(self, collection: str):
+        self.collection = collection
+
+    def _ref(self, adb, key: str):
+        return adb.client.collection(self.collection).document(key)
+
+    async def get(self, key: str) -> Any:
+        from app.db.async_firestore import get_async_db # Resolved lazily: the data layer starts in the lifespan
+        adb = get_async_db()
+        entry = await adb.get(self._ref(adb, key))
+        if not entry:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at.replace(tzinfo=None) <= datetime.utcnow():
+            return None
+        return entry.get("value")
+
+    async def set(self, key: str, value: Any, ttl_seconds: float):
+        from app.db.async_firestore import get_async_db
+        adb = get_async_db()
+        # expires_at doubles as a Firestore TTL-policy field so stale entries get garbage-collected.
+        await adb.set(self._ref(adb, key), {"value": value, "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)})
+
+
+class TieredCache:
+    """
+    Looks tiers up in order (fastest first) and backfills faster tiers on a hit in a slower one.
+    Errors in a tier are logged and treated as a miss, so the cache can never fail a request.
+    """
+
+    def __init__(self, tiers: List[CacheBackend], ttl_seconds: float):
+        self.tiers = tiers
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.tier_hits: Dict[str, int] = {tier.name: 0 for tier in tiers}
+
+    async def get(self, key: str) -> Any:
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = await tier.get(key)
+            except Exception as e:
+                print(f"Cache tier '{tier.name}' get failed: {e}")
+                continue
+            if value is not None:
+                self.hits += 1
+                self.tier_hits[tier.name] += 1
+                for faster_tier in self.tiers[:index]:
+                    await self._safe_set(faster_tier, key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        for tier in self.tiers:
+            await self._safe_set(tier, key, value)
+
+    async def _safe_set(self, tier: CacheBackend, key: str, value: Any):
+        try:
+            await tier.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            print(f"Cache tier '{tier.name}' set failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "tier_hits": dict(self.tier_hits),
+            "tiers": {tier.name: tier.stats() for tier in self.tiers},
+        }
+
+
+def build_tiered_cache(
+    max_entries: int, ttl_seconds: float, second_tier: str, disk_dir: str, firestore_collection: str, disk_max_bytes: int = 500_000_000
+) -> TieredCache:
+    """Memory LRU first, plus an optional "disk" or "firestore" second tier."""
+    tiers: List[CacheBackend] = [MemoryCacheBackend(max_entries=max_entries, ttl_seconds=ttl_seconds)]
+    if second_tier == "disk":
+        tiers.append(DiskCacheBackend(disk_dir, max_bytes=disk_max_bytes))
+    elif second_tier == "firestore":
+        tiers.append(FirestoreCacheBackend(firestore_collection))
+    elif second_tier not in ("", "none"):
+        print(f"Warning: Unknown cache tier '{second_tier}', using memory only.")
+    return TieredCache(tiers, ttl_seconds=ttl_seconds)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller runs `fn`,
+    later callers await the same result. The shared call is shielded so one caller
+    being cancelled doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0 # Calls that piggybacked on an in-flight call
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn(*args, **kwargs))
+        self._in_flight[key] = future
+
+        def _forget(done_future):
+            if self._in_flight.get(key) is done_future:
+                del self._in_flight[key]
+            if not done_future.cancelled():
+                done_future.exception() # Mark retrieved even if every waiter was cancelled
+        future.add_done_callback(_forget)
+        return await asyncio.shield(future)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI Tools Website Backend"
@@ -7,13 +7,179 @@ class Settings(BaseSettings):
 
     # Firebase
     FIREBASE_SERVICE_ACCOUNT_KEY_PATH: Optional[str] = None # Path to your Firebase service account key JSON file
+    FIREBASE_PROJECT_ID: Optional[str] = None # Needed when running against the emulator without a key file
+
+    # Firestore data layer
+    FIRESTORE_BACKEND: str = "firestore" # "firestore" (real or emulator via FIRESTORE_EMULATOR_HOST) or "memory"
+    FIRESTORE_EXECUTOR_POOL_SIZE: int = 16 # Threads running blocking Firestore calls off the event loop
+    PIPELINE_FLUSH_MILESTONES_ONLY: bool = False # Write pipeline progress only at start/completion/failure
+
+    # Storage backend for notebooks, tasks and batches
+    STORAGE_BACKEND: str = "firestore" # "firestore" (uses FIRESTORE_BACKEND above) or "sqlite" (local file, single node)
+    SQLITE_PATH: str = "data/mineshear.db"
+    SQLITE_POOL_SIZE: int = 8 # Pooled connections (and threads) for SQLite calls; WAL lets readers run alongside the writer
 
     # LLM API (Example)
     # OPENAI_API_KEY: Optional[str] = None
+    LLM_MODEL: str = "mock-llm"
+    LLM_TEMPERATURE: float = 0.7
+    LLM_PROMPT_VERSION: str = "v1" # Bump when the prompt changes to invalidate cached generations
+
+    # LLM generation cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: float = 3600
+    LLM_CACHE_MAX_ENTRIES: int = 1024 # In-memory LRU tier
+    LLM_CACHE_SECOND_TIER: str = "none" # "none", "disk" or "firestore"
+    LLM_CACHE_DISK_DIR: str = ".cache/llm"
+    LLM_CACHE_DISK_MAX_BYTES: int = 500_000_000 # Least recently used entries are deleted beyond this
 
     # Image Scraping API (Example)
     # UNSPLASH_ACCESS_KEY: Optional[str] = None
 
+    # Image scrape/validation caches (in-memory, per worker)
+    IMAGE_CACHE_ENABLED: bool = True
+    IMAGE_SCRAPE_CACHE_TTL_SECONDS: float = 3600
+    IMAGE_SCRAPE_CACHE_MAX_ENTRIES: int = 4096
+    IMAGE_SCRAPE_NEGATIVE_TTL_SECONDS: float = 300 # "No images found" is cached for a shorter time
+    IMAGE_VALIDATION_CACHE_TTL_SECONDS: float = 86400
+    IMAGE_VALIDATION_CACHE_MAX_ENTRIES: int = 8192
+    IMAGE_VALIDATION_NEGATIVE_TTL_SECONDS: float = 600 # Rejected verdicts are cached for a shorter time
+
+    # Micro-batching for image validation
+    IMAGE_VALIDATION_BATCH_MAX_SIZE: int = 16 # Dispatch as soon as this many validations are waiting
+    IMAGE_VALIDATION_BATCH_MAX_WAIT_MS: float = 5 # ...or when the oldest one has waited this long
+
+    # Image validation backend
+    IMAGE_VALIDATOR_BACKEND: str = "mock" # "mock" or "clip" (local CPU CLIP model via onnxruntime, see app.services.ai.clip_validator)
+    CLIP_MODEL_DIR: str = "models/clip" # image_encoder.onnx, text_encoder.onnx and tokenizer.json
+    CLIP_QUERY_THRESHOLD: float = 0.22 # Min cosine similarity between the image and its placeholder description
+    CLIP_CONTEXT_THRESHOLD: float = 0.15 # Min cosine similarity between the image and the text around the placeholder
+    CLIP_INTRA_OP_THREADS: int = 0 # onnxruntime threads per inference (0: one per physical core)
+    CLIP_EMBEDDING_CACHE_MAX_ENTRIES: int = 20000 # Per cache (images by content hash, texts by normalized text)
+    IMAGE_FETCH_MAX_BYTES: int = 10_000_000 # Larger images are rejected (validator and image store downloads)
+    IMAGE_FETCH_TIMEOUT_SECONDS: float = 10
+
+    # Self-hosted copies of validated images (see app.services.image_store), served at /api/v1/images/{id}
+    IMAGE_STORE_BACKEND: str = "none" # "none" (notebooks embed the scraped URLs), "local" or "gcs"
+    IMAGE_STORE_DIR: str = "data/images" # local backend
+    IMAGE_STORE_GCS_BUCKET: Optional[str] = None # gcs backend, e.g. "<project>.appspot.com"
+    IMAGE_STORE_GCS_PREFIX: str = "images/"
+    IMAGE_STORE_PUBLIC_BASE_URL: str = "" # e.g. "https://api.mineshear.ai"; empty gives root-relative URLs
+    IMAGE_STORE_PHASH_MAX_DISTANCE: int = 6 # Near-duplicates differ in at most this many of 64 hash bits (0: exact only, max 7)
+    IMAGE_STORE_CACHE_MAX_ENTRIES: int = 20000 # Source URL -> asset and asset metadata caches (per worker)
+
+    # Resized WebP/AVIF/JPEG variants of stored images (see app.services.image_variants), at /api/v1/images/{id}/{width}.{ext}
+    IMAGE_VARIANTS_ENABLED: bool = True # Only takes effect with an image store
+    IMAGE_VARIANT_WIDTHS: str = "320,480,640,960,1280,1920" # Requested widths snap up to one of these
+    IMAGE_VARIANT_DEFAULT_WIDTH: int = 960 # Markdown image src and the srcset `sizes` hint
+    IMAGE_VARIANT_CACHE_DIR: str = "data/image-variants"
+    IMAGE_VARIANT_CACHE_MAX_BYTES: int = 2_000_000_000 # Least recently used variants are deleted beyond this (per worker's view)
+    IMAGE_VARIANT_PROCESSES: int = 2 # Encoder processes per worker
+
+    # Image pipeline concurrency
+    IMAGE_PIPELINE_PER_NOTEBOOK_CONCURRENCY: int = 4 # Max image queries in flight for a single notebook
+    # (Worker-wide image concurrency is bounded by the SCRAPE/VALIDATE stage pools below.)
+
+    # Image candidate racing (see app.core.racing)
+    IMAGE_CANDIDATES: int = 3 # Candidates scraped per placeholder; the first that validates is used (1: no racing)
+    IMAGE_CANDIDATE_HEDGE_DELAY_SECONDS: float = 0.5 # Start the next candidate if none has answered by then (0: all at once)
+    IMAGE_QUERY_BUDGET_SECONDS: float = 30 # Scrape plus validation per placeholder; the image fails after this (0: no limit)
+
+    # Notebook assembly
+    NOTEBOOK_FAILED_IMAGE_POLICY: str = "keep_placeholder" # "drop", "note" or "keep_placeholder"
+    NOTEBOOK_RENDER_HTML: bool = False # Also store a pre-rendered HTML version (final_content_html)
+
+    # Notebook body storage (separate, compressed content documents)
+    NOTEBOOK_CONTENT_CODEC: str = "zstd" # "zstd" (falls back to gzip without the zstandard package), "gzip" or "identity"
+    NOTEBOOK_CONTENT_CHUNK_BYTES: int = 900_000 # Per content document; must stay below Firestore's 1 MiB limit
+
+    # Read-through cache for task/notebook GETs (per worker)
+    READ_CACHE_ENABLED: bool = True
+    READ_CACHE_TTL_SECONDS: float = 5 # Bounds staleness of writes made by other workers
+    READ_CACHE_MAX_ENTRIES: int = 10000
+
+    # Task progress events (SSE)
+    EVENT_BUS_BACKEND: str = "memory" # "memory" (single worker) or "redis" (fan-out across workers)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    EVENT_SUBSCRIBER_QUEUE_SIZE: int = 100 # Per-connection buffer; oldest events are dropped when full
+    SSE_HEARTBEAT_SECONDS: float = 15
+
+    # Background stage scheduler: worker pool size per pipeline stage
+    SCHEDULER_LLM_WORKERS: int = 4
+    SCHEDULER_SCRAPE_WORKERS: int = 16
+    SCHEDULER_VALIDATE_WORKERS: int = 16
+    SCHEDULER_ASSEMBLE_WORKERS: int = 4 # Compiling final documents (pipelines write their status and progress directly)
+    SCHEDULER_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0 # Grace period for in-flight pipelines on shutdown
+
+    # Admission control for notebook generation (see app.core.admission)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_BACKEND: str = "memory" # "memory" (limits per worker) or "redis" (shared across workers, uses REDIS_URL)
+    ADMISSION_USER_RATE_PER_MINUTE: float = 30 # Sustained notebooks per user; a batch of N topics costs N
+    ADMISSION_USER_BURST: int = 60 # Token bucket size; a larger batch needs a full bucket and leaves it in debt
+    ADMISSION_MAX_IN_FLIGHT: int = 500 # Generations running at once, all users; beyond it requests get 503
+    ADMISSION_LEASE_TTL_SECONDS: float = 1800 # Redis only: a crashed worker's slots are reclaimed after this
+    ADMISSION_SATURATED_RETRY_AFTER_SECONDS: float = 10
+
+    # Bulk notebook generation
+    BULK_GENERATE_MAX_TOPICS: int = 200
+    NOTEBOOK_TOPIC_MAX_LENGTH: int = 500
+    FIRESTORE_BATCH_MAX_WRITES: int = 500 # Firestore's per-batch limit; bulk creates are chunked to fit
+
+    # List endpoints (GET /notebooks, GET /tasks)
+    LIST_PAGE_SIZE_DEFAULT: int = 20
+    LIST_PAGE_SIZE_MAX: int = 100
+
+    # Upstream AI service calls (see app.core.resilience): timeouts, retries, circuit breakers, adaptive concurrency
+    LLM_TIMEOUT_SECONDS: float = 60 # Whole call; for streams, time to the first chunk and the longest gap between chunks
+    IMAGE_SCRAPER_TIMEOUT_SECONDS: float = 15
+    IMAGE_VALIDATOR_TIMEOUT_SECONDS: float = 30 # Per batch call
+    UPSTREAM_MAX_ATTEMPTS: int = 3 # Including the first call; only timeouts and retryable errors are retried
+    UPSTREAM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    UPSTREAM_RETRY_MAX_DELAY_SECONDS: float = 8
+    UPSTREAM_BREAKER_FAILURE_THRESHOLD: int = 5 # Consecutive failures that open the circuit
+    UPSTREAM_BREAKER_RECOVERY_SECONDS: float = 30 # Fail fast this long, then let half-open probes through
+    UPSTREAM_BREAKER_HALF_OPEN_CALLS: int = 1
+    UPSTREAM_CONCURRENCY_INITIAL: int = 20
+    UPSTREAM_CONCURRENCY_MIN: int = 2
+    UPSTREAM_CONCURRENCY_MAX: int = 200
+    UPSTREAM_LATENCY_TOLERANCE: float = 2.0 # Shrink the limit when latency exceeds this multiple of the baseline
+
+    # Pooled HTTP clients per upstream (see app.core.http_clients), created and closed by the app lifespan
+    LLM_API_BASE_URL: Optional[str] = None # Provider endpoints; point them at local stub servers in tests
+    IMAGE_SCRAPER_BASE_URL: Optional[str] = None
+    IMAGE_VALIDATOR_BASE_URL: Optional[str] = None
+    HTTP2_ENABLED: bool = False # Multiplex requests over one connection per host (needs httpx[http2])
+    HTTP_POOL_MAX_CONNECTIONS: int = 100 # Per upstream
+    HTTP_POOL_MAX_CONNECTIONS_PER_UPSTREAM: Dict[str, int] = {} # Overrides, e.g. {"image-fetch": 200}
+    HTTP_POOL_MAX_KEEPALIVE: int = 20 # Idle connections kept open per upstream
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30 # Idle connections are closed after this
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_POOL_TIMEOUT_SECONDS: float = 10 # Max wait for a free connection when the pool is full
+
+    # Mock AI services (latency in seconds, failure rate in [0, 1]); tuned by the benchmark harness
+    MOCK_LATENCY_DISTRIBUTION: str = "fixed" # "fixed", "uniform", "exponential" or "lognormal" (same mean)
+    MOCK_LLM_LATENCY_SECONDS: float = 3.0
+    MOCK_LLM_FAILURE_RATE: float = 0.0
+    MOCK_SCRAPER_LATENCY_SECONDS: float = 2.0
+    MOCK_SCRAPER_FAILURE_RATE: float = 0.0
+    MOCK_VALIDATOR_LATENCY_SECONDS: float = 1.0 # Per batch call
+    MOCK_VALIDATOR_PER_ITEM_SECONDS: float = 0.02 # Added per extra image in a batch
+    MOCK_VALIDATOR_FAILURE_RATE: float = 0.0 # Whole batch calls failing (upstream errors)
+    MOCK_VALIDATOR_REJECTION_RATE: float = 0.1 # Images judged unsuitable (a verdict, not an error)
+    MOCK_RANDOM_SEED: Optional[int] = None
+
+    # Observability
+    OTEL_TRACES_ENABLED: bool = False # Emit timing spans via OpenTelemetry (needs opentelemetry-api; configure exporters via OTEL_* env vars)
+    OPS_ENDPOINTS_ENABLED: bool = False # Serve /metrics and /api/v1/system/* (404 otherwise); they expose internal state
+    METRICS_TOKEN: Optional[str] = None # If set, those endpoints also require "Authorization: Bearer <METRICS_TOKEN>"
+
+    # Authentication (Firebase ID tokens)
+    AUTH_DEV_BYPASS: bool = False # Accept every request as a fixed test user. Local development only!
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000 # Verified tokens, each kept until its own expiry
+    AUTH_CERTS_TIMEOUT_SECONDS: float = 10 # Fetching Google's signing certificates
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60 # How long a changed users/{uid} profile may be served stale
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
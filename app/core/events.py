@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.event import TaskEvent
+
+# In-process event bus for pipeline progress.
+# The pipeline publishes TaskEvents per task; subscribers (e.g. SSE connections) receive them
+# through bounded per-subscriber queues. Delivery between processes is delegated to a pluggable
+# EventBackend: the in-process backend delivers locally, the Redis backend fans messages out to
+# every worker so a client can follow a task that runs in a different worker.
+
+
+class EventBackend:
+    """Transport between publishers and the local bus. Calls `deliver(channel, message)` for every message."""
+    name = "base"
+
+    async def start(self, deliver: Callable[[str, str], None]):
+        self._deliver = deliver
+
+    async def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessEventBackend(EventBackend):
+    name = "memory"
+
+    async def publish(self, channel: str, message: str):
+        self._deliver(channel, message)
+
+
+class RedisEventBackend(EventBackend):
+    """Fans events out through Redis pub/sub. Requires the optional `redis` package."""
+    name = "redis"
+    prefix = "task-events:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("EVENT_BUS_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self._redis = redis_asyncio.from_url(url)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[str, str], None]):
+        await super().start(deliver)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.prefix}*")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            if message.get("type") != "pmessage":
+                continue
+            try:
+                channel = message["channel"].decode()[len(self.prefix):]
+                data = message["data"]
+                self._deliver(channel, data.decode() if isinstance(data, bytes) else data)
+            except Exception as e:
+                # One bad message (e.g. from an older worker's schema) must not stop the listener.
+                print(f"RedisEventBackend: dropping undeliverable message on {message.get('channel')!r}: {e}")
+
+    async def publish(self, channel: str, message: str):
+        await self._redis.publish(f"{self.prefix}{channel}", message)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+
+
+class EventBus:
+    def __init__(self, backend: EventBackend, subscriber_queue_size: int = 100, history_size: int = 50):
+        self.backend = backend
+        self.subscriber_queue_size = subscriber_queue_size
+        self.history_size = history_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Recent events per channel, replayed to late subscribers so they don't miss earlier transitions.
+        self._history = TTLCache(max_entries=10000, ttl_seconds=600)
+        self.published = 0
+        self.dropped = 0
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def publish(self, event: TaskEvent):
+        self.published += 1
+        try:
+            await self.backend.publish(event.task_id, event.model_dump_json())
+        except Exception as e:
+            # Progress events are best effort and must never fail the pipeline.
+            print(f"EventBus: failed to publish event for task {event.task_id}: {e}")
+
+    def _deliver(self, channel: str, message: str):
+        event = TaskEvent.model_validate_json(message)
+        history: List[TaskEvent] = self._history.get(channel) or []
+        history = (history + [event])[-self.history_size:]
+        self._history.set(channel, history)
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block the publisher.
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def history(self, channel: str) -> List[TaskEvent]:
+        """The channel's recent events, oldest first."""
+        return list(self._history.get(channel) or [])
+
+    def open_subscription(self, channel: str, replay: bool = True) -> asyncio.Queue:
+        """Returns a queue receiving the channel's events, pre-filled with recent history if `replay`."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        if replay:
+            for event in (self._history.get(channel) or [])[-self.subscriber_queue_size:]:
+                queue.put_nowait(event)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def close_subscription(self, channel: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[channel]
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel: str, replay: bool = True) -> AsyncIterator[asyncio.Queue]:
+        queue = self.open_subscription(channel, replay=replay)
+        try:
+            yield queue
+        finally:
+            self.close_subscription(channel, queue)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "published": self.published,
+            "dropped": self.dropped,
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+        }
+
+
+# Global event bus, started and closed by the FastAPI lifespan.
+event_bus: Optional[EventBus] = None
+
+def _build_backend() -> EventBackend:
+    if settings.EVENT_BUS_BACKEND == "redis":
+        return RedisEventBackend(settings.REDIS_URL)
+    return InProcessEventBackend()
+
+async def start_event_bus() -> EventBus:
+    global event_bus
+    if event_bus is None:
+        event_bus = EventBus(_build_backend(), subscriber_queue_size=settings.EVENT_SUBSCRIBER_QUEUE_SIZE)
+        await event_bus.start()
+        print(f"EventBus started with '{event_bus.backend.name}' backend.")
+    return event_bus
+
+async def get_event_bus() -> EventBus:
+    # Starts lazily if the lifespan hook didn't run (e.g. scripts).
+    return event_bus if event_bus is not None else await start_event_bus()
+
+async def close_event_bus():
+    global event_bus
+    if event_bus is not None:
+        await event_bus.close()
+        event_bus = None
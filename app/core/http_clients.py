@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Pooled HTTP clients for the upstreams we talk to, owned by the FastAPI lifespan.
+# One httpx.AsyncClient per upstream, created at startup and closed at shutdown, so every call to
+# a provider reuses kept-alive (optionally HTTP/2) connections instead of paying TCP and TLS setup
+# each time, and each upstream gets its own pool limits (a slow image host can't starve the LLM).
+# Only upstreams the configuration actually calls get a client (none in the all-mock setup, which
+# therefore runs without httpx). Services receive theirs through use_http_clients() rather than
+# building one themselves; tests point an upstream at a local stub server with its *_BASE_URL
+# setting, or hand the registry a transport (httpx.MockTransport, httpx.ASGITransport) per upstream.
+#
+# Stats per upstream: requests, new TCP connections and TLS handshakes (from httpcore's trace
+# events; a request that opened no connection reused one) and a snapshot of the pool.
+
+
+class UpstreamHttpConfig:
+    def __init__(self, name: str, base_url: Optional[str], timeout: float, follow_redirects: bool = False):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.follow_redirects = follow_redirects
+        self.max_connections = settings.HTTP_POOL_MAX_CONNECTIONS_PER_UPSTREAM.get(name, settings.HTTP_POOL_MAX_CONNECTIONS)
+        self.max_keepalive = min(settings.HTTP_POOL_MAX_KEEPALIVE, self.max_connections)
+
+
+def upstream_http_configs() -> List[UpstreamHttpConfig]:
+    """The upstreams this configuration actually calls; the all-mock setup needs none."""
+    configs = []
+    if settings.LLM_API_BASE_URL:
+        configs.append(UpstreamHttpConfig("llm", settings.LLM_API_BASE_URL, settings.LLM_TIMEOUT_SECONDS))
+    if settings.IMAGE_SCRAPER_BASE_URL:
+        configs.append(UpstreamHttpConfig("image-scraper", settings.IMAGE_SCRAPER_BASE_URL, settings.IMAGE_SCRAPER_TIMEOUT_SECONDS))
+    if settings.IMAGE_VALIDATOR_BASE_URL:
+        configs.append(UpstreamHttpConfig("image-validator", settings.IMAGE_VALIDATOR_BASE_URL, settings.IMAGE_VALIDATOR_TIMEOUT_SECONDS))
+    if settings.IMAGE_VALIDATOR_BACKEND == "clip" or settings.IMAGE_STORE_BACKEND not in ("", "none"):
+        # Arbitrary image hosts (CLIP validator and image store downloads)
+        configs.append(UpstreamHttpConfig("image-fetch", None, settings.IMAGE_FETCH_TIMEOUT_SECONDS, follow_redirects=True))
+    if not settings.AUTH_DEV_BYPASS:
+        # Google's token signing certificates (see app.core.security)
+        configs.append(UpstreamHttpConfig("firebase-auth", None, settings.AUTH_CERTS_TIMEOUT_SECONDS))
+    return configs
+
+
+class PooledHttpClient:
+    """An httpx.AsyncClient plus connection-reuse counters."""
+
+    def __init__(self, config: UpstreamHttpConfig, http2: bool = False, transport: Any = None):
+        import httpx
+
+        self.config = config
+        self.http2 = http2
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.client = httpx.AsyncClient(
+            base_url=config.base_url or "",
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(config.timeout, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS, pool=settings.HTTP_POOL_TIMEOUT_SECONDS),
+            follow_redirects=config.follow_redirects,
+            transport=transport,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, request):
+        self.requests += 1
+        caller_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            if caller_trace is not None:
+                await caller_trace(event_name, info)
+        request.extensions["trace"] = trace
+
+    def _pool_snapshot(self) -> Dict[str, Any]:
+        # httpx doesn't expose its connection pool; read httpcore's if it's there (custom transports have none).
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", None) or [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        active = len(connections) - idle
+        return {
+            "connections": len(connections),
+            "active": active,
+            "idle": idle,
+            "utilization": round(active / self.config.max_connections, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "base_url": self.config.base_url,
+            "http2": self.http2,
+            "max_connections": self.config.max_connections,
+            "max_keepalive": self.config.max_keepalive,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "tls_handshakes": self.tls_handshakes,
+            "connection_reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "pool": self._pool_snapshot(),
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class HttpClientRegistry:
+    def __init__(self, configs: List[UpstreamHttpConfig], http2: bool = False, transports: Optional[Dict[str, Any]] = None):
+        try:
+            import httpx # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("Upstream HTTP clients require the 'httpx' package (pip install httpx)") from e
+        if http2:
+            try:
+                import h2 # noqa: F401
+            except ImportError as e:
+                raise RuntimeError("HTTP2_ENABLED requires the 'h2' package (pip install 'httpx[http2]')") from e
+        transports = transports or {}
+        self.clients: Dict[str, PooledHttpClient] = {
+            config.name: PooledHttpClient(config, http2=http2, transport=transports.get(config.name)) for config in configs
+        }
+
+    def get(self, name: str):
+        """The httpx.AsyncClient for an upstream, or None if it isn't configured (see upstream_http_configs())."""
+        pooled = self.clients.get(name)
+        return pooled.client if pooled is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: pooled.stats() for name, pooled in self.clients.items()}
+
+    async def aclose(self):
+        for pooled in self.clients.values():
+            await pooled.aclose()
+
+
+# Global registry, created and closed by the FastAPI lifespan.
+http_clients: Optional[HttpClientRegistry] = None
+
+def start_http_clients(
+    transports: Optional[Dict[str, Any]] = None, configs: Optional[List[UpstreamHttpConfig]] = None
+) -> Optional[HttpClientRegistry]:
+    """
+    Creates the pooled clients; `transports` maps upstream names to httpx transports and `configs`
+    overrides upstream_http_configs() (tests). Returns None, without needing httpx, if no upstream is configured.
+    """
+    global http_clients
+    configs = upstream_http_configs() if configs is None else configs
+    if not configs:
+        print("HTTP clients: none needed (all upstreams are mocked)")
+        return None
+    http_clients = HttpClientRegistry(configs, http2=settings.HTTP2_ENABLED, transports=transports)
+    print(f"HTTP clients: {', '.join(http_clients.clients)} (http2={settings.HTTP2_ENABLED})")
+    return http_clients
+
+def get_http_clients() -> Optional[HttpClientRegistry]:
+    return http_clients
+
+async def close_http_clients():
+    global http_clients
+    if http_clients is not None:
+        await http_clients.aclose()
+        http_clients = None
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Metrics and timing spans.
+# A small in-process registry of counters, histograms and gauges rendered in the Prometheus text
+# format at GET /metrics. Recording is a perf_counter() pair plus a bucket bisect under a lock,
+# so spans are cheap enough for every stage job and Firestore call.
+# Histograms are labelled by stage/operation and outcome only; the task ID would make the label
+# set unbounded, so it is attached to trace spans instead. When OTEL_TRACES_ENABLED is set, every
+# span is also emitted through the OpenTelemetry API (exporters are configured the usual way,
+# e.g. by opentelemetry-instrument and the OTEL_* environment variables).
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Task being processed by the current coroutine; the scheduler carries it into stage workers.
+current_task_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_task_id", default=None)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock() # Firestore calls complete on executor threads
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> Iterable[str]:
+        return []
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = [(key, (list(series[0]), series[1], series[2])) for key, series in self._series.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose samples are read at scrape time, e.g. queue depths and cache counters."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Iterable[Tuple[Sequence[str], float]]], kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def _samples(self) -> Iterable[str]:
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            print(f"Metrics: collecting {self.name} failed: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {value}" for values, value in samples]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        # Re-registering returns the existing metric, so modules can be reloaded safely.
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, labelnames, collect, kind="gauge"))
+
+    def counter_callback(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, labelnames, collect, kind="counter"))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "mineshear_stage_duration_seconds", "Run time of background stage jobs (LLM call, scrape, validation batch, assembly).", ["stage", "outcome"]
+)
+STAGE_QUEUE_WAIT = registry.histogram(
+    "mineshear_stage_queue_wait_seconds", "Time stage jobs spent queued before a worker picked them up.", ["stage"]
+)
+FIRESTORE_DURATION = registry.histogram(
+    "mineshear_firestore_operation_duration_seconds", "Latency of Firestore calls made through the data layer.", ["operation", "outcome"]
+)
+SQLITE_DURATION = registry.histogram(
+    "mineshear_sqlite_operation_duration_seconds", "Latency of SQLite calls made by the SQLite storage backend.", ["operation", "outcome"]
+)
+PIPELINE_DURATION = registry.histogram(
+    "mineshear_pipeline_duration_seconds", "End-to-end notebook generation time.", ["outcome"],
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+
+
+# --- Tracing (optional OpenTelemetry) ---
+
+_tracer = None
+
+def init_tracing():
+    """Enables OpenTelemetry spans if OTEL_TRACES_ENABLED. Requires the optional `opentelemetry-api` package."""
+    global _tracer
+    if not settings.OTEL_TRACES_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+    except ImportError as e:
+        raise RuntimeError("OTEL_TRACES_ENABLED requires the 'opentelemetry-api' package (pip install opentelemetry-api)") from e
+    _tracer = trace.get_tracer("mineshear")
+    print("OpenTelemetry tracing enabled.")
+
+
+def _outcome(error: Optional[BaseException]) -> str:
+    if error is None:
+        return "ok"
+    return "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+
+
+@contextlib.contextmanager
+def span(name: str, histogram: Optional[Histogram] = None, **labels) -> Iterator[None]:
+    """
+    Times the enclosed block: observes `histogram` (with `labels` plus `outcome` if the histogram
+    has that label) and, with tracing enabled, records a trace span tagged with the current task ID.
+    Works in sync and async code alike since it never awaits.
+    """
+    trace_span = None
+    if _tracer is not None:
+        attributes = {key: str(value) for key, value in labels.items()}
+        task_id = current_task_id.get()
+        if task_id: attributes["task_id"] = task_id
+        trace_span = _tracer.start_span(name, attributes=attributes)
+    started = time.perf_counter()
+    error: Optional[BaseException] = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        outcome = _outcome(error)
+        if histogram is not None:
+            histogram.observe(elapsed, **labels, outcome=outcome)
+        if trace_span is not None:
+            trace_span.set_attribute("outcome", outcome)
+            if error is not None and outcome == "error":
+                trace_span.record_exception(error)
+            trace_span.end()
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+# Hedged racing of interchangeable candidates (e.g. several scraped images for one placeholder).
+# Candidates are tried in order: the next one starts as soon as the running ones have all been
+# rejected, or when none has answered within `hedge_delay` (0 starts them all at once). The
+# first accepted candidate wins and every other attempt still running is cancelled. Compared
+# with retrying serially, a rejection costs no extra round trip and a slow attempt is overtaken
+# by its hedge, which bounds tail latency; the overall `budget` bounds it absolutely.
+
+
+class RaceOutcome:
+    def __init__(self):
+        self.winner: Optional[int] = None # Index of the accepted candidate
+        self.result: Any = None
+        self.started = 0
+        self.rejected = 0
+        self.errors: List[BaseException] = []
+        self.unused = 0 # Also accepted, but settled together with the (lower-index) winner
+        self.cancelled = 0
+        self.timed_out = False
+
+
+async def race_candidates(
+    candidates: Sequence[Any],
+    attempt: Callable[[Any], Awaitable[Any]],
+    accept: Callable[[Any], bool],
+    hedge_delay: float = 0.0,
+    budget: Optional[float] = None,
+) -> RaceOutcome:
+    """
+    Runs `attempt(candidate)` for candidates in order (hedged, see above) until one returns a
+    result for which `accept(result)` is true. An attempt that raises, or is cancelled by someone
+    else, counts as a rejection.
+    """
+    outcome = RaceOutcome()
+    deadline = time.monotonic() + budget if budget is not None else None
+    running: dict = {} # asyncio.Task -> candidate index
+    next_index = 0
+
+    def start_next():
+        nonlocal next_index
+        task = asyncio.ensure_future(attempt(candidates[next_index]))
+        running[task] = next_index
+        next_index += 1
+        outcome.started += 1
+
+    try:
+        while True:
+            if not running:
+                if next_index >= len(candidates):
+                    return outcome # Every candidate was rejected
+                start_next()
+            while hedge_delay <= 0 and next_index < len(candidates):
+                start_next() # No hedging delay: race them all
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                outcome.timed_out = True
+                return outcome
+            timeout = remaining
+            if next_index < len(candidates):
+                timeout = hedge_delay if timeout is None else min(timeout, hedge_delay)
+
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if next_index < len(candidates) and (remaining is None or remaining > hedge_delay):
+                    start_next() # Hedge: nobody answered in time, bring in the next candidate
+                continue
+            # Settle every finished attempt (so none is later counted as cancelled), lowest index first.
+            for task in sorted(done, key=running.get):
+                index = running.pop(task)
+                if task.cancelled():
+                    outcome.rejected += 1 # Cancelled from outside the race
+                    continue
+                error = task.exception()
+                if error is not None:
+                    outcome.errors.append(error)
+                    outcome.rejected += 1
+                elif not accept(task.result()):
+                    outcome.rejected += 1
+                elif outcome.winner is None:
+                    outcome.winner, outcome.result = index, task.result()
+                else:
+                    outcome.unused += 1
+            if outcome.winner is not None:
+                return outcome
+    finally:
+        # Cancel the losers (and everything, on timeout or if we were cancelled ourselves).
+        for task in running:
+            task.cancel()
+        outcome.cancelled = len(running)
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,368 @@
+import asyncio
+import collections
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Resilient calls to upstream AI services (LLM, image scraper, image validator).
+# Every upstream gets one ResilientClient, shared by all notebooks, which wraps each call in:
+# - a per-call timeout, so one hung request can't hold a notebook forever,
+# - retries with full-jitter exponential backoff, for retryable errors only,
+# - a circuit breaker: after N consecutive failures calls fail fast (CircuitOpenError) for a
+#   cool-down period, then a few half-open probe calls decide whether to close it again,
+# - an adaptive concurrency limit (AIMD): it grows while latency stays near the observed
+#   baseline and shrinks when latency climbs or calls time out, so a degrading provider gets
+#   less traffic instead of a growing pile of slow requests.
+# Breaker state, limits and retry counts are at GET /system/upstreams and on /metrics (with OPS_ENDPOINTS_ENABLED).
+
+UPSTREAM_ATTEMPTS = registry.counter(
+    "mineshear_upstream_attempts_total", "Upstream call attempts by outcome (ok, error, timeout, rejected).", ["upstream", "outcome"]
+)
+UPSTREAM_RETRIES = registry.counter(
+    "mineshear_upstream_retries_total", "Upstream calls retried after a retryable error.", ["upstream"]
+)
+
+
+class RetryableError(Exception):
+    """An upstream failure worth retrying (timeout, 5xx, dropped connection, ...)."""
+    pass
+
+
+class UpstreamTimeout(RetryableError):
+    pass
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit breaker is open; the call was not attempted."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open, retry in {retry_after:.1f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30, half_open_max_calls: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.times_opened = 0
+
+    def before_call(self, upstream: str):
+        """Raises CircuitOpenError unless a call may go through now."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.recovery_seconds - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(upstream, remaining)
+            self.state = self.HALF_OPEN # Cool-down over: let probes through
+            self.probes_in_flight = 0
+        if self.state == self.HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_max_calls:
+                raise CircuitOpenError(upstream, self.recovery_seconds)
+            self.probes_in_flight += 1
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state == self.HALF_OPEN:
+            print("CircuitBreaker: probe succeeded, closing circuit")
+        self.state = self.CLOSED
+        self.probes_in_flight = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probes_in_flight = 0
+
+    def release_probe(self):
+        # A half-open probe that ended without a verdict (e.g. a non-retryable error or cancellation).
+        if self.state == self.HALF_OPEN and self.probes_in_flight:
+            self.probes_in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by latency: +1/limit per fast call (about +1 per window of
+    calls), x`backoff` when the smoothed latency exceeds `tolerance` x the baseline or a call
+    times out, at most once per smoothed latency so one slow window isn't punished repeatedly.
+    The baseline is the lowest recent latency (at least `min_baseline`) and slowly forgets old minimums.
+    """
+
+    def __init__(
+        self,
+        initial: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        min_baseline: float = 0.05,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.min_baseline = min_baseline
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self.smoothed: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter # in_flight was incremented for us by _wake()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release() # Granted a slot just as we were cancelled: hand it on
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        self.in_flight -= 1
+        if overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _observe(self, latency: float):
+        self.smoothed = latency if self.smoothed is None else 0.8 * self.smoothed + 0.2 * latency
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = max(latency, self.min_baseline)
+        else:
+            self.baseline += (latency - self.baseline) * 0.01 # Forget a stale minimum slowly
+        if self.smoothed > self.baseline * self.tolerance:
+            self._decrease()
+        elif self.in_flight + 1 >= self.limit / 2: # Only grow while the current limit is actually used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= (self.smoothed or 0):
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = now
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "baseline_latency": round(self.baseline, 4) if self.baseline is not None else None,
+            "smoothed_latency": round(self.smoothed, 4) if self.smoothed is not None else None,
+        }
+
+
+class ResilientClient:
+    def __init__(
+        self,
+        name: str,
+        timeout_seconds: float,
+        max_attempts: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        retry_on: Tuple[Type[BaseException], ...] = (RetryableError, ConnectionError),
+    ):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.retry_on = retry_on
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries from many notebooks instead of synchronizing them.
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+
+    async def _before_attempt(self):
+        """Passes the breaker, then waits for a concurrency slot."""
+        try:
+            self.breaker.before_call(self.name)
+        except CircuitOpenError:
+            self.rejected += 1
+            UPSTREAM_ATTEMPTS.inc(upstream=self.name, outcome="rejected")
+            raise
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+    def _record(self, error: Optional[BaseException], latency: float):
+        """Feeds one finished attempt to the breaker and limiter. Returns True if it should be retried."""
+        if error is None:
+            self.breaker.record_success()
+            self.limiter.release(latency)
+            UPSTREAM_ATTEMPTS.inc(upstream=self.name, outcome="ok")
+            return False
+        timed_out = isinstance(error, UpstreamTimeout)
+        retryable = isinstance(error, self.retry_on)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe() # Caller errors and cancellation say nothing about upstream health
+        self.limiter.release(None if timed_out or not retryable else latency, overloaded=timed_out)
+        if timed_out: self.timeouts += 1
+        if retryable: self.failures += 1
+        UPSTREAM_ATTEMPTS.inc(upstream=self.name, outcome="timeout" if timed_out else "error")
+        return retryable
+
+    async def _retry_wait(self, attempt: int, error: BaseException) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        self.retries += 1
+        UPSTREAM_RETRIES.inc(upstream=self.name)
+        delay = self._backoff(attempt)
+        print(f"[{self.name}] attempt {attempt} failed ({error!r}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return True
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Awaits fn(*args, **kwargs) with timeout, retries, circuit breaker and concurrency limit."""
+        self.calls += 1
+        timeout = self.timeout_seconds if timeout is None else timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._before_attempt()
+            started = time.monotonic()
+            try:
+                try:
+                    result = await asyncio.wait_for(fn(*args, **kwargs), timeout)
+                except asyncio.TimeoutError as e:
+                    raise UpstreamTimeout(f"{self.name} did not respond within {timeout:.1f}s") from e
+            except BaseException as e:
+                if not self._record(e, time.monotonic() - started) or not await self._retry_wait(attempt, e):
+                    raise
+                continue
+            self._record(None, time.monotonic() - started)
+            return result
+
+    async def stream(
+        self,
+        make_stream: Callable[..., AsyncIterator[Any]],
+        *args,
+        first_item_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[Any]:
+        """
+        Streaming variant of call(). Attempts are retried only until the first item arrives;
+        after that, items are passed through and a stall longer than `idle_timeout` fails the stream.
+        """
+        self.calls += 1
+        first_item_timeout = self.timeout_seconds if first_item_timeout is None else first_item_timeout
+        idle_timeout = first_item_timeout if idle_timeout is None else idle_timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._before_attempt()
+            started = time.monotonic()
+            first_latency = None
+            iterator = make_stream(*args, **kwargs).__aiter__()
+            try:
+                try:
+                    while True:
+                        timeout = first_item_timeout if first_latency is None else idle_timeout
+                        try:
+                            item = await asyncio.wait_for(iterator.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError as e:
+                            raise UpstreamTimeout(f"{self.name} stream stalled for {timeout:.1f}s") from e
+                        if first_latency is None:
+                            first_latency = time.monotonic() - started # Time to first item drives the limiter
+                        yield item
+                finally:
+                    aclose = getattr(iterator, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+            except BaseException as e:
+                retryable = self._record(e, first_latency or (time.monotonic() - started))
+                if first_latency is not None or not retryable or not await self._retry_wait(attempt, e):
+                    raise
+                continue
+            self._record(None, first_latency or (time.monotonic() - started))
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "timeout_seconds": self.timeout_seconds,
+            "breaker": self.breaker.stats(),
+            "concurrency": self.limiter.stats(),
+        }
+
+
+# Every client created through upstream_client(), by upstream name (for stats and /metrics).
+upstream_clients: Dict[str, ResilientClient] = {}
+
+def upstream_client(name: str, timeout_seconds: float) -> ResilientClient:
+    """Creates (or returns) the shared client for an upstream, configured from the UPSTREAM_* settings."""
+    if name not in upstream_clients:
+        upstream_clients[name] = ResilientClient(
+            name,
+            timeout_seconds=timeout_seconds,
+            max_attempts=settings.UPSTREAM_MAX_ATTEMPTS,
+            retry_base_delay=settings.UPSTREAM_RETRY_BASE_DELAY_SECONDS,
+            retry_max_delay=settings.UPSTREAM_RETRY_MAX_DELAY_SECONDS,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.UPSTREAM_BREAKER_FAILURE_THRESHOLD,
+                recovery_seconds=settings.UPSTREAM_BREAKER_RECOVERY_SECONDS,
+                half_open_max_calls=settings.UPSTREAM_BREAKER_HALF_OPEN_CALLS,
+            ),
+            limiter=AdaptiveConcurrencyLimiter(
+                initial=settings.UPSTREAM_CONCURRENCY_INITIAL,
+                min_limit=settings.UPSTREAM_CONCURRENCY_MIN,
+                max_limit=settings.UPSTREAM_CONCURRENCY_MAX,
+                tolerance=settings.UPSTREAM_LATENCY_TOLERANCE,
+            ),
+        )
+    return upstream_clients[name]
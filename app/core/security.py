@@ -0,0 +1,172 @@
+import hashlib
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.core.http_clients import get_http_clients
+
+# Firebase ID token verification with caching built in.
+# This does what firebase_admin.auth.verify_id_token() does (RS256 signature against Google's
+# rotating securetoken certificates, audience/issuer/expiry/subject checks), but:
+# - the signing certificates are cached until the expiry announced in the response's Cache-Control,
+# - successfully verified tokens are cached (by SHA-256 of the token) until their own `exp`,
+# so a client polling with the same token pays for one signature check, not one per request.
+# The certificate fetcher is injectable, so tests can use locally minted keys and tokens.
+# Needs PyJWT and cryptography (and httpx to fetch the certificates), imported on first use so the
+# app runs without them when AUTH_DEV_BYPASS is on.
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+KeyFetcher = Callable[[], Awaitable[Tuple[Dict[str, str], float]]] # -> ({kid: PEM certificate}, max_age_seconds)
+
+
+class InvalidTokenError(Exception):
+    """The ID token is malformed, expired, or fails verification."""
+    pass
+
+
+def _import_jwt():
+    try:
+        import jwt
+        import cryptography # noqa: F401 (PyJWT's RS256 support)
+    except ImportError as e:
+        raise RuntimeError("Firebase ID token verification requires PyJWT and cryptography (pip install 'pyjwt[crypto]')") from e
+    return jwt
+
+
+async def fetch_google_certificates() -> Tuple[Dict[str, str], float]:
+    """Downloads the current signing certificates and how long they may be cached."""
+    registry = get_http_clients()
+    client = registry.get("firebase-auth") if registry is not None else None
+    if client is not None:
+        response = await client.get(GOOGLE_CERTS_URL) # Pooled client from the lifespan
+    else:
+        try:
+            import httpx
+        except ImportError as e:
+            raise RuntimeError("Fetching Firebase signing keys requires the 'httpx' package (pip install httpx)") from e
+        async with httpx.AsyncClient(timeout=settings.AUTH_CERTS_TIMEOUT_SECONDS) as client:
+            response = await client.get(GOOGLE_CERTS_URL)
+    response.raise_for_status()
+    match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+    return response.json(), float(match.group(1)) if match else 3600.0
+
+
+class PublicKeyCache:
+    """Signing keys by key ID, refreshed when the cached set expires or an unknown `kid` shows up."""
+
+    def __init__(self, fetcher: KeyFetcher = fetch_google_certificates, min_refresh_interval: float = 30):
+        self.fetcher = fetcher
+        self.min_refresh_interval = min_refresh_interval # Stops forged `kid`s from forcing a fetch per request
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._last_refresh = float("-inf")
+        self._single_flight = SingleFlight()
+        self.refreshes = 0
+
+    async def get_key(self, kid: str) -> Any:
+        now = time.monotonic()
+        if now >= self._expires_at or (kid not in self._keys and now - self._last_refresh >= self.min_refresh_interval):
+            await self._single_flight.do("refresh", self._refresh)
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key ID: {kid}")
+        return key
+
+    async def _refresh(self):
+        _import_jwt()
+        from cryptography.x509 import load_pem_x509_certificate
+
+        certificates, max_age = await self.fetcher()
+        self._keys = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in certificates.items()
+        }
+        now = time.monotonic()
+        self._last_refresh = now
+        self._expires_at = now + max_age
+        self.refreshes += 1
+        print(f"Refreshed {len(self._keys)} Firebase signing keys (valid for {max_age:.0f}s).")
+
+
+class FirebaseTokenVerifier:
+    def __init__(
+        self,
+        project_id: str,
+        key_cache: Optional[PublicKeyCache] = None,
+        token_cache_size: int = 10000,
+        clock_skew_seconds: int = 60,
+    ):
+        self.project_id = project_id
+        self.key_cache = key_cache or PublicKeyCache()
+        self.clock_skew_seconds = clock_skew_seconds
+        # Entries expire individually at the token's own `exp` (see verify()).
+        self.token_cache = TTLCache(max_entries=token_cache_size, ttl_seconds=3600)
+
+    async def verify(self, id_token: str) -> Dict[str, Any]:
+        """Returns the decoded claims (with `uid`) of a valid Firebase ID token, else raises InvalidTokenError."""
+        token_hash = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+        claims = self.token_cache.get(token_hash)
+        if claims is not None:
+            return claims
+
+        jwt = _import_jwt()
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(f"Malformed token: {e}") from e
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise InvalidTokenError("Token must be RS256-signed and carry a key ID")
+
+        key = await self.key_cache.get_key(header["kid"])
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=f"https://securetoken.google.com/{self.project_id}",
+                leeway=self.clock_skew_seconds,
+                options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e)) from e
+
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise InvalidTokenError("Token has an invalid subject (uid)")
+        if claims.get("auth_time", 0) > time.time() + self.clock_skew_seconds:
+            raise InvalidTokenError("Token auth_time is in the future")
+        claims["uid"] = subject
+
+        remaining = claims["exp"] - time.time()
+        if remaining > 0:
+            self.token_cache.set(token_hash, claims, ttl_seconds=remaining)
+        return claims
+
+    def stats(self) -> Dict[str, Any]:
+        return {"key_refreshes": self.key_cache.refreshes, "tokens": self.token_cache.stats()}
+
+
+# User profiles (users/{uid}) are cached briefly. This service never writes them (they are created and
+# edited outside it), so AUTH_USER_CACHE_TTL_SECONDS is what bounds staleness; a write path added here
+# must call invalidate_user_profile() after updating one.
+user_profile_cache = TTLCache(max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES, ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+def invalidate_user_profile(uid: str):
+    user_profile_cache.delete(uid)
+
+token_verifier: Optional[FirebaseTokenVerifier] = None
+
+def get_token_verifier() -> FirebaseTokenVerifier:
+    global token_verifier
+    if token_verifier is None:
+        if not settings.FIREBASE_PROJECT_ID:
+            raise RuntimeError("FIREBASE_PROJECT_ID must be set to verify Firebase ID tokens.")
+        token_verifier = FirebaseTokenVerifier(
+            settings.FIREBASE_PROJECT_ID,
+            token_cache_size=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+        )
+    return token_verifier
@@ -0,0 +1,118 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.core.config import settings
+from app.core.metrics import FIRESTORE_DURATION, span
+from app.db.firestore import get_firestore_client
+from app.db.memory import InMemoryFirestoreClient
+
+# Non-blocking data access layer.
+# The Firestore client from firebase_admin is synchronous: calling .get()/.set()/.update()
+# inside an `async def` blocks the event loop for every other request. AsyncFirestore runs
+# those calls on a dedicated, size-bounded thread pool instead, so handlers and background
+# tasks only await. Going through an executor (rather than firestore.AsyncClient) keeps the
+# pool size explicit and lets the same layer drive the in-memory fake or the emulator
+# (set FIRESTORE_EMULATOR_HOST) without code changes.
+
+
+class AsyncFirestore:
+    def __init__(self, client: Any, pool_size: int):
+        self.client = client
+        self.pool_size = max(1, pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="firestore")
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs any blocking Firestore call (queries, batch commits, ...) on the data-layer pool."""
+        loop = asyncio.get_running_loop()
+        operation = getattr(fn, "__name__", "call") # get, set, update, commit, ...
+        with span(f"firestore.{operation}", FIRESTORE_DURATION, operation=operation):
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    # --- Document references (the one place the collection layout is spelled out) ---
+
+    def notebooks_collection(self, user_id: str):
+        return self.client.collection("users").document(user_id).collection("notebooks")
+
+    def notebook_ref(self, user_id: str, notebook_id: str):
+        return self.notebooks_collection(user_id).document(notebook_id)
+
+    def notebook_content_ref(self, user_id: str, notebook_id: str, part: int):
+        # Compressed body chunks, see app.db.notebook_content
+        return self.notebook_ref(user_id, notebook_id).collection("content").document(str(part))
+
+    def tasks_collection(self):
+        return self.client.collection("tasks")
+
+    def task_ref(self, task_id: str):
+        return self.tasks_collection().document(task_id)
+
+    def user_ref(self, user_id: str):
+        return self.client.collection("users").document(user_id)
+
+    def batch_ref(self, batch_id: str):
+        return self.client.collection("notebook_batches").document(batch_id)
+
+    def image_assets_collection(self):
+        return self.client.collection("image_assets")
+
+    def image_source_ref(self, source_id: str):
+        return self.client.collection("image_sources").document(source_id)
+
+    # --- Basic document operations ---
+
+    async def get(self, doc_ref) -> Optional[Dict[str, Any]]:
+        """Returns the document data, or None if it does not exist."""
+        doc = await self.run(doc_ref.get)
+        return doc.to_dict() if doc.exists else None
+
+    async def set(self, doc_ref, data: Dict[str, Any], merge: bool = False):
+        await self.run(doc_ref.set, data, merge=merge)
+
+    async def update(self, doc_ref, data: Dict[str, Any]):
+        await self.run(doc_ref.update, data)
+
+    async def get_all(self, doc_refs: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Reads many documents in one round trip. Returns {doc_id: data} for those that exist."""
+        def get_all():
+            return {doc.id: doc.to_dict() for doc in self.client.get_all(list(doc_refs)) if doc.exists}
+        return await self.run(get_all)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+# Global data layer, created and torn down by the FastAPI lifespan.
+async_db: Optional[AsyncFirestore] = None
+
+def init_async_db(client: Any = None) -> AsyncFirestore:
+    """
+    Creates the global AsyncFirestore. `client` overrides the configured backend,
+    e.g. to pass a pre-populated InMemoryFirestoreClient in tests.
+    """
+    global async_db
+    if async_db is not None:
+        async_db.close()
+    if client is None:
+        if settings.FIRESTORE_BACKEND == "memory":
+            client = InMemoryFirestoreClient()
+            print("Using in-memory Firestore backend.")
+        else:
+            client = get_firestore_client()
+    async_db = AsyncFirestore(client, pool_size=settings.FIRESTORE_EXECUTOR_POOL_SIZE)
+    print(f"Async Firestore data layer ready (pool size {async_db.pool_size}).")
+    return async_db
+
+def get_async_db() -> AsyncFirestore:
+    if async_db is None:
+        # Mirrors get_firestore_client(): initialize lazily if the lifespan hook didn't run (e.g. scripts).
+        print("Warning: Async data layer requested but not initialized. Attempting to initialize now.")
+        return init_async_db()
+    return async_db
+
+def close_async_db():
+    global async_db
+    if async_db is not None:
+        async_db.close()
+        async_db = None
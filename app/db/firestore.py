@@ -16,6 +16,11 @@ def initialize_firebase_admin():
             firebase_admin.initialize_app(cred)
             print("Firebase Admin SDK initialized successfully.")
             db = firestore.client()
+        elif os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            # The emulator accepts unauthenticated clients; only a project ID is required.
+            firebase_admin.initialize_app(options={"projectId": settings.FIREBASE_PROJECT_ID or "demo-project"})
+            print(f"Firebase Admin SDK initialized against emulator at {os.environ['FIRESTORE_EMULATOR_HOST']}.")
+            db = firestore.client()
         elif settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH:
             print(f"Warning: Firebase service account key file not found at {settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH}. Firestore will not be available.")
         else:
@@ -38,18 +43,6 @@ def get_firestore_client():
              raise Exception("Firestore client is not available. Firebase Admin SDK might not have been initialized correctly.")
     return db
 
-# Example of how you might use this (CRUD operations will go into service layers or specific db interaction files)
-# async def get_document(collection_name: str, document_id: str):
-#     client = get_firestore_client()
-#     doc_ref = client.collection(collection_name).document(document_id)
-#     doc = await doc_ref.get() # For async, use firestore.AsyncClient and async methods
-#     if doc.exists:
-#         return doc.to_dict()
-#     return None
-
-# Note: For a production FastAPI app, especially with async endpoints,
-# you should use `firebase_admin.firestore.AsyncClient`.
-# The current `firestore.client()` is synchronous.
-# For this iteration, we'll keep it simple and address async client later if needed.
-# Let's assume for now that background tasks might use this sync client,
-# and API endpoints needing direct Firestore access would be refactored for async if performance becomes an issue.
+# Note: the client above is synchronous. Async code (request handlers, background tasks)
+# should go through app.db.async_firestore.get_async_db(), which runs these calls on a
+# dedicated thread pool instead of blocking the event loop.
@@ -0,0 +1,156 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.core.config import settings
+from app.db.async_firestore import AsyncFirestore
+from app.db.repository import Cursor, Repository, RepositoryBatch, Row
+
+# Firestore implementation of the storage interface.
+# Layout: users/{uid}/notebooks/{id} (metadata), .../notebooks/{id}/content/{part} (body chunks),
+# tasks/{id}, notebook_batches/{id}, users/{uid}, image_assets/{sha256}, image_sources/{url hash}.
+# Listings need the composite indexes in firestore.indexes.json. Every call runs on the
+# AsyncFirestore executor.
+
+DOCUMENT_ID = "__name__" # FieldPath.document_id()
+DESCENDING = "DESCENDING"
+
+
+class FirestoreRepositoryBatch(RepositoryBatch):
+    def __init__(self, adb: AsyncFirestore):
+        self.adb = adb
+        self._batch = adb.client.batch()
+        self._count = 0
+
+    def _add(self, op: str, doc_ref, *args):
+        getattr(self._batch, op)(doc_ref, *args)
+        self._count += 1
+
+    def create_notebook(self, user_id: str, notebook_id: str, data: Dict[str, Any]):
+        self._add("set", self.adb.notebook_ref(user_id, notebook_id), data)
+
+    def update_notebook(self, user_id: str, notebook_id: str, fields: Dict[str, Any]):
+        self._add("update", self.adb.notebook_ref(user_id, notebook_id), fields)
+
+    def delete_notebook(self, user_id: str, notebook_id: str):
+        self._add("delete", self.adb.notebook_ref(user_id, notebook_id))
+
+    def set_notebook_content(self, user_id: str, notebook_id: str, chunks: Sequence[bytes], previous_chunks: int = 0):
+        for part, chunk in enumerate(chunks):
+            self._add("set", self.adb.notebook_content_ref(user_id, notebook_id, part), {"index": part, "data": chunk})
+        for part in range(len(chunks), previous_chunks):
+            self._add("delete", self.adb.notebook_content_ref(user_id, notebook_id, part))
+
+    def create_task(self, task_id: str, data: Dict[str, Any]):
+        self._add("set", self.adb.task_ref(task_id), data)
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]):
+        self._add("update", self.adb.task_ref(task_id), fields)
+
+    def delete_task(self, task_id: str):
+        self._add("delete", self.adb.task_ref(task_id))
+
+    def create_batch(self, batch_id: str, data: Dict[str, Any]):
+        self._add("set", self.adb.batch_ref(batch_id), data)
+
+    def __len__(self) -> int:
+        return self._count
+
+    async def commit(self):
+        await self.adb.run(self._batch.commit)
+
+
+class FirestoreRepository(Repository):
+    name = "firestore"
+    max_batch_writes = settings.FIRESTORE_BATCH_MAX_WRITES
+
+    def __init__(self, adb: AsyncFirestore):
+        self.adb = adb
+
+    def batch(self) -> FirestoreRepositoryBatch:
+        return FirestoreRepositoryBatch(self.adb)
+
+    async def get_notebook(self, user_id: str, notebook_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.notebook_ref(user_id, notebook_id))
+
+    async def get_notebook_content(self, user_id: str, notebook_id: str, chunks: int) -> List[bytes]:
+        refs = [self.adb.notebook_content_ref(user_id, notebook_id, part) for part in range(chunks)]
+        found = await self.adb.get_all(refs)
+        return [found.get(str(part), {}).get("data", b"") for part in range(chunks)]
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.task_ref(task_id))
+
+    async def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        return await self.adb.get_all(self.adb.task_ref(task_id) for task_id in task_ids)
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.batch_ref(batch_id))
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.user_ref(user_id))
+
+    async def _list(self, query, equals, fields, limit, created_after, created_before, start_after) -> List[Row]:
+        for field_path, value in equals.items():
+            query = query.where(field_path, "==", value)
+        if created_after is not None:
+            query = query.where("created_at", ">=", created_after)
+        if created_before is not None:
+            query = query.where("created_at", "<", created_before)
+        query = query.order_by("created_at", DESCENDING).order_by(DOCUMENT_ID, DESCENDING)
+        if start_after is not None:
+            created_at, doc_id = start_after
+            query = query.start_after({"created_at": created_at, DOCUMENT_ID: doc_id})
+        query = query.select(list(fields)).limit(limit)
+
+        def stream_query():
+            return [(snapshot.id, snapshot.to_dict() or {}) for snapshot in query.stream()]
+        return await self.adb.run(stream_query)
+
+    async def list_notebooks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        query = self.adb.notebooks_collection(user_id)
+        return await self._list(query, equals, fields, limit, created_after, created_before, start_after)
+
+    async def list_tasks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        query = self.adb.tasks_collection()
+        return await self._list(query, {"user_id": user_id, **equals}, fields, limit, created_after, created_before, start_after)
+
+    async def get_image_asset(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.image_assets_collection().document(asset_id))
+
+    async def find_image_assets(self, phash_bands: Sequence[str], limit: int) -> List[Row]:
+        # array-contains-any takes at most 30 values; the store uses 8 bands.
+        query = self.adb.image_assets_collection().where("phash_bands", "array-contains-any", list(phash_bands)).limit(limit)
+
+        def stream_query():
+            return [(snapshot.id, snapshot.to_dict() or {}) for snapshot in query.stream()]
+        return await self.adb.run(stream_query)
+
+    async def save_image_asset(self, asset_id: str, data: Dict[str, Any]):
+        await self.adb.set(self.adb.image_assets_collection().document(asset_id), data)
+
+    async def get_image_source(self, source_id: str) -> Optional[Dict[str, Any]]:
+        return await self.adb.get(self.adb.image_source_ref(source_id))
+
+    async def save_image_source(self, source_id: str, data: Dict[str, Any]):
+        await self.adb.set(self.adb.image_source_ref(source_id), data)
+
+    def stats(self) -> Dict[str, Any]:
+        # Operation counters are only available from the in-memory fake.
+        return dict(getattr(self.adb.client, "stats", {}))
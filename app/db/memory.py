@@ -0,0 +1,356 @@
+import copy
+import functools
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# A small in-memory stand-in for the synchronous Firestore client.
+# It implements the subset of the google-cloud-firestore API this app uses
+# (collection/document references, get/set/update/delete, batches, get_all and simple queries)
+# so services and background tasks can run without Firebase, e.g. in tests or local benchmarks.
+
+
+class InMemoryNotFound(Exception):
+    """Raised by update() on a document that does not exist (mirrors google.api_core NotFound)."""
+    pass
+
+
+class InMemoryDocumentSnapshot:
+    def __init__(self, reference: "InMemoryDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value: Any = self._data or {}
+        for part in field_path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+class InMemoryDocumentReference:
+    def __init__(self, client: "InMemoryFirestoreClient", path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    def collection(self, collection_id: str) -> "InMemoryCollectionReference":
+        return InMemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, *args, **kwargs) -> InMemoryDocumentSnapshot:
+        return self._client._get(self)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        self._client._set(self, document_data, merge=merge)
+
+    def update(self, field_updates: Dict[str, Any]):
+        self._client._update(self, field_updates)
+
+    def delete(self):
+        self._client._delete(self)
+
+
+class InMemoryCollectionReference:
+    def __init__(self, client: "InMemoryFirestoreClient", path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> InMemoryDocumentReference:
+        return InMemoryDocumentReference(self._client, f"{self.path}/{document_id or uuid.uuid4().hex}")
+
+    # Queries: the collection itself acts as an unfiltered query, as in the real client.
+
+    def _query(self) -> "InMemoryQuery":
+        return InMemoryQuery(self)
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "InMemoryQuery":
+        return self._query().where(field_path, op_string, value)
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "InMemoryQuery":
+        return self._query().order_by(field_path, direction)
+
+    def limit(self, count: int) -> "InMemoryQuery":
+        return self._query().limit(count)
+
+    def select(self, field_paths: Iterable[str]) -> "InMemoryQuery":
+        return self._query().select(field_paths)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "InMemoryQuery":
+        return self._query().start_after(document_fields_or_snapshot)
+
+    def stream(self, *args, **kwargs) -> Iterator[InMemoryDocumentSnapshot]:
+        return self._query().stream()
+
+    def get(self, *args, **kwargs) -> List[InMemoryDocumentSnapshot]:
+        return self._query().get()
+
+
+DOCUMENT_ID = "__name__" # FieldPath.document_id()
+
+_MISSING = object()
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array-contains": lambda a, b: isinstance(a, list) and b in a,
+    "array-contains-any": lambda a, b: isinstance(a, list) and any(item in a for item in b),
+}
+
+
+def _field_value(document_id: str, data: Dict[str, Any], field_path: str) -> Any:
+    if field_path == DOCUMENT_ID:
+        return document_id
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+class InMemoryQuery:
+    """
+    Immutable query over one collection supporting where/order_by/limit/select/start_after.
+    Like Firestore, documents missing an ordered or filtered field are excluded, and ties are
+    broken by document ID in the direction of the last ordering. Values are compared with
+    Python's operators, so keep field types consistent (as Firestore indexes effectively require).
+    """
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, collection: InMemoryCollectionReference):
+        self._collection = collection
+        self._client = collection._client
+        self._filters: List[tuple] = []
+        self._orders: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._projection: Optional[List[str]] = None
+        self._start_after: Optional[Any] = None
+
+    def _copy(self, **changes) -> "InMemoryQuery":
+        query = copy.copy(self)
+        query._filters, query._orders = list(self._filters), list(self._orders)
+        for name, value in changes.items():
+            setattr(query, name, value)
+        return query
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "InMemoryQuery":
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op_string}")
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "InMemoryQuery":
+        if direction not in (self.ASCENDING, self.DESCENDING):
+            raise ValueError(f"Invalid direction: {direction}")
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> "InMemoryQuery":
+        return self._copy(_limit=count)
+
+    def select(self, field_paths: Iterable[str]) -> "InMemoryQuery":
+        return self._copy(_projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "InMemoryQuery":
+        return self._copy(_start_after=document_fields_or_snapshot)
+
+    def _effective_orders(self) -> List[tuple]:
+        orders = list(self._orders)
+        if not any(field_path == DOCUMENT_ID for field_path, _ in orders):
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else self.ASCENDING))
+        return orders
+
+    def _cursor_values(self, orders: List[tuple]) -> List[Any]:
+        cursor = self._start_after
+        if isinstance(cursor, InMemoryDocumentSnapshot):
+            data = cursor.to_dict() or {}
+            return [_field_value(cursor.id, data, field_path) for field_path, _ in orders]
+        # A dict cursor gives values for a prefix of the orderings; `__name__` may be an ID or a reference.
+        values = []
+        for field_path, _ in orders:
+            if field_path not in cursor:
+                break
+            value = cursor[field_path]
+            values.append(value.id if isinstance(value, InMemoryDocumentReference) else value)
+        return values
+
+    def _matches(self, document_id: str, data: Dict[str, Any]) -> bool:
+        for field_path, op_string, value in self._filters:
+            field = _field_value(document_id, data, field_path)
+            if field is _MISSING or not _OPERATORS[op_string](field, value):
+                return False
+        return all(_field_value(document_id, data, field_path) is not _MISSING for field_path, _ in self._orders)
+
+    @staticmethod
+    def _compare(left: List[Any], right: List[Any], orders: List[tuple]) -> int:
+        for a, b, (_, direction) in zip(left, right, orders):
+            if a != b:
+                result = -1 if a < b else 1
+                return result if direction == InMemoryQuery.ASCENDING else -result
+        return 0
+
+    def stream(self, *args, **kwargs) -> Iterator[InMemoryDocumentSnapshot]:
+        prefix = self._collection.path + "/"
+        orders = self._effective_orders()
+        with self._client._lock:
+            candidates = [
+                (path[len(prefix):], data) for path, data in self._client._documents.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+            rows = []
+            for document_id, data in candidates:
+                if self._matches(document_id, data):
+                    rows.append(([_field_value(document_id, data, field_path) for field_path, _ in orders], document_id, data))
+            rows.sort(key=functools.cmp_to_key(lambda x, y: self._compare(x[0], y[0], orders)))
+            if self._start_after is not None:
+                cursor = self._cursor_values(orders)
+                rows = [row for row in rows if self._compare(row[0][:len(cursor)], cursor, orders) > 0]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+            self._client.stats["reads"] += max(1, len(rows)) # Firestore bills an empty result as one read
+            snapshots = []
+            for _, document_id, data in rows:
+                if self._projection is not None:
+                    projected: Dict[str, Any] = {}
+                    for field_path in self._projection:
+                        value = _field_value(document_id, data, field_path)
+                        if value is not _MISSING:
+                            projected[field_path] = value
+                    data = projected
+                snapshots.append(InMemoryDocumentSnapshot(self._collection.document(document_id), copy.deepcopy(data)))
+        return iter(snapshots)
+
+    def get(self, *args, **kwargs) -> List[InMemoryDocumentSnapshot]:
+        return list(self.stream())
+
+
+class InMemoryWriteBatch:
+    """Buffers writes and applies them atomically on commit(), like firestore.WriteBatch."""
+
+    def __init__(self, client: "InMemoryFirestoreClient"):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def set(self, reference: InMemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference: InMemoryDocumentReference, field_updates: Dict[str, Any]):
+        self._writes.append(("update", reference, field_updates, False))
+
+    def delete(self, reference: InMemoryDocumentReference):
+        self._writes.append(("delete", reference, None, False))
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self):
+        self._client._commit(self._writes)
+        self._writes = []
+
+
+class InMemoryFirestoreClient:
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        # Operation counters, handy for asserting write/read volume in tests and benchmarks.
+        self.stats: Dict[str, int] = {"reads": 0, "writes": 0, "commits": 0}
+
+    def collection(self, collection_id: str) -> InMemoryCollectionReference:
+        return InMemoryCollectionReference(self, collection_id)
+
+    def document(self, document_path: str) -> InMemoryDocumentReference:
+        return InMemoryDocumentReference(self, document_path)
+
+    def batch(self) -> InMemoryWriteBatch:
+        return InMemoryWriteBatch(self)
+
+    def get_all(self, references: Iterable[InMemoryDocumentReference], *args, **kwargs):
+        with self._lock:
+            for reference in references:
+                yield self._get(reference)
+
+    def reset(self):
+        with self._lock:
+            self._documents.clear()
+            self.stats = {"reads": 0, "writes": 0, "commits": 0}
+
+    # --- internal operations (always called with or acquiring the lock) ---
+
+    def _get(self, reference: InMemoryDocumentReference) -> InMemoryDocumentSnapshot:
+        with self._lock:
+            self.stats["reads"] += 1
+            data = self._documents.get(reference.path)
+            return InMemoryDocumentSnapshot(reference, copy.deepcopy(data) if data is not None else None)
+
+    def _set(self, reference: InMemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        with self._lock:
+            self.stats["writes"] += 1
+            if merge and reference.path in self._documents:
+                self._documents[reference.path].update(copy.deepcopy(document_data))
+            else:
+                self._documents[reference.path] = copy.deepcopy(document_data)
+
+    def _update(self, reference: InMemoryDocumentReference, field_updates: Dict[str, Any]):
+        with self._lock:
+            document = self._documents.get(reference.path)
+            if document is None:
+                raise InMemoryNotFound(f"No document to update: {reference.path}")
+            self.stats["writes"] += 1
+            for field_path, value in field_updates.items():
+                # Dotted paths update nested map fields, as in Firestore.
+                target = document
+                *parents, leaf = field_path.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = copy.deepcopy(value)
+
+    def _delete(self, reference: InMemoryDocumentReference):
+        with self._lock:
+            self.stats["writes"] += 1
+            self._documents.pop(reference.path, None)
+
+    def _commit(self, writes: List[tuple]):
+        with self._lock:
+            # Validate first so a failing update leaves nothing half-applied.
+            pending = set(self._documents)
+            for op, reference, _, _ in writes:
+                if op == "set":
+                    pending.add(reference.path)
+                elif op == "delete":
+                    pending.discard(reference.path)
+                elif reference.path not in pending:
+                    raise InMemoryNotFound(f"No document to update: {reference.path}")
+            self.stats["commits"] += 1
+            for op, reference, data, merge in writes:
+                if op == "set":
+                    self._set(reference, data, merge=merge)
+                elif op == "update":
+                    self._update(reference, data)
+                else:
+                    self._delete(reference)
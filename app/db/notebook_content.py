@@ -0,0 +1,83 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Notebook body storage.
+# The notebook document (users/{uid}/notebooks/{id}) only holds metadata and status. The body,
+# i.e. CONTENT_FIELDS, is serialized as one JSON object, compressed, and stored in the
+# notebook's `content` subcollection as one or more chunk documents (content/0, content/1, ...),
+# each below Firestore's 1 MiB document limit. The metadata document carries a small descriptor
+# (`content`) saying how to read it back, so status reads never move the body, and the body is
+# only fetched (with one get_all) when a client asks for it.
+
+CONTENT_FIELDS = ("llm_generated_text_with_placeholders", "image_requests", "final_content", "final_content_html")
+
+try:
+    import zstandard
+except ImportError: # Optional; gzip is always available
+    zstandard = None
+
+
+def resolve_codec(codec: str) -> str:
+    if codec == "zstd" and zstandard is None:
+        return "gzip"
+    if codec not in ("zstd", "gzip", "identity"):
+        raise ValueError(f"Unknown notebook content codec: {codec}")
+    return codec
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    if codec == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    return raw
+
+
+def _decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Notebook content is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "gzip":
+        return gzip.decompress(blob)
+    return blob
+
+
+def split_content(fields: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Splits document fields into (metadata fields, content fields)."""
+    metadata = {key: value for key, value in fields.items() if key not in CONTENT_FIELDS}
+    content = {key: value for key, value in fields.items() if key in CONTENT_FIELDS}
+    return metadata, content
+
+
+def encode_content(
+    content: Dict[str, Any],
+    codec: Optional[str] = None,
+    chunk_bytes: Optional[int] = None,
+) -> Tuple[Dict[str, Any], List[bytes]]:
+    """Returns the descriptor for the metadata document and the compressed chunks to store."""
+    codec = resolve_codec(codec or settings.NOTEBOOK_CONTENT_CODEC)
+    chunk_bytes = max(1, chunk_bytes or settings.NOTEBOOK_CONTENT_CHUNK_BYTES)
+    raw = json.dumps(content, separators=(",", ":"), default=str).encode("utf-8")
+    blob = _compress(raw, codec)
+    chunks = [blob[i:i + chunk_bytes] for i in range(0, len(blob), chunk_bytes)] or [b""]
+    descriptor = {
+        "encoding": codec,
+        "chunks": len(chunks),
+        "size": len(raw),
+        "stored_size": len(blob),
+        "checksum": hashlib.sha1(blob).hexdigest()[:16],
+    }
+    return descriptor, chunks
+
+
+def decode_content(descriptor: Dict[str, Any], chunks: List[bytes]) -> Dict[str, Any]:
+    blob = b"".join(chunks)
+    if hashlib.sha1(blob).hexdigest()[:16] != descriptor["checksum"]:
+        # E.g. a reader raced a rewrite and got chunks from two versions.
+        raise ValueError("Notebook content checksum mismatch")
+    return json.loads(_decompress(blob, descriptor["encoding"]))
@@ -0,0 +1,107 @@
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from pydantic import BaseModel
+
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+
+# Short-lived read-through cache for task and notebook lookups.
+# Status polls for the same document within a few seconds are served from memory, together with a
+# precomputed ETag and serialized body. The pipeline invalidates entries whenever it writes
+# (see NotebookTaskUnitOfWork.flush), so a worker never serves its own stale writes; in
+# multi-worker deployments the TTL bounds how stale another worker's view can be.
+
+
+def compute_etag(doc_id: str, data: Dict[str, Any]) -> str:
+    """Strong ETag derived from the document's identity and last write time (plus status as a tiebreaker)."""
+    version = f"{doc_id}:{data.get('updated_at')}:{data.get('status')}"
+    return '"' + hashlib.sha1(version.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+class CachedDocument:
+    """A parsed document plus its ETag; the JSON body is serialized at most once."""
+
+    def __init__(self, model: BaseModel, etag: str):
+        self.model = model
+        self.etag = etag
+        self._body: Optional[bytes] = None
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = self.model.model_dump_json().encode("utf-8")
+        return self._body
+
+
+class DocumentReadCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.enabled = enabled
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        # Concurrent polls for the same uncached document share one Firestore read.
+        self._single_flight = SingleFlight()
+        # Keys currently being loaded -> whether they were invalidated meanwhile (then the result may be stale).
+        self._loading: Dict[Hashable, bool] = {}
+        self.invalidations = 0
+
+    async def get_or_load(self, key: Hashable, load: Callable[[], Awaitable[Optional[CachedDocument]]]) -> Optional[CachedDocument]:
+        if not self.enabled:
+            return await load()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        return await self._single_flight.do(key, self._load_and_store, key, load)
+
+    async def _load_and_store(self, key: Hashable, load: Callable[[], Awaitable[Optional[CachedDocument]]]) -> Optional[CachedDocument]:
+        self._loading[key] = False
+        try:
+            document = await load()
+        finally:
+            invalidated = self._loading.pop(key)
+        # Missing documents are not cached (they may be created any moment), nor are reads that raced a write.
+        if document is not None and not invalidated:
+            self._cache.set(key, document)
+        return document
+
+    def invalidate(self, key: Hashable):
+        self.invalidations += 1
+        self._cache.delete(key)
+        if key in self._loading:
+            self._loading[key] = True
+
+    # Cache keys, kept here so readers and writers agree on them.
+    @staticmethod
+    def task_key(task_id: str) -> tuple:
+        return ("task", task_id)
+
+    @staticmethod
+    def notebook_key(user_id: str, notebook_id: str) -> tuple:
+        return ("notebook", user_id, notebook_id)
+
+    @staticmethod
+    def notebook_content_key(user_id: str, notebook_id: str) -> tuple:
+        return ("notebook_content", user_id, notebook_id)
+
+    def invalidate_task(self, task_id: str):
+        self.invalidate(self.task_key(task_id))
+
+    def invalidate_notebook(self, user_id: str, notebook_id: str):
+        self.invalidate(self.notebook_key(user_id, notebook_id))
+
+    def invalidate_notebook_content(self, user_id: str, notebook_id: str):
+        self.invalidate(self.notebook_content_key(user_id, notebook_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "invalidations": self.invalidations,
+            "coalesced": self._single_flight.shared,
+            **self._cache.stats(),
+        }
+
+
+document_cache = DocumentReadCache(
+    max_entries=settings.READ_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.READ_CACHE_TTL_SECONDS,
+    enabled=settings.READ_CACHE_ENABLED,
+)
@@ -0,0 +1,169 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Storage interface for notebooks, tasks, batches and the image asset index.
+# Services, the pipeline's unit of work and auth talk to a Repository instead of building
+# Firestore document paths themselves. Two implementations exist:
+# - FirestoreRepository (app.db.firestore_repository): Firestore, the emulator or the in-memory fake,
+# - SQLiteRepository (app.db.sqlite_repository): a local file, for single-node/on-prem deployments
+#   and fast integration tests.
+# Select one with STORAGE_BACKEND. Documents are plain dicts in the same shape for both backends.
+
+Row = Tuple[str, Dict[str, Any]] # (document ID, data)
+Cursor = Tuple[str, str] # (created_at, document ID) of the last row on the previous page
+
+
+class DocumentNotFound(Exception):
+    """A partial update targeted a document that does not exist."""
+    pass
+
+
+class RepositoryBatch:
+    """
+    Writes that are applied atomically on commit(). Updates are partial (dotted paths address
+    nested fields); creates overwrite.
+    """
+
+    def create_notebook(self, user_id: str, notebook_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def update_notebook(self, user_id: str, notebook_id: str, fields: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete_notebook(self, user_id: str, notebook_id: str):
+        raise NotImplementedError
+
+    def set_notebook_content(self, user_id: str, notebook_id: str, chunks: Sequence[bytes], previous_chunks: int = 0):
+        """Stores the body chunks (see app.db.notebook_content), removing chunks beyond the new count."""
+        raise NotImplementedError
+
+    def create_task(self, task_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete_task(self, task_id: str):
+        raise NotImplementedError
+
+    def create_batch(self, batch_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """Number of write operations queued, as counted against max_batch_writes."""
+        raise NotImplementedError
+
+    async def commit(self):
+        raise NotImplementedError
+
+
+class Repository:
+    name = "base"
+    max_batch_writes: Optional[int] = None # Per-commit write limit, if the backend has one
+
+    def batch(self) -> RepositoryBatch:
+        raise NotImplementedError
+
+    async def get_notebook(self, user_id: str, notebook_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_notebook_content(self, user_id: str, notebook_id: str, chunks: int) -> List[bytes]:
+        """Returns the stored body chunks in order (b"" for a missing chunk)."""
+        raise NotImplementedError
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Reads many tasks in one round trip. Returns {task_id: data} for those that exist."""
+        raise NotImplementedError
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def list_notebooks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        """
+        The user's notebooks newest first (created_at, then ID, descending), filtered by field
+        equality and a [created_after, created_before) range, projected to `fields`.
+        """
+        raise NotImplementedError
+
+    async def list_tasks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        """Same as list_notebooks, for the user's tasks."""
+        raise NotImplementedError
+
+    # Image assets (see app.services.image_store): stored images keyed by content hash, and the
+    # source URLs that resolved to them (keyed by a hash of the URL).
+
+    async def get_image_asset(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def find_image_assets(self, phash_bands: Sequence[str], limit: int) -> List[Row]:
+        """Assets sharing at least one perceptual-hash band with the given ones (near-duplicate candidates)."""
+        raise NotImplementedError
+
+    async def save_image_asset(self, asset_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def get_image_source(self, source_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def save_image_source(self, source_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def close(self):
+        pass
+
+
+# Global repository, created and closed by the FastAPI lifespan.
+repository: Optional[Repository] = None
+
+def init_repository(backend: Optional[Repository] = None) -> Repository:
+    """Creates the global repository for STORAGE_BACKEND; `backend` overrides it (e.g. in tests)."""
+    global repository
+    if backend is None:
+        if settings.STORAGE_BACKEND == "sqlite":
+            from app.db.sqlite_repository import SQLiteRepository
+            backend = SQLiteRepository(settings.SQLITE_PATH, pool_size=settings.SQLITE_POOL_SIZE)
+        else:
+            from app.db.async_firestore import get_async_db
+            from app.db.firestore_repository import FirestoreRepository
+            backend = FirestoreRepository(get_async_db())
+    repository = backend
+    print(f"Storage backend: {repository.name}")
+    return repository
+
+def get_repository() -> Repository:
+    # Initializes lazily if the lifespan hook didn't run (e.g. scripts).
+    return repository if repository is not None else init_repository()
+
+async def close_repository():
+    global repository
+    if repository is not None:
+        await repository.close()
+        repository = None
@@ -0,0 +1,429 @@
+import asyncio
+import functools
+import json
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from app.core.metrics import SQLITE_DURATION, span
+from app.db.repository import Cursor, DocumentNotFound, Repository, RepositoryBatch, Row
+
+# SQLite implementation of the storage interface, for single-node/on-prem deployments and
+# integration tests that shouldn't need Firebase.
+# Documents are stored whole as JSON in a `data` column; the fields we filter and sort on
+# (user_id, status, tool_type, created_at, ...) are copied into real columns with composite
+# indexes mirroring firestore.indexes.json, so listings are index range scans in the same order.
+# The database runs in WAL mode (readers never block the single writer), and blocking sqlite3
+# calls run on a small thread pool, each checking a connection out of a pool of the same size.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notebooks (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    status TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS notebooks_by_created ON notebooks (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS notebooks_by_status ON notebooks (user_id, status, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS notebook_content (
+    user_id TEXT NOT NULL,
+    notebook_id TEXT NOT NULL,
+    part INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (user_id, notebook_id, part)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    status TEXT,
+    tool_type TEXT,
+    batch_id TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tasks_by_created ON tasks (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (user_id, status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS tasks_by_tool ON tasks (user_id, tool_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS tasks_by_tool_status ON tasks (user_id, tool_type, status, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS notebook_batches (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS image_assets (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+-- One row per perceptual-hash band of each asset, for near-duplicate lookups
+CREATE TABLE IF NOT EXISTS image_asset_bands (
+    band TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    PRIMARY KEY (band, asset_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS image_sources (
+    id TEXT PRIMARY KEY,
+    asset_id TEXT,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Indexed columns per table (besides the key columns), copied from the document on every write.
+TABLE_COLUMNS = {
+    "notebooks": ("status", "created_at"),
+    "tasks": ("user_id", "status", "tool_type", "batch_id", "created_at"),
+    "notebook_batches": ("user_id", "created_at"),
+    "users": (),
+    "image_assets": (),
+    "image_sources": ("asset_id",),
+}
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return _iso(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _iso(value: Any) -> Any:
+    # Same representation as model_dump(mode='json'): naive UTC ISO strings.
+    if isinstance(value, datetime):
+        if value.tzinfo:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    return value
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=_json_default, separators=(",", ":"))
+
+
+def _apply_update(data: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Firestore-style partial update: "a.b" replaces only the nested field b of a."""
+    for path, value in fields.items():
+        target = data
+        *parents, leaf = path.split(".")
+        for key in parents:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+        target[leaf] = value
+    return data
+
+
+def _project(data: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    projected: Dict[str, Any] = {}
+    for path in fields:
+        value, found = data, True
+        for key in path.split("."):
+            if not isinstance(value, dict) or key not in value:
+                found = False
+                break
+            value = value[key]
+        if found:
+            _apply_update(projected, {path: value})
+    return projected
+
+
+class SQLiteRepositoryBatch(RepositoryBatch):
+    """Queues writes and applies them in a single BEGIN IMMEDIATE ... COMMIT transaction."""
+
+    def __init__(self, repo: "SQLiteRepository"):
+        self.repo = repo
+        self._ops: List[Callable[[sqlite3.Connection], None]] = []
+
+    def create_notebook(self, user_id: str, notebook_id: str, data: Dict[str, Any]):
+        self._ops.append(functools.partial(self.repo._put, "notebooks", {"user_id": user_id, "id": notebook_id}, data))
+
+    def update_notebook(self, user_id: str, notebook_id: str, fields: Dict[str, Any]):
+        self._ops.append(functools.partial(self.repo._update, "notebooks", {"user_id": user_id, "id": notebook_id}, fields))
+
+    def delete_notebook(self, user_id: str, notebook_id: str):
+        def delete(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM notebooks WHERE user_id = ? AND id = ?", (user_id, notebook_id))
+            conn.execute("DELETE FROM notebook_content WHERE user_id = ? AND notebook_id = ?", (user_id, notebook_id))
+        self._ops.append(delete)
+
+    def set_notebook_content(self, user_id: str, notebook_id: str, chunks: Sequence[bytes], previous_chunks: int = 0):
+        chunks = list(chunks)
+
+        def set_content(conn: sqlite3.Connection):
+            conn.executemany(
+                "INSERT OR REPLACE INTO notebook_content (user_id, notebook_id, part, data) VALUES (?, ?, ?, ?)",
+                [(user_id, notebook_id, part, sqlite3.Binary(chunk)) for part, chunk in enumerate(chunks)],
+            )
+            conn.execute(
+                "DELETE FROM notebook_content WHERE user_id = ? AND notebook_id = ? AND part >= ?",
+                (user_id, notebook_id, len(chunks)),
+            )
+        self._ops.append(set_content)
+
+    def create_task(self, task_id: str, data: Dict[str, Any]):
+        self._ops.append(functools.partial(self.repo._put, "tasks", {"id": task_id}, data))
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]):
+        self._ops.append(functools.partial(self.repo._update, "tasks", {"id": task_id}, fields))
+
+    def delete_task(self, task_id: str):
+        self._ops.append(lambda conn: conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)))
+
+    def create_batch(self, batch_id: str, data: Dict[str, Any]):
+        self._ops.append(functools.partial(self.repo._put, "notebook_batches", {"id": batch_id}, data))
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    async def commit(self):
+        ops = list(self._ops)
+
+        def commit(conn: sqlite3.Connection):
+            conn.execute("BEGIN IMMEDIATE") # Take the write lock up front so the batch can't deadlock midway
+            try:
+                for op in ops:
+                    op(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        await self.repo.run(commit)
+        self.repo._count("writes", len(ops))
+        self.repo._count("commits")
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+    max_batch_writes = None # One transaction can hold any number of writes
+
+    def __init__(self, path: str, pool_size: int = 8, busy_timeout_ms: int = 5000):
+        self.path = path
+        if path == ":memory:":
+            # Every connection to ":memory:" would get its own empty database; share one instead.
+            pool_size = 1
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(self.pool_size):
+            self._connections.put(self._connect())
+        # One thread per pooled connection, so a job never waits for a connection.
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, int] = {"reads": 0, "writes": 0, "commits": 0}
+
+        conn = self._connections.get()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            self._connections.put(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: autocommit, transactions are explicit (see SQLiteRepositoryBatch.commit).
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; safe from corruption in WAL mode
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Runs fn(connection) on the SQLite pool."""
+        def with_connection():
+            conn = self._connections.get()
+            try:
+                return fn(conn)
+            finally:
+                self._connections.put(conn)
+
+        loop = asyncio.get_running_loop()
+        operation = getattr(fn, "__name__", "call")
+        with span(f"sqlite.{operation}", SQLITE_DURATION, operation=operation):
+            return await loop.run_in_executor(self._executor, with_connection)
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    # --- Row helpers (run inside a transaction on a pooled connection) ---
+
+    @staticmethod
+    def _put(table: str, keys: Dict[str, Any], data: Dict[str, Any], conn: sqlite3.Connection):
+        columns = {**keys, **{column: _iso(data.get(column)) for column in TABLE_COLUMNS[table] if column not in keys}}
+        names = [*columns, "data"]
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            (*columns.values(), _dumps(data)),
+        )
+
+    @classmethod
+    def _update(cls, table: str, keys: Dict[str, Any], fields: Dict[str, Any], conn: sqlite3.Connection):
+        where = " AND ".join(f"{key} = ?" for key in keys)
+        row = conn.execute(f"SELECT data FROM {table} WHERE {where}", tuple(keys.values())).fetchone()
+        if row is None:
+            raise DocumentNotFound(f"No {table} document {'/'.join(keys.values())}")
+        cls._put(table, keys, _apply_update(json.loads(row[0]), json.loads(_dumps(fields))), conn)
+
+    async def _get(self, table: str, keys: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        where = " AND ".join(f"{key} = ?" for key in keys)
+
+        def get(conn: sqlite3.Connection):
+            return conn.execute(f"SELECT data FROM {table} WHERE {where}", tuple(keys.values())).fetchone()
+        row = await self.run(get)
+        self._count("reads")
+        return json.loads(row[0]) if row else None
+
+    # --- Repository interface ---
+
+    def batch(self) -> SQLiteRepositoryBatch:
+        return SQLiteRepositoryBatch(self)
+
+    async def get_notebook(self, user_id: str, notebook_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("notebooks", {"user_id": user_id, "id": notebook_id})
+
+    async def get_notebook_content(self, user_id: str, notebook_id: str, chunks: int) -> List[bytes]:
+        def get_content(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT part, data FROM notebook_content WHERE user_id = ? AND notebook_id = ? AND part < ?",
+                (user_id, notebook_id, chunks),
+            ).fetchall()
+        found = {part: bytes(data) for part, data in await self.run(get_content)}
+        self._count("reads", max(1, len(found)))
+        return [found.get(part, b"") for part in range(chunks)]
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("tasks", {"id": task_id})
+
+    async def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        task_ids = list(dict.fromkeys(task_ids))
+
+        def get_tasks(conn: sqlite3.Connection):
+            rows = []
+            for start in range(0, len(task_ids), 500): # Stay under SQLite's bound-parameter limit
+                ids = task_ids[start:start + 500]
+                rows += conn.execute(
+                    f"SELECT id, data FROM tasks WHERE id IN ({', '.join('?' * len(ids))})", ids
+                ).fetchall()
+            return rows
+        rows = await self.run(get_tasks) if task_ids else []
+        self._count("reads", len(task_ids))
+        return {task_id: json.loads(data) for task_id, data in rows}
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("notebook_batches", {"id": batch_id})
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("users", {"id": user_id})
+
+    async def _list(self, table, where, params, equals, fields, limit, created_after, created_before, start_after) -> List[Row]:
+        where, params = list(where), list(params)
+        for field_path, value in equals.items():
+            # Indexed fields are real columns; anything else falls back to a (non-indexed) JSON lookup.
+            column = field_path if field_path in TABLE_COLUMNS[table] else f"json_extract(data, '$.{field_path}')"
+            where.append(f"{column} = ?")
+            params.append(_iso(value))
+        if created_after is not None:
+            where.append("created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            where.append("created_at < ?")
+            params.append(created_before)
+        if start_after is not None:
+            created_at, doc_id = start_after
+            where.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params += [created_at, created_at, doc_id]
+        sql = f"SELECT id, data FROM {table} WHERE {' AND '.join(where)} ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        def list_documents(conn: sqlite3.Connection):
+            return conn.execute(sql, params).fetchall()
+        rows = await self.run(list_documents)
+        self._count("reads", max(1, len(rows)))
+        return [(doc_id, _project(json.loads(data), fields)) for doc_id, data in rows]
+
+    async def list_notebooks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        return await self._list("notebooks", ["user_id = ?"], [user_id], equals, fields, limit, created_after, created_before, start_after)
+
+    async def list_tasks(
+        self,
+        user_id: str,
+        equals: Dict[str, Any],
+        fields: Sequence[str],
+        limit: int,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        start_after: Optional[Cursor] = None,
+    ) -> List[Row]:
+        return await self._list("tasks", ["user_id = ?"], [user_id], equals, fields, limit, created_after, created_before, start_after)
+
+    async def get_image_asset(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("image_assets", {"id": asset_id})
+
+    async def find_image_assets(self, phash_bands: Sequence[str], limit: int) -> List[Row]:
+        bands = list(phash_bands)
+
+        def find_assets(conn: sqlite3.Connection):
+            return conn.execute(
+                f"SELECT id, data FROM image_assets WHERE id IN "
+                f"(SELECT asset_id FROM image_asset_bands WHERE band IN ({', '.join('?' * len(bands))})) LIMIT ?",
+                (*bands, limit),
+            ).fetchall()
+        rows = await self.run(find_assets) if bands else []
+        self._count("reads", max(1, len(rows)))
+        return [(asset_id, json.loads(data)) for asset_id, data in rows]
+
+    async def save_image_asset(self, asset_id: str, data: Dict[str, Any]):
+        def save_asset(conn: sqlite3.Connection):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._put("image_assets", {"id": asset_id}, data, conn)
+                conn.execute("DELETE FROM image_asset_bands WHERE asset_id = ?", (asset_id,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO image_asset_bands (band, asset_id) VALUES (?, ?)",
+                    [(band, asset_id) for band in data.get("phash_bands") or ()],
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        await self.run(save_asset)
+        self._count("writes")
+
+    async def get_image_source(self, source_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get("image_sources", {"id": source_id})
+
+    async def save_image_source(self, source_id: str, data: Dict[str, Any]):
+        await self.run(functools.partial(self._put, "image_sources", {"id": source_id}, data))
+        self._count("writes")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
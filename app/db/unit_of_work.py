@@ -0,0 +1,113 @@
+import asyncio
+import enum
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.db.repository import Repository
+from app.db.notebook_content import encode_content, split_content
+from app.db.read_cache import document_cache
+
+# Unit of work for the notebook generation pipeline.
+# Instead of writing every field change as it happens, the pipeline records changes here and
+# flushes them at stage boundaries as a single batched write covering both the notebook and
+# its task. This cuts the number of writes per notebook, and because a batch commits
+# atomically, clients never observe a task and notebook whose statuses disagree.
+# Notebook body fields are not written to the notebook document: the full body is re-encoded
+# into its compressed content chunks (see app.db.notebook_content) in the same batch.
+
+
+class NotebookTaskUnitOfWork:
+    def __init__(
+        self,
+        repo: Repository,
+        user_id: str,
+        notebook_id: str,
+        task_id: str,
+        milestones_only: Optional[bool] = None,
+    ):
+        self.repo = repo
+        self.user_id = user_id
+        self.notebook_id = notebook_id
+        self.task_id = task_id
+        # When True, only milestone flushes (start, completion, failure) reach the database;
+        # intermediate stage boundaries just keep accumulating changes.
+        self.milestones_only = settings.PIPELINE_FLUSH_MILESTONES_ONLY if milestones_only is None else milestones_only
+        self._notebook_changes: Dict[str, Any] = {}
+        self._task_changes: Dict[str, Any] = {}
+        # The pipeline is the body's only writer, so the last written body is kept to rewrite it whole.
+        self._content: Dict[str, Any] = {}
+        self._content_changes: Dict[str, Any] = {}
+        self._content_chunks = 0 # Chunk documents currently stored
+        self.flush_count = 0
+
+    @staticmethod
+    def _normalize(fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value.value if isinstance(value, enum.Enum) else value for key, value in fields.items()}
+
+    def update_notebook(self, **fields):
+        """Marks notebook fields dirty. Later values for the same field overwrite earlier ones."""
+        metadata, content = split_content(self._normalize(fields))
+        self._notebook_changes.update(metadata)
+        self._content_changes.update(content)
+
+    def update_task(self, **fields):
+        """Marks task fields dirty. Later values for the same field overwrite earlier ones."""
+        self._task_changes.update(self._normalize(fields))
+
+    def set_status(self, notebook_status=None, task_status=None, error_message: Optional[str] = None):
+        """Records a (possibly paired) status transition so both documents change in the same flush."""
+        if notebook_status is not None:
+            self.update_notebook(status=notebook_status)
+            if error_message: self.update_notebook(error_message=error_message)
+        if task_status is not None:
+            self.update_task(status=task_status)
+            if error_message: self.update_task(error_message=error_message)
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._notebook_changes or self._task_changes or self._content_changes)
+
+    def discard(self):
+        """Drops pending changes, e.g. before recording a failure after a write error."""
+        self._notebook_changes.clear()
+        self._task_changes.clear()
+        self._content_changes.clear()
+
+    async def flush(self, milestone: bool = False) -> bool:
+        """
+        Writes all pending changes as one atomic batch. Returns True if a write was issued.
+        Non-milestone flushes are skipped (changes stay pending) in milestones-only mode.
+        """
+        if not self.is_dirty or (self.milestones_only and not milestone):
+            return False
+
+        now = datetime.utcnow()
+        batch = self.repo.batch()
+        notebook_changes = dict(self._notebook_changes)
+        content = {**self._content, **self._content_changes}
+        chunk_count = self._content_chunks
+        if self._content_changes:
+            # Compression runs off the event loop.
+            descriptor, chunks = await asyncio.to_thread(encode_content, content)
+            batch.set_notebook_content(self.user_id, self.notebook_id, chunks, previous_chunks=self._content_chunks)
+            notebook_changes["content"] = descriptor
+            chunk_count = len(chunks)
+        if notebook_changes:
+            batch.update_notebook(self.user_id, self.notebook_id, {**notebook_changes, "updated_at": now})
+        if self._task_changes:
+            batch.update_task(self.task_id, {**self._task_changes, "updated_at": now})
+        await batch.commit()
+        if notebook_changes: document_cache.invalidate_notebook(self.user_id, self.notebook_id)
+        if self._content_changes: document_cache.invalidate_notebook_content(self.user_id, self.notebook_id)
+        if self._task_changes: document_cache.invalidate_task(self.task_id)
+
+        print(
+            f"Flushed notebook {self.notebook_id} fields {sorted(self._notebook_changes)}, "
+            f"content fields {sorted(self._content_changes)} "
+            f"and task {self.task_id} fields {sorted(self._task_changes)} in one batch."
+        )
+        self._content, self._content_chunks = content, chunk_count
+        self.discard()
+        self.flush_count += 1
+        return True
@@ -1,15 +1,46 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
 
-from app.api.v1.endpoints import notebooks, tasks
+from app.api.v1.deps import require_ops_access
+from app.api.v1.endpoints import notebooks, tasks, system, metrics, images
 from app.core.config import settings
 from app.db.firestore import initialize_firebase_admin, get_firestore_client
+from app.db.async_firestore import init_async_db, close_async_db
+from app.db.repository import init_repository, close_repository
+from app.background.scheduler import start_scheduler, stop_scheduler
+from app.core.events import start_event_bus, close_event_bus
+from app.core.admission import start_admission_controller, close_admission_controller
+from app.core.metrics import init_tracing
+from app.core.http_clients import start_http_clients, close_http_clients
+from app.services.ai.llm import llm_service
+from app.services.ai.image_scraper import image_scraper_service
+from app.services.ai.image_validator import image_validator_service
+from app.services.image_store import start_image_store, close_image_store
+from app.services.image_variants import start_variant_service, close_variant_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Application startup...")
-    initialize_firebase_admin()
+    init_tracing()
+    # Firestore is needed for storage unless STORAGE_BACKEND is sqlite, and for the Firestore LLM cache tier.
+    if settings.STORAGE_BACKEND != "sqlite" or settings.LLM_CACHE_SECOND_TIER == "firestore":
+        if settings.FIRESTORE_BACKEND != "memory":
+            initialize_firebase_admin()
+        init_async_db()
+    init_repository()
+    # Pooled HTTP clients (one per configured upstream), handed to the services that call out
+    http_clients = start_http_clients()
+    if http_clients is not None:
+        for service in (llm_service, image_scraper_service, image_validator_service):
+            service.use_http_clients(http_clients)
+    image_store = start_image_store()
+    if image_store is not None and http_clients is not None:
+        image_store.use_http_clients(http_clients)
+    start_variant_service()
+    await start_event_bus()
+    start_scheduler()
+    start_admission_controller()
     # You can also test the client connection here if needed
     # try:
     #     client = get_firestore_client()
@@ -21,7 +52,16 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("Application shutdown...")
-    # Clean up resources if needed, though firebase_admin usually manages its own connection pool.
+    await stop_scheduler() # Drain pipelines before the data layer goes away
+    await close_admission_controller() # After the pipelines, which release their admission slots
+    await close_event_bus()
+    await image_validator_service.close()
+    close_variant_service()
+    await close_image_store()
+    await close_http_clients() # After everything that makes upstream calls
+    await close_repository()
+    close_async_db()
+    # firebase_admin manages its own gRPC connection pool.
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -32,6 +72,10 @@ app = FastAPI(
 # API Routers
 app.include_router(notebooks.router, prefix=settings.API_V1_STR + "/notebooks", tags=["Notebooks"])
 app.include_router(tasks.router, prefix=settings.API_V1_STR + "/tasks", tags=["Tasks"])
+app.include_router(images.router, prefix=settings.API_V1_STR + "/images", tags=["Images"])
+# Operational endpoints are off unless OPS_ENDPOINTS_ENABLED (and need METRICS_TOKEN if set)
+app.include_router(system.router, prefix=settings.API_V1_STR + "/system", tags=["System"], dependencies=[Depends(require_ops_access)])
+app.include_router(metrics.router, tags=["System"], dependencies=[Depends(require_ops_access)]) # Unversioned /metrics, where Prometheus expects it
 
 @app.get("/")
 async def root():
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+import uuid
+
+from app.models.task import TaskStatus
+
+# A batch groups the notebooks requested together through POST /notebooks/generate/batch.
+# Stored in the top-level `notebook_batches` collection; each task also carries its batch_id.
+
+class BatchItem(BaseModel):
+    topic: str
+    notebook_id: str
+    task_id: str
+
+class NotebookBatchInDBBase(BaseModel):
+    batch_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    items: List[BatchItem] = Field(default_factory=list) # In the order the topics were submitted
+    bypass_cache: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        from_attributes = True
+
+class NotebookBatch(NotebookBatchInDBBase):
+    """
+    Represents a notebook batch document as stored in Firestore.
+    """
+    pass
+
+class BatchItemStatus(BatchItem):
+    status: TaskStatus
+    error_message: Optional[str] = None
+
+class NotebookBatchStatus(BaseModel):
+    """
+    Aggregated progress of every task in a batch, built from one multi-document read.
+    """
+    batch_id: str
+    total: int
+    status_counts: Dict[TaskStatus, int] # Every TaskStatus is present, zero if unused
+    completed: int
+    failed: int
+    progress: float # Finished (completed or failed) tasks / total
+    is_finished: bool
+    created_at: datetime
+    updated_at: datetime # Most recent update of any task in the batch
+    items: List[BatchItemStatus]
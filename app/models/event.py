@@ -0,0 +1,28 @@
+import enum
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+from app.models.notebook import ImageRequest
+
+class TaskEventType(str, enum.Enum):
+    STATUS = "STATUS" # Notebook/task status transition, e.g. PROCESSING_TEXT or COMPLETED
+    IMAGE = "IMAGE" # Progress of a single image placeholder (FETCHED, VALIDATED, FAILED)
+
+class TaskEvent(BaseModel):
+    '''
+    A progress event pushed to clients following a task (see GET /tasks/{task_id}/events).
+    '''
+    task_id: str
+    notebook_id: Optional[str] = None
+    type: TaskEventType
+    notebook_status: Optional[str] = None # Set on STATUS events
+    task_status: Optional[str] = None # Set on STATUS events
+    image_index: Optional[int] = None # Set on IMAGE events: position of the placeholder in the text
+    image: Optional[ImageRequest] = None # Set on IMAGE events
+    error_message: Optional[str] = None
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.task_status in ("COMPLETED", "FAILED")
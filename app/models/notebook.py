@@ -1,3 +1,4 @@
+import enum
 from pydantic import BaseModel, Field
 from typing import List, Optional, Literal
 from datetime import datetime
@@ -22,10 +23,24 @@ class ImageRequest(BaseModel):
     query: str
     status: ImageRequestStatus = Field(default=ImageRequestStatus.PENDING)
     original_url: Optional[str] = None # URL from scraper
-    validated_image_url: Optional[str] = None # URL after validation
+    validated_image_url: Optional[str] = None # URL after validation (our own copy when the image store is enabled)
+    asset_id: Optional[str] = None # Image store asset (content hash), if stored
+    width: Optional[int] = None # Of the stored original
+    height: Optional[int] = None
+    srcset: Optional[str] = None # WebP variants for <img srcset>, when image variants are enabled
     error_message: Optional[str] = None
     # Potential future fields: source_api, license_info
 
+class NotebookContentInfo(BaseModel):
+    '''
+    Descriptor of the notebook body stored outside the notebook document (see app.db.notebook_content).
+    '''
+    encoding: str # "zstd", "gzip" or "identity"
+    chunks: int
+    size: int # Uncompressed JSON size in bytes
+    stored_size: int
+    checksum: str
+
 class NotebookBase(BaseModel):
     topic_input: str
     user_id: str # To associate with the user who created it
@@ -36,9 +51,13 @@ class NotebookCreate(NotebookBase):
 class NotebookInDBBase(NotebookBase):
     notebook_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: NotebookStatus = Field(default=NotebookStatus.PENDING)
+    content: Optional[NotebookContentInfo] = None # Set once a body has been stored
+    # Body fields. Stored in the compressed content documents, so they are only populated when
+    # the content is requested (older notebooks may still have them inline).
     llm_generated_text_with_placeholders: Optional[str] = None
     image_requests: List[ImageRequest] = Field(default_factory=list)
     final_content: Optional[str] = None # Markdown or HTML
+    final_content_html: Optional[str] = None # Pre-rendered HTML, when NOTEBOOK_RENDER_HTML is enabled
     error_message: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -57,6 +76,31 @@ class Notebook(NotebookInDBBase):
     '''
     pass
 
+class NotebookContent(BaseModel):
+    '''
+    The notebook body, as returned by GET /notebooks/{notebook_id}/content.
+    '''
+    notebook_id: str
+    llm_generated_text_with_placeholders: Optional[str] = None
+    image_requests: List[ImageRequest] = Field(default_factory=list)
+    final_content: Optional[str] = None
+    final_content_html: Optional[str] = None
+
+class NotebookSummary(BaseModel):
+    '''
+    Listing view of a notebook: only the fields fetched by GET /notebooks (no generated content).
+    '''
+    notebook_id: str
+    topic_input: str
+    status: NotebookStatus
+    error_message: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class NotebookPage(BaseModel):
+    items: List[NotebookSummary]
+    next_cursor: Optional[str] = None # Pass as `cursor` to get the next page; None on the last page
+
 class NotebookUpdate(BaseModel):
     '''
     Model for updating parts of a notebook document.
@@ -67,6 +111,7 @@ class NotebookUpdate(BaseModel):
     llm_generated_text_with_placeholders: Optional[str] = None
     image_requests: Optional[List[ImageRequest]] = None
     final_content: Optional[str] = None
+    final_content_html: Optional[str] = None
     error_message: Optional[str] = None
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
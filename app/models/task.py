@@ -1,5 +1,6 @@
+import enum
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 import uuid
 
@@ -30,6 +31,7 @@ class TaskInDBBase(TaskBase):
     # This ID will point to the document created by the task, e.g., a notebookId or storyId
     result_document_id: Optional[str] = None
     error_message: Optional[str] = None
+    batch_id: Optional[str] = None # Set when the task was created through a bulk generation request
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -42,6 +44,23 @@ class Task(TaskInDBBase):
     """
     pass
 
+class TaskSummary(BaseModel):
+    """
+    Listing view of a task: only the fields fetched by GET /tasks (no input payload).
+    """
+    task_id: str
+    tool_type: ToolType
+    status: TaskStatus
+    result_document_id: Optional[str] = None
+    batch_id: Optional[str] = None
+    error_message: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class TaskPage(BaseModel):
+    items: List[TaskSummary]
+    next_cursor: Optional[str] = None # Pass as `cursor` to get the next page; None on the last page
+
 class TaskUpdate(BaseModel):
     """
     Model for updating parts of a task document.
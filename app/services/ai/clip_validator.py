@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache, normalize_text
+from app.core.config import settings
+from app.services.image_fetcher import ImageFetcher
+
+# Local CPU image validation with a CLIP-style dual encoder exported to ONNX.
+# Instead of one remote multimodal call per image, candidates are scored in batches:
+#   1. candidate images are downloaded (concurrently) and identified by a SHA-256 of their bytes,
+#   2. images and texts missing from the embedding caches are embedded in one batch per encoder,
+#   3. each image is scored with vectorized cosine similarity against its placeholder query and
+#      the text around the placeholder; it passes if both clear their thresholds.
+# Image embeddings are cached by content hash (the same picture behind different URLs is embedded
+# once), text embeddings by normalized text. Runs on CPU-only nodes: onnxruntime's CPU provider
+# does the inference on a small thread pool, off the event loop.
+#
+# CLIP_MODEL_DIR must contain:
+#   image_encoder.onnx  pixel_values [N, 3, S, S] float32 -> image embeddings [N, D]
+#   text_encoder.onnx   input_ids [N, 77] (+ attention_mask) -> text embeddings [N, D]
+#   tokenizer.json      the model's Hugging Face tokenizer
+# e.g. the vision/text towers of openai/clip-vit-base-patch32 exported separately with
+# torch.onnx.export or Optimum. Needs: pip install onnxruntime numpy pillow tokenizers httpx
+
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+CONTEXT_LENGTH = 77 # CLIP's text context, in tokens
+CONTEXT_WINDOW_CHARS = 300 # Text taken on each side of the placeholder as its context
+
+
+def _require_dependencies():
+    try:
+        import numpy # noqa: F401
+        import onnxruntime # noqa: F401
+        import PIL # noqa: F401
+        import tokenizers # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "IMAGE_VALIDATOR_BACKEND=clip requires onnxruntime, numpy, pillow and tokenizers "
+            "(pip install onnxruntime numpy pillow tokenizers)"
+        ) from e
+
+
+def context_window(text: str, query: str, chars: int = CONTEXT_WINDOW_CHARS) -> str:
+    """The text around the placeholder for `query` (CLIP only reads the first 77 tokens anyway)."""
+    position = text.find(query)
+    if position < 0:
+        return text[:2 * chars]
+    return text[max(0, position - chars):position + len(query) + chars]
+
+
+class ClipEmbedder:
+    """ONNX image and text encoders plus the matching preprocessing. Methods are blocking."""
+
+    def __init__(self, model_dir: str, image_size: int = 224, intra_op_threads: int = 0):
+        _require_dependencies()
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.np = np
+        self.image_size = image_size
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        providers = ["CPUExecutionProvider"]
+        self.image_session = ort.InferenceSession(os.path.join(model_dir, "image_encoder.onnx"), options, providers=providers)
+        self.text_session = ort.InferenceSession(os.path.join(model_dir, "text_encoder.onnx"), options, providers=providers)
+        self.image_input = self.image_session.get_inputs()[0].name
+        self.text_inputs = {item.name: item.type for item in self.text_session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        pad_id = self.tokenizer.token_to_id("<|endoftext|>") or 0
+        self.tokenizer.enable_truncation(CONTEXT_LENGTH)
+        self.tokenizer.enable_padding(length=CONTEXT_LENGTH, pad_id=pad_id)
+        self._mean = np.array(CLIP_MEAN, dtype=np.float32)
+        self._std = np.array(CLIP_STD, dtype=np.float32)
+
+    def preprocess(self, data: bytes):
+        """Decode, resize the short side to image_size, center-crop, normalize -> [3, S, S] float32."""
+        from PIL import Image
+
+        size = self.image_size
+        image = Image.open(io.BytesIO(data))
+        image.draft("RGB", (size * 2, size * 2)) # JPEG: let the decoder downscale, much cheaper
+        image = image.convert("RGB")
+        scale = size / min(image.size)
+        width, height = max(size, round(image.width * scale)), max(size, round(image.height * scale))
+        image = image.resize((width, height), Image.BICUBIC)
+        left, top = (width - size) // 2, (height - size) // 2
+        image = image.crop((left, top, left + size, top + size))
+        pixels = self.np.asarray(image, dtype=self.np.float32) / 255.0
+        return ((pixels - self._mean) / self._std).transpose(2, 0, 1)
+
+    def _normalize(self, embeddings):
+        embeddings = embeddings.astype(self.np.float32)
+        return embeddings / self.np.maximum(self.np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def embed_images(self, pixel_batch):
+        """[N, 3, S, S] -> L2-normalized [N, D]."""
+        return self._normalize(self.image_session.run(None, {self.image_input: pixel_batch})[0])
+
+    def embed_texts(self, texts: Sequence[str]):
+        """Texts -> L2-normalized [N, D]."""
+        encodings = self.tokenizer.encode_batch(list(texts))
+        feeds = {}
+        for name, input_type in self.text_inputs.items():
+            dtype = self.np.int32 if "int32" in input_type else self.np.int64
+            if name == "input_ids":
+                feeds[name] = self.np.array([encoding.ids for encoding in encodings], dtype=dtype)
+            elif name == "attention_mask":
+                feeds[name] = self.np.array([encoding.attention_mask for encoding in encodings], dtype=dtype)
+        return self._normalize(self.text_session.run(None, feeds)[0])
+
+
+class ClipValidationBackend:
+    name = "clip"
+
+    def __init__(
+        self,
+        model_dir: str,
+        query_threshold: float,
+        context_threshold: float,
+        intra_op_threads: int = 0,
+        cache_max_entries: int = 20000,
+        max_image_bytes: int = 10_000_000,
+        fetch_timeout: float = 10,
+        fetch_concurrency: int = 8,
+    ):
+        self.embedder = ClipEmbedder(model_dir, intra_op_threads=intra_op_threads)
+        self.np = self.embedder.np
+        self.query_threshold = query_threshold
+        self.context_threshold = context_threshold
+        self.fetcher = ImageFetcher("ClipValidator", max_image_bytes, timeout=fetch_timeout, concurrency=fetch_concurrency)
+        # One inference at a time; onnxruntime parallelizes inside each run.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip")
+        self.image_embeddings = TTLCache(max_entries=cache_max_entries, ttl_seconds=7 * 86400) # content hash -> vector
+        self.text_embeddings = TTLCache(max_entries=cache_max_entries, ttl_seconds=7 * 86400) # normalized text -> vector
+        self.images_embedded = 0
+        self.texts_embedded = 0
+
+    def _embed_images_blocking(self, images: List[bytes]):
+        pixels = []
+        for data in images:
+            try:
+                pixels.append(self.embedder.preprocess(data))
+            except Exception as e:
+                print(f"[ClipValidator] Could not decode image: {e}")
+                pixels.append(None)
+        decoded = [i for i, p in enumerate(pixels) if p is not None]
+        embeddings: List[Any] = [None] * len(images)
+        if decoded:
+            batch = self.embedder.embed_images(self.np.stack([pixels[i] for i in decoded]))
+            for row, i in enumerate(decoded):
+                embeddings[i] = batch[row]
+        return embeddings
+
+    async def _image_embeddings(self, urls: List[str]) -> Dict[str, Any]:
+        """URL -> embedding (None if it could not be fetched or decoded)."""
+        bodies = await asyncio.gather(*(self.fetcher.try_fetch(url) for url in urls))
+        by_url: Dict[str, Any] = {}
+        missing: Dict[str, bytes] = {}
+        for url, data in zip(urls, bodies):
+            if data is None:
+                by_url[url] = None
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            by_url[url] = digest
+            if self.image_embeddings.get(digest) is None:
+                missing[digest] = data
+        if missing:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, self._embed_images_blocking, list(missing.values()))
+            self.images_embedded += len(missing)
+            for digest, vector in zip(missing, vectors):
+                if vector is not None:
+                    self.image_embeddings.set(digest, vector)
+        return {url: self.image_embeddings.get(digest) if digest else None for url, digest in by_url.items()}
+
+    async def _text_embeddings(self, texts: List[str]) -> Dict[str, Any]:
+        keys = {text: normalize_text(text) for text in texts}
+        missing = sorted({key for key in keys.values() if self.text_embeddings.get(key) is None})
+        if missing:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, self.embedder.embed_texts, missing)
+            self.texts_embedded += len(missing)
+            for key, vector in zip(missing, vectors):
+                self.text_embeddings.set(key, vector)
+        return {text: self.text_embeddings.get(key) for text, key in keys.items()}
+
+    def context_key(self, candidate: Any) -> str:
+        """
+        Verdicts depend on the placeholder's surrounding text as well as on its query, so the
+        validator's verdict cache key includes this digest of the context window.
+        """
+        context = normalize_text(context_window(candidate.text_context, candidate.query_context))
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+    async def validate(self, candidates: Sequence[Any]) -> List[Tuple[bool, Optional[str]]]:
+        """Scores ValidationCandidates in one batch. Returns (is_valid, url) per candidate, in order."""
+        np = self.np
+        contexts = [context_window(c.text_context, c.query_context) for c in candidates]
+        images, texts = await asyncio.gather(
+            self._image_embeddings(list(dict.fromkeys(c.image_url for c in candidates))),
+            self._text_embeddings(list(dict.fromkeys([c.query_context for c in candidates] + contexts))),
+        )
+        scorable = [i for i, c in enumerate(candidates) if images.get(c.image_url) is not None]
+        verdicts: List[Tuple[bool, Optional[str]]] = [(False, None)] * len(candidates)
+        if not scorable:
+            return verdicts
+
+        image_matrix = np.stack([images[candidates[i].image_url] for i in scorable])
+        query_matrix = np.stack([texts[candidates[i].query_context] for i in scorable])
+        context_matrix = np.stack([texts[contexts[i]] for i in scorable])
+        # Row-wise cosine similarity (all vectors are unit length)
+        query_scores = np.einsum("nd,nd->n", image_matrix, query_matrix)
+        context_scores = np.einsum("nd,nd->n", image_matrix, context_matrix)
+        passed = (query_scores >= self.query_threshold) & (context_scores >= self.context_threshold)
+        for row, i in enumerate(scorable):
+            url = candidates[i].image_url
+            verdicts[i] = (True, url) if passed[row] else (False, None)
+            print(f"[ClipValidator] {url}: query {query_scores[row]:.3f}, context {context_scores[row]:.3f} -> {'pass' if passed[row] else 'reject'}")
+        return verdicts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "images_embedded": self.images_embedded,
+            "texts_embedded": self.texts_embedded,
+            "fetch": self.fetcher.stats(),
+            "image_embedding_cache": self.image_embeddings.stats(),
+            "text_embedding_cache": self.text_embeddings.stats(),
+        }
+
+    async def close(self):
+        await self.fetcher.close()
+        self._executor.shutdown(wait=False)
+
+
+def build_clip_backend() -> ClipValidationBackend:
+    return ClipValidationBackend(
+        settings.CLIP_MODEL_DIR,
+        query_threshold=settings.CLIP_QUERY_THRESHOLD,
+        context_threshold=settings.CLIP_CONTEXT_THRESHOLD,
+        intra_op_threads=settings.CLIP_INTRA_OP_THREADS,
+        cache_max_entries=settings.CLIP_EMBEDDING_CACHE_MAX_ENTRIES,
+        max_image_bytes=settings.IMAGE_FETCH_MAX_BYTES,
+        fetch_timeout=settings.IMAGE_FETCH_TIMEOUT_SECONDS,
+    )
@@ -1,24 +1,63 @@
 import asyncio
-from typing import List
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import SingleFlight, TTLCache, normalize_text
+from app.core.config import settings
+from app.core.resilience import upstream_client
+from app.services.ai.mock_latency import latency_model
 
 # In a real scenario, you would import your image scraping library or API client
 # e.g., from unsplash_py import Unsplash
-# from app.core.config import settings # To get API keys
 
 class ImageScraperService:
-    def __init__(self):
-        # Initialize your image scraping client here if needed
+    def __init__(self, cache: Optional[TTLCache] = None):
+        # Initialize your image scraping client here if needed, on the pooled HTTP client
         # e.g., self.unsplash = Unsplash(access_key=settings.UNSPLASH_ACCESS_KEY)
+        self.http = None # Pooled httpx.AsyncClient (base URL IMAGE_SCRAPER_BASE_URL), set by use_http_clients()
+        # Results keyed by (normalized query, count). Empty results are cached too (negative caching).
+        if cache is None and settings.IMAGE_CACHE_ENABLED:
+            cache = TTLCache(max_entries=settings.IMAGE_SCRAPE_CACHE_MAX_ENTRIES, ttl_seconds=settings.IMAGE_SCRAPE_CACHE_TTL_SECONDS)
+        self.cache = cache
+        self._single_flight = SingleFlight()
+        self.negative_hits = 0
+        self.latency = latency_model("image-scraper", settings.MOCK_SCRAPER_LATENCY_SECONDS, settings.MOCK_SCRAPER_FAILURE_RATE)
+        self.client = upstream_client("image-scraper", settings.IMAGE_SCRAPER_TIMEOUT_SECONDS)
         print("ImageScraperService initialized (mock)")
 
+    def use_http_clients(self, registry):
+        """Called by the lifespan with the pooled HTTP clients (app.core.http_clients)."""
+        self.http = registry.get("image-scraper")
+
     async def scrape_images(self, query: str, count: int = 1) -> List[str]:
+        """
+        Returns a list of image URLs for the query, from the cache when possible.
+        Concurrent scrapes of the same normalized query share one upstream call.
+        """
+        key = (normalize_text(query), count)
+        if self.cache is not None:
+            cached_urls = self.cache.get(key)
+            if cached_urls is not None:
+                if not cached_urls: self.negative_hits += 1
+                print(f"[ImageScraperService] Cache hit for query: '{query}' ({len(cached_urls)} URLs)")
+                return list(cached_urls)
+        return list(await self._single_flight.do(key, self._scrape_and_store, key, query, count))
+
+    async def _scrape_and_store(self, key: tuple, query: str, count: int) -> List[str]:
+        urls = await self.client.call(self._scrape, query, count)
+        if self.cache is not None:
+            # Errors propagate uncached; "no images found" is cached for a shorter time.
+            ttl = None if urls else settings.IMAGE_SCRAPE_NEGATIVE_TTL_SECONDS
+            self.cache.set(key, tuple(urls), ttl_seconds=ttl)
+        return urls
+
+    async def _scrape(self, query: str, count: int) -> List[str]:
         """
         Simulates scraping images from the web based on a query.
         Returns a list of image URLs.
         """
         print(f"[ImageScraperService] Received query: '{query}', count: {count}")
         print(f"[ImageScraperService] Simulating image scraping for query: '{query}'...")
-        await asyncio.sleep(2) # Simulate network latency and scraping time
+        await self.latency.call() # Simulate network latency and scraping time (see MOCK_SCRAPER_* settings)
 
         mock_urls = []
         for i in range(count):
@@ -30,6 +69,11 @@ class ImageScraperService:
         print(f"[ImageScraperService] Found {len(mock_urls)} mock image URLs for '{query}': {mock_urls}")
         return mock_urls
 
+    def cache_stats(self) -> Dict[str, Any]:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, "negative_hits": self.negative_hits, "coalesced": self._single_flight.shared, **self.cache.stats()}
+
 # Instantiate the service for use in other modules
 image_scraper_service = ImageScraperService()
 
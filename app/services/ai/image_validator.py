@@ -1,15 +1,51 @@
 import asyncio
-from typing import Tuple, Optional
-import random # For mock validation
+from typing import Any, Dict, List, NamedTuple, Tuple, Optional
 
-# In a real scenario, you might import a client for a multimodal AI model (e.g., CLIP)
-# from app.core.config import settings # If API keys or model paths are needed
+from app.core.cache import TTLCache, normalize_text
+from app.core.config import settings
+from app.core.resilience import upstream_client
+from app.services.ai.mock_latency import latency_model
+
+# IMAGE_VALIDATOR_BACKEND=clip scores candidates with a local CLIP model (see clip_validator.py);
+# the default mock backend simulates a remote multimodal model.
+
+class ValidationCandidate(NamedTuple):
+    image_url: str
+    text_context: str # Surrounding text of the image placeholder
+    query_context: str # The image description from the placeholder
 
 class ImageValidatorService:
-    def __init__(self):
-        # Initialize your image validation client/model here
-        # e.g., load a CLIP model
-        print("ImageValidatorService initialized (mock)")
+    def __init__(self, cache: Optional[TTLCache] = None):
+        # Verdicts keyed by (image URL, normalized query), plus the surrounding text for backends that
+        # score it (see _verdict_key). Rejections are cached too, for a shorter time.
+        if cache is None and settings.IMAGE_CACHE_ENABLED:
+            cache = TTLCache(max_entries=settings.IMAGE_VALIDATION_CACHE_MAX_ENTRIES, ttl_seconds=settings.IMAGE_VALIDATION_CACHE_TTL_SECONDS)
+        self.cache = cache
+        self.negative_hits = 0
+        self.model_calls = 0
+        self.latency = latency_model("image-validator", settings.MOCK_VALIDATOR_LATENCY_SECONDS, settings.MOCK_VALIDATOR_FAILURE_RATE)
+        self.client = upstream_client("image-validator", settings.IMAGE_VALIDATOR_TIMEOUT_SECONDS)
+        self.http = None # Pooled httpx.AsyncClient for a remote model (IMAGE_VALIDATOR_BASE_URL), set by use_http_clients()
+        self.backend = None
+        if settings.IMAGE_VALIDATOR_BACKEND == "clip":
+            from app.services.ai.clip_validator import build_clip_backend
+            self.backend = build_clip_backend()
+        elif settings.IMAGE_VALIDATOR_BACKEND != "mock":
+            raise RuntimeError(f"Unknown IMAGE_VALIDATOR_BACKEND: {settings.IMAGE_VALIDATOR_BACKEND}")
+        print(f"ImageValidatorService initialized ({settings.IMAGE_VALIDATOR_BACKEND})")
+
+    def use_http_clients(self, registry):
+        """Called by the lifespan with the pooled HTTP clients (app.core.http_clients)."""
+        self.http = registry.get("image-validator")
+        if self.backend is not None:
+            self.backend.fetcher.use_client(registry.get("image-fetch"))
+
+    def _verdict_key(self, candidate: ValidationCandidate) -> tuple:
+        key = (candidate.image_url, normalize_text(candidate.query_context))
+        if self.backend is not None:
+            # The CLIP backend also checks the image against the text around the placeholder
+            key += (self.backend.context_key(candidate),)
+        return key
 
     async def validate_image(
         self, 
@@ -17,16 +53,65 @@ class ImageValidatorService:
         text_context: str, # Surrounding text of the image placeholder
         query_context: str   # The image description from the placeholder (e.g., "A cute cat")
     ) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (is_valid, validated_url) for a single image. Prefer validate_images() (or the
+        pipeline's micro-batcher) when validating several images.
+        """
+        return (await self.validate_images([ValidationCandidate(image_url, text_context, query_context)]))[0]
+
+    async def validate_images(self, batch: List[ValidationCandidate]) -> List[Tuple[bool, Optional[str]]]:
+        """
+        Validates many candidates (possibly from several notebooks) in one model call.
+        Returns one (is_valid, validated_url) per candidate, in input order. Cached verdicts for a
+        (URL, query) pair (and context, with the CLIP backend) are reused and duplicates within the
+        batch are validated once.
+        """
+        keys = [self._verdict_key(candidate) for candidate in batch]
+        verdicts: Dict[tuple, Tuple[bool, Optional[str]]] = {}
+        to_validate: Dict[tuple, ValidationCandidate] = {}
+        for key, candidate in zip(keys, batch):
+            if key in verdicts or key in to_validate:
+                continue
+            cached_verdict = self.cache.get(key) if self.cache is not None else None
+            if cached_verdict is not None:
+                if not cached_verdict[0]: self.negative_hits += 1
+                verdicts[key] = cached_verdict
+            else:
+                to_validate[key] = candidate
+
+        if to_validate:
+            fresh_verdicts = await self.client.call(self._validate_batch, list(to_validate.values()))
+            for key, verdict in zip(to_validate, fresh_verdicts):
+                verdicts[key] = verdict
+                if self.cache is not None:
+                    ttl = None if verdict[0] else settings.IMAGE_VALIDATION_NEGATIVE_TTL_SECONDS
+                    self.cache.set(key, verdict, ttl_seconds=ttl)
+
+        print(f"[ImageValidatorService] Validated batch of {len(batch)} ({len(to_validate)} uncached)")
+        return [verdicts[key] for key in keys]
+
+    async def _validate_batch(self, candidates: List[ValidationCandidate]) -> List[Tuple[bool, Optional[str]]]:
+        """
+        One batched inference call. The mock simulates a remote model: fixed per-call overhead
+        dominates, so a batch costs little more than a single image.
+        """
+        self.model_calls += 1
+        if self.backend is not None:
+            return await self.backend.validate(candidates)
+        # Simulate validation processing time (see MOCK_VALIDATOR_* settings)
+        await self.latency.call(self.latency.mean_seconds + settings.MOCK_VALIDATOR_PER_ITEM_SECONDS * (len(candidates) - 1))
+        return [self._mock_verdict(candidate) for candidate in candidates]
+
+    def _mock_verdict(self, candidate: ValidationCandidate) -> Tuple[bool, Optional[str]]:
         """
         Simulates validating an image against its textual context and query.
         Returns a tuple: (is_valid: bool, validated_url: Optional[str]).
         The validated_url might be the same as original, or a new URL if processing/hosting is done.
         """
+        image_url, text_context, query_context = candidate
         print(f"[ImageValidatorService] Validating URL: {image_url}")
         print(f"[ImageValidatorService] Text Context (snippet): {text_context[:100]}...")
         print(f"[ImageValidatorService] Query Context: {query_context}")
-        
-        await asyncio.sleep(1) # Simulate validation processing time
 
         # Mock validation logic:
         # For demonstration, let's say validation sometimes fails for specific keywords
@@ -37,7 +122,7 @@ class ImageValidatorService:
         if "fail_validation" in query_context.lower(): # Simple rule for testing failure
             is_valid = False
             print(f"[ImageValidatorService] Mock validation FAILED for query: {query_context}")
-        elif random.random() < 0.1: # 10% chance of random failure for other queries
+        elif self.latency.rng.random() < settings.MOCK_VALIDATOR_REJECTION_RATE: # Random rejections, reproducible with MOCK_RANDOM_SEED
             is_valid = False
             print(f"[ImageValidatorService] Mock validation RANDOMLY FAILED for query: {query_context}")
         else:
@@ -50,6 +135,20 @@ class ImageValidatorService:
         else:
             return False, None
 
+    def cache_stats(self) -> Dict[str, Any]:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, "negative_hits": self.negative_hits, **self.cache.stats()}
+
+    def backend_stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"backend": "mock", "model_calls": self.model_calls}
+        return {"model_calls": self.model_calls, **self.backend.stats()}
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
 # Instantiate the service
 image_validator_service = ImageValidatorService()
 
@@ -1,41 +1,191 @@
 import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.cache import SingleFlight, TieredCache, build_tiered_cache, hash_key, normalize_text
+from app.core.config import settings
+from app.core.resilience import upstream_client
+from app.services.ai.mock_latency import latency_model
 
 # In a real scenario, you would import your LLM client library here
 # For example: from openai import OpenAI
-# from app.core.config import settings # To get API keys
+
+class StreamAbandoned(Exception):
+    """The stream a caller joined was stopped by its own consumer before it completed."""
+    pass
+
+def normalize_topic(topic: str) -> str:
+    """Case- and whitespace-insensitive form of a topic, used for cache keys."""
+    return normalize_text(topic)
+
+def build_llm_cache() -> Optional[TieredCache]:
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return build_tiered_cache(
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+        second_tier=settings.LLM_CACHE_SECOND_TIER,
+        disk_dir=settings.LLM_CACHE_DISK_DIR,
+        disk_max_bytes=settings.LLM_CACHE_DISK_MAX_BYTES,
+        firestore_collection="llm_cache",
+    )
 
 class LLMService:
-    def __init__(self):
-        # Initialize your LLM client here if needed
-        # e.g., self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, cache: Optional[TieredCache] = None):
+        # Initialize your LLM client here if needed, on the pooled HTTP client
+        # e.g., AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.LLM_API_BASE_URL, http_client=self.http)
+        self.http = None # Pooled httpx.AsyncClient, set by use_http_clients() at startup
+        self.cache = cache if cache is not None else build_llm_cache()
+        # Identical topics requested concurrently share one upstream call.
+        self._single_flight = SingleFlight()
+        self._streams_in_flight: Dict[str, asyncio.Future] = {}
+        self.coalesced_streams = 0
+        self.upstream_calls = 0
+        self.bypassed = 0
+        self.latency = latency_model("llm", settings.MOCK_LLM_LATENCY_SECONDS, settings.MOCK_LLM_FAILURE_RATE)
+        # Timeouts, retries, circuit breaker and concurrency limit for every upstream call
+        self.client = upstream_client("llm", settings.LLM_TIMEOUT_SECONDS)
         print("LLMService initialized (mock)")
 
-    async def generate_text_with_image_cues(self, topic: str) -> str:
+    def use_http_clients(self, registry):
+        """Called by the lifespan with the pooled HTTP clients (app.core.http_clients)."""
+        self.http = registry.get("llm")
+
+    def generation_params(self) -> Dict[str, Any]:
+        """Everything besides the topic that affects the output; part of the cache key."""
+        return {
+            "model": settings.LLM_MODEL,
+            "temperature": settings.LLM_TEMPERATURE,
+            "prompt_version": settings.LLM_PROMPT_VERSION,
+        }
+
+    async def generate_text_with_image_cues(self, topic: str, bypass_cache: bool = False) -> str:
+        """
+        Returns text for the topic with 'image - [description]' placeholders, served from the
+        cache when possible. `bypass_cache=True` forces a fresh generation (which then refreshes the cache).
+        """
+        params = self.generation_params()
+        key = hash_key(normalize_topic(topic), params)
+
+        if bypass_cache:
+            # Not coalesced either: joining a generation already in flight wouldn't be fresh.
+            self.bypassed += 1
+            return await self._generate_and_store(key, topic, params)
+        if self.cache is not None:
+            cached_text = await self.cache.get(key)
+            if cached_text is not None:
+                print(f"[LLMService] Cache hit for topic: {topic}")
+                return cached_text
+
+        return await self._single_flight.do(key, self._generate_and_store, key, topic, params)
+
+    async def stream_text_with_image_cues(self, topic: str, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_text_with_image_cues(): yields text chunks as they are produced.
+        A cache hit is yielded as one chunk. If the same topic is already streaming, this waits for
+        that stream and yields its full text as one chunk instead of starting a second upstream call
+        (unless `bypass_cache` is set); should that stream's consumer stop early, this streams the
+        topic itself instead.
+        """
+        params = self.generation_params()
+        key = hash_key(normalize_topic(topic), params)
+
+        if bypass_cache:
+            self.bypassed += 1
+        elif self.cache is not None:
+            cached_text = await self.cache.get(key)
+            if cached_text is not None:
+                print(f"[LLMService] Cache hit for topic: {topic}")
+                yield cached_text
+                return
+
+        while not bypass_cache:
+            shared_stream = self._streams_in_flight.get(key)
+            if shared_stream is None:
+                break
+            try:
+                generated_text = await asyncio.shield(shared_stream)
+            except StreamAbandoned:
+                continue # Join whoever took over, or stream it ourselves
+            self.coalesced_streams += 1
+            yield generated_text
+            return
+
+        result = asyncio.get_running_loop().create_future()
+        result.add_done_callback(lambda f: f.cancelled() or f.exception()) # Mark retrieved if nobody waits on it
+        self._streams_in_flight[key] = result
+        parts = []
+        try:
+            async for chunk in self.client.stream(self._call_llm_stream, topic, params):
+                parts.append(chunk)
+                yield chunk
+            generated_text = "".join(parts)
+            if self.cache is not None:
+                await self.cache.set(key, generated_text)
+            result.set_result(generated_text)
+        except Exception as e:
+            result.set_exception(e)
+            raise
+        finally:
+            if self._streams_in_flight.get(key) is result:
+                del self._streams_in_flight[key]
+            if not result.done(): # Consumer stopped early or was cancelled; waiters fall back to their own call
+                result.set_exception(StreamAbandoned(f"Stream for topic {topic!r} ended before completing"))
+
+    async def _generate_and_store(self, key: str, topic: str, params: Dict[str, Any]) -> str:
+        generated_text = await self.client.call(self._call_llm, topic, params)
+        if self.cache is not None:
+            await self.cache.set(key, generated_text)
+        return generated_text
+
+    async def _call_llm(self, topic: str, params: Dict[str, Any]) -> str:
         """
         Simulates a call to an LLM to generate text based on a topic,
         including placeholders for images like 'image - [description]'.
         """
+        self.upstream_calls += 1
         print(f"[LLMService] Received topic: {topic}")
-        print(f"[LLMService] Simulating LLM call for topic: {topic}...")
-        await asyncio.sleep(3) # Simulate network latency and processing time
-
-        # Example LLM-like output with image placeholders
-        generated_text = (
-            f"The majestic {topic} stands as a testament to nature's grandeur. image - [A wide shot of a {topic} at sunset]
+        print(f"[LLMService] Simulating LLM call for topic: {topic} with {params}...")
+        await self.latency.call() # Simulate network latency and processing time (see MOCK_LLM_* settings)
 
-"
-            f"Exploring the intricate details of the {topic} reveals fascinating patterns. image - [Close-up of {topic}'s texture] 
+        generated_text = self._mock_text(topic)
+        print(f"[LLMService] Generated text for '{topic}':\n{generated_text[:100]}...") # Print a snippet
+        return generated_text
 
-"
-            f"Many species rely on the {topic} for survival. image - [Wildlife interacting with {topic}]
+    async def _call_llm_stream(self, topic: str, params: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Simulates a streaming LLM call: the same text as _call_llm(), delivered in small
+        chunks spread over the same total latency.
+        """
+        self.upstream_calls += 1
+        print(f"[LLMService] Simulating streaming LLM call for topic: {topic} with {params}...")
+        self.latency.maybe_fail()
+        generated_text = self._mock_text(topic)
+        chunk_size = 24 # Roughly a few tokens per chunk
+        chunks = [generated_text[i:i + chunk_size] for i in range(0, len(generated_text), chunk_size)]
+        total_seconds = self.latency.sample()
+        for chunk in chunks:
+            await asyncio.sleep(total_seconds / len(chunks)) # Simulate per-token generation time
+            yield chunk
 
-"
+    @staticmethod
+    def _mock_text(topic: str) -> str:
+        # Example LLM-like output with image placeholders
+        return (
+            f"The majestic {topic} stands as a testament to nature's grandeur. image - [A wide shot of a {topic} at sunset]\n\n"
+            f"Exploring the intricate details of the {topic} reveals fascinating patterns. image - [Close-up of {topic}'s texture] \n\n"
+            f"Many species rely on the {topic} for survival. image - [Wildlife interacting with {topic}]\n\n"
             f"In conclusion, the {topic} is truly remarkable."
         )
-        
-        print(f"[LLMService] Generated text for '{topic}':
-{generated_text[:100]}...") # Print a snippet
-        return generated_text
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.cache is not None,
+            "upstream_calls": self.upstream_calls,
+            "bypassed": self.bypassed,
+            "coalesced": self._single_flight.shared + self.coalesced_streams,
+            "in_flight": self._single_flight.in_flight + len(self._streams_in_flight),
+            **(self.cache.stats() if self.cache is not None else {}),
+        }
 
 # Instantiate the service for use in other modules
 llm_service = LLMService()
@@ -0,0 +1,61 @@
+import asyncio
+import math
+import random
+from typing import Optional
+
+from app.core.config import settings
+from app.core.resilience import RetryableError
+
+# Tunable behaviour for the mock AI services: how long a simulated upstream call takes and how
+# often it fails. Defaults reproduce the original fixed sleeps; the benchmark harness
+# (benchmarks/run_benchmark.py) sets the MOCK_* settings to model slower, noisier or flakier upstreams.
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class MockServiceError(RetryableError):
+    """Simulated upstream failure (timeout, 5xx, ...)."""
+    pass
+
+
+class LatencyModel:
+    def __init__(
+        self,
+        mean_seconds: float,
+        distribution: str = "fixed",
+        failure_rate: float = 0.0,
+        name: str = "mock",
+        rng: Optional[random.Random] = None,
+    ):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}', expected one of {DISTRIBUTIONS}")
+        self.mean_seconds = max(0.0, mean_seconds)
+        self.distribution = distribution
+        self.failure_rate = min(max(failure_rate, 0.0), 1.0)
+        self.name = name
+        self.rng = rng or random.Random(settings.MOCK_RANDOM_SEED)
+
+    def sample(self, mean_seconds: Optional[float] = None) -> float:
+        """One latency draw; every distribution has the configured mean."""
+        mean = self.mean_seconds if mean_seconds is None else mean_seconds
+        if mean <= 0 or self.distribution == "fixed":
+            return max(0.0, mean)
+        if self.distribution == "uniform":
+            return self.rng.uniform(0, 2 * mean)
+        if self.distribution == "exponential":
+            return self.rng.expovariate(1 / mean)
+        sigma = 0.75 # lognormal: a long tail, like real model APIs
+        return self.rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+    def maybe_fail(self):
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise MockServiceError(f"{self.name}: simulated upstream failure")
+
+    async def call(self, mean_seconds: Optional[float] = None):
+        """Simulates one upstream call: waits a sampled latency, then fails at the configured rate."""
+        await asyncio.sleep(self.sample(mean_seconds))
+        self.maybe_fail()
+
+
+def latency_model(name: str, mean_seconds: float, failure_rate: float) -> LatencyModel:
+    return LatencyModel(mean_seconds, settings.MOCK_LATENCY_DISTRIBUTION, failure_rate, name=name)
@@ -0,0 +1,49 @@
+import io
+
+# Image resizing/re-encoding for app.services.image_variants. Runs in worker processes, so this
+# module only imports the standard library (and Pillow, when called).
+
+MIME_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+PIL_FORMATS = {"webp": "WEBP", "avif": "AVIF", "jpeg": "JPEG"}
+
+
+def avif_supported() -> bool:
+    """Pillow 11.3+ built with libavif, or the pillow-avif-plugin package."""
+    try:
+        from PIL import features
+        if features.check("avif"):
+            return True
+    except Exception:
+        pass
+    try:
+        import pillow_avif # noqa: F401 (registers the plugin)
+        return True
+    except ImportError:
+        return False
+
+
+def encode_variant(data: bytes, width: int, fmt: str, quality: int) -> bytes:
+    """Scales the image down to `width` (never up), applies EXIF rotation and encodes it as `fmt`."""
+    from PIL import Image, ImageOps
+
+    if fmt == "avif":
+        avif_supported() # Registers the plugin if that's where AVIF support comes from
+    image = Image.open(io.BytesIO(data))
+    if image.width > width:
+        # JPEG: let the decoder downscale by a power of two first, much cheaper than a full decode.
+        # Both sides stay >= width, so the result is still large enough if EXIF rotates it.
+        image.draft("RGB", (width, width))
+    image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha and fmt != "jpeg" else "RGB")
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        image.save(out, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(out, format=PIL_FORMATS[fmt], quality=quality)
+    return out.getvalue()
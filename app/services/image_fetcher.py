@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+# Downloads candidate/validated images (CLIP validator, image asset store) with a size cap and
+# bounded concurrency. In the app it uses the lifespan's pooled "image-fetch" client (see
+# app.core.http_clients); elsewhere (scripts, benchmarks) it creates its own on first use.
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class ImageFetcher:
+    def __init__(self, name: str, max_bytes: int, timeout: float = 10, concurrency: int = 8):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http = None
+        self._owns_client = False
+        self.fetches = 0
+        self.errors = 0
+        self.bytes_fetched = 0
+
+    def _http_client(self):
+        if self._http is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise RuntimeError(f"{self.name} requires the 'httpx' package (pip install httpx)") from e
+            self._http = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True)
+            self._owns_client = True
+        return self._http
+
+    def use_client(self, client):
+        """Fetch through a shared (pooled) httpx.AsyncClient, which its owner closes. None keeps the current one."""
+        if client is None:
+            return
+        self._http = client
+        self._owns_client = False
+
+    async def fetch(self, url: str) -> bytes:
+        """Returns the image bytes. Raises ImageFetchError."""
+        client = self._http_client() # A missing httpx is a configuration error, not a failed fetch
+        async with self._semaphore:
+            self.fetches += 1
+            try:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    data = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        data += chunk
+                        if len(data) > self.max_bytes:
+                            raise ImageFetchError(f"image larger than {self.max_bytes} bytes")
+            except ImageFetchError:
+                self.errors += 1
+                raise
+            except Exception as e:
+                self.errors += 1
+                raise ImageFetchError(f"could not fetch {url}: {e}") from e
+            self.bytes_fetched += len(data)
+            return bytes(data)
+
+    async def try_fetch(self, url: str) -> Optional[bytes]:
+        try:
+            return await self.fetch(url)
+        except ImageFetchError as e:
+            print(f"[{self.name}] {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"fetches": self.fetches, "errors": self.errors, "bytes": self.bytes_fetched}
+
+    async def close(self):
+        if self._http is not None and self._owns_client:
+            await self._http.aclose()
+        self._http = None
@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.repository import get_repository
+from app.services.image_fetcher import ImageFetcher
+
+# Self-hosted copies of validated images (IMAGE_STORE_BACKEND=local or gcs).
+# Each validated image is downloaded once and stored under the SHA-256 of its bytes, so the same
+# stock photo used by thousands of notebooks is one object with one stable URL on our domain
+# (GET /api/v1/images/{sha256}). Lookups, cheapest first:
+#   1. source URL -> asset, in memory and in the repository's image_sources index (no download),
+#   2. content hash -> asset: the same bytes behind a different URL (download, no store),
+#   3. perceptual hash -> asset: a near-identical image (re-encoded, resized, watermarked...).
+#      The 64-bit difference hash is split into 8 one-byte bands; two hashes within Hamming
+#      distance 7 must share a band, so a band lookup finds every candidate and the exact
+#      distance is checked here. The first stored copy stays canonical (its URL is already in
+#      published notebooks).
+# Only a genuinely new image is written to the blob store. Needs pillow (and httpx to download).
+
+IMAGE_STORE_OUTCOMES = registry.counter(
+    "mineshear_image_store_ingests_total", "Validated images ingested into the image store, by how they were resolved.", ["outcome"]
+)
+
+ASSET_ID = re.compile(r"^[0-9a-f]{64}$")
+PHASH_BANDS = 8
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif", "AVIF": "image/avif"}
+
+
+def is_asset_id(value: str) -> bool:
+    return bool(ASSET_ID.match(value))
+
+
+def difference_hash(image) -> int:
+    """64-bit dHash: is each pixel of a 9x8 grayscale thumbnail brighter than its right neighbour?"""
+    from PIL import Image
+
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def phash_bands(phash: int) -> List[str]:
+    return [f"{band}:{(phash >> (8 * band)) & 0xFF:02x}" for band in range(PHASH_BANDS)]
+
+
+def fingerprint(data: bytes) -> Tuple[str, int, int, int]:
+    """(content type, width, height, dHash) of an encoded image. Raises ValueError if it isn't one we serve."""
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        content_type = CONTENT_TYPES.get(image.format or "")
+        if content_type is None:
+            raise ValueError(f"unsupported image format {image.format}")
+        width, height = image.size
+        image.draft("L", (64, 64)) # JPEG: decode at reduced size, the hash only needs 9x8
+        return content_type, width, height, difference_hash(image)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"not a decodable image: {e}") from e
+
+
+class ImageBlobStore:
+    """Object storage for image originals, keyed by asset ID (content hash). Objects never change."""
+    name = "base"
+
+    async def put(self, asset_id: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    async def get(self, asset_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def local_path(self, asset_id: str) -> Optional[str]:
+        """A file the route can serve directly, if the backend is a local filesystem."""
+        return None
+
+    async def close(self):
+        pass
+
+
+class LocalImageBlobStore(ImageBlobStore):
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def local_path(self, asset_id: str) -> str:
+        if not is_asset_id(asset_id):
+            raise ValueError(f"Invalid asset ID: {asset_id!r}")
+        # Two levels of fan-out keep directories small
+        return os.path.join(self.directory, asset_id[:2], asset_id[2:4], asset_id)
+
+    def _put(self, asset_id: str, data: bytes):
+        path = self.local_path(asset_id)
+        if os.path.exists(path):
+            return # Content-addressed: already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename, so a reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _get(self, asset_id: str) -> Optional[bytes]:
+        try:
+            with open(self.local_path(asset_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def put(self, asset_id: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._put, asset_id, data)
+
+    async def get(self, asset_id: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, asset_id)
+
+
+class GCSImageBlobStore(ImageBlobStore):
+    """Google Cloud Storage (e.g. the Firebase project's bucket), via application default credentials."""
+    name = "gcs"
+
+    def __init__(self, bucket: str, prefix: str = "images/"):
+        try:
+            from google.cloud import storage
+        except ImportError as e:
+            raise RuntimeError("IMAGE_STORE_BACKEND=gcs requires the 'google-cloud-storage' package (pip install google-cloud-storage)") from e
+        if not bucket:
+            raise RuntimeError("IMAGE_STORE_BACKEND=gcs requires IMAGE_STORE_GCS_BUCKET")
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix
+
+    def _blob(self, asset_id: str):
+        return self.bucket.blob(self.prefix + asset_id)
+
+    def _put(self, asset_id: str, data: bytes, content_type: str):
+        blob = self._blob(asset_id)
+        if blob.exists():
+            return
+        blob.cache_control = "public, max-age=31536000, immutable"
+        blob.upload_from_string(data, content_type=content_type)
+
+    def _get(self, asset_id: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(asset_id).download_as_bytes()
+        except NotFound:
+            return None
+
+    async def put(self, asset_id: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._put, asset_id, data, content_type)
+
+    async def get(self, asset_id: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, asset_id)
+
+
+class ImageAssetStore:
+    def __init__(self, blobs: ImageBlobStore, fetcher: ImageFetcher, max_distance: int = 6, public_base_url: str = "", source_cache_entries: int = 20000):
+        try:
+            import PIL # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("The image store requires the 'pillow' package (pip install pillow)") from e
+        self.blobs = blobs
+        self.fetcher = fetcher
+        self.max_distance = min(max_distance, PHASH_BANDS - 1) # Beyond 7 the band lookup could miss matches
+        self.public_base_url = public_base_url.rstrip("/")
+        self.sources = TTLCache(max_entries=source_cache_entries, ttl_seconds=86400) # Source URL -> asset ID
+        self.assets = TTLCache(max_entries=source_cache_entries, ttl_seconds=86400) # Asset ID -> metadata (immutable)
+        self.flight = SingleFlight()
+        self.outcomes: Dict[str, int] = {"known_source": 0, "exact": 0, "similar": 0, "new": 0}
+
+    def use_http_clients(self, registry):
+        """Called by the lifespan with the pooled HTTP clients (app.core.http_clients)."""
+        self.fetcher.use_client(registry.get("image-fetch"))
+
+    def url_for(self, asset_id: str) -> str:
+        return f"{self.public_base_url}{settings.API_V1_STR}/images/{asset_id}"
+
+    async def ingest(self, source_url: str) -> str:
+        """
+        Returns the asset ID for the image at `source_url`, downloading and storing it if it is new.
+        Concurrent ingests of the same URL share one download. Raises ImageFetchError or ValueError.
+        """
+        asset_id = self.sources.get(source_url)
+        if asset_id is not None:
+            self._count("known_source")
+            return asset_id
+        return await self.flight.do(source_url, self._ingest, source_url)
+
+    async def _ingest(self, source_url: str) -> str:
+        repo = get_repository()
+        source_id = hashlib.sha256(source_url.encode()).hexdigest()
+        source = await repo.get_image_source(source_id)
+        if source is not None:
+            self.sources.set(source_url, source["asset_id"])
+            self._count("known_source")
+            return source["asset_id"]
+
+        data = await self.fetcher.fetch(source_url)
+        asset_id = hashlib.sha256(data).hexdigest()
+        outcome = "exact"
+        if await self.get_asset(asset_id) is None:
+            content_type, width, height, phash = await asyncio.to_thread(fingerprint, data)
+            similar_id = await self._find_similar(phash) if self.max_distance > 0 else None
+            if similar_id is not None:
+                asset_id, outcome = similar_id, "similar"
+            else:
+                await self.blobs.put(asset_id, data, content_type)
+                asset = {
+                    "content_type": content_type,
+                    "size": len(data),
+                    "width": width,
+                    "height": height,
+                    "phash": f"{phash:016x}",
+                    "phash_bands": phash_bands(phash),
+                    "source_url": source_url,
+                    "created_at": datetime.utcnow(),
+                }
+                await repo.save_image_asset(asset_id, asset) # After the blob, so an indexed asset is always servable
+                self.assets.set(asset_id, asset)
+                outcome = "new"
+
+        await repo.save_image_source(source_id, {"url": source_url, "asset_id": asset_id, "created_at": datetime.utcnow()})
+        self.sources.set(source_url, asset_id)
+        self._count(outcome)
+        print(f"[ImageStore] {source_url} -> {asset_id[:12]} ({outcome})")
+        return asset_id
+
+    async def _find_similar(self, phash: int) -> Optional[str]:
+        best: Optional[Tuple[int, str]] = None
+        for asset_id, asset in await get_repository().find_image_assets(phash_bands(phash), limit=50):
+            distance = bin(phash ^ int(asset["phash"], 16)).count("1")
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, asset_id)
+        return best[1] if best else None
+
+    async def get_asset(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """Asset metadata (content type, size, dimensions), cached: assets never change."""
+        asset = self.assets.get(asset_id)
+        if asset is None:
+            asset = await get_repository().get_image_asset(asset_id)
+            if asset is not None:
+                self.assets.set(asset_id, asset)
+        return asset
+
+    def _count(self, outcome: str):
+        self.outcomes[outcome] += 1
+        IMAGE_STORE_OUTCOMES.inc(outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.blobs.name,
+            "outcomes": dict(self.outcomes),
+            "shared_ingests": self.flight.shared,
+            "fetch": self.fetcher.stats(),
+            "source_cache": self.sources.stats(),
+        }
+
+    async def close(self):
+        await self.fetcher.close()
+        await self.blobs.close()
+
+
+# Global store, created and closed by the FastAPI lifespan; None when IMAGE_STORE_BACKEND is "none".
+image_store: Optional[ImageAssetStore] = None
+
+def start_image_store() -> Optional[ImageAssetStore]:
+    global image_store
+    if settings.IMAGE_STORE_BACKEND in ("", "none"):
+        return None
+    if settings.IMAGE_STORE_BACKEND == "local":
+        blobs: ImageBlobStore = LocalImageBlobStore(settings.IMAGE_STORE_DIR)
+    elif settings.IMAGE_STORE_BACKEND == "gcs":
+        blobs = GCSImageBlobStore(settings.IMAGE_STORE_GCS_BUCKET, settings.IMAGE_STORE_GCS_PREFIX)
+    else:
+        raise RuntimeError(f"Unknown IMAGE_STORE_BACKEND: {settings.IMAGE_STORE_BACKEND}")
+    fetcher = ImageFetcher("ImageStore", settings.IMAGE_FETCH_MAX_BYTES, timeout=settings.IMAGE_FETCH_TIMEOUT_SECONDS)
+    image_store = ImageAssetStore(
+        blobs,
+        fetcher,
+        max_distance=settings.IMAGE_STORE_PHASH_MAX_DISTANCE,
+        public_base_url=settings.IMAGE_STORE_PUBLIC_BASE_URL,
+        source_cache_entries=settings.IMAGE_STORE_CACHE_MAX_ENTRIES,
+    )
+    print(f"Image store: {blobs.name}")
+    return image_store
+
+def get_image_store() -> Optional[ImageAssetStore]:
+    return image_store
+
+async def close_image_store():
+    global image_store
+    if image_store is not None:
+        await image_store.close()
+        image_store = None
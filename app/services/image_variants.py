@@ -0,0 +1,254 @@
+import asyncio
+import html
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.image_encoding import MIME_TYPES, avif_supported, encode_variant
+from app.services.image_store import ImageAssetStore, get_image_store
+
+# Resized, re-encoded variants of stored images (see app.services.image_store), served at
+# GET /api/v1/images/{asset_id}/{width}.{webp|avif|jpeg}.
+# Requested widths snap up to one of IMAGE_VARIANT_WIDTHS (and never exceed the original), so a
+# handful of variants per image serve every client. A variant is encoded on first request in a
+# process pool (resizing and AVIF/WebP encoding are CPU-bound and would stall the event loop),
+# with concurrent requests for the same variant sharing one encode, then kept in a size-capped
+# LRU directory on disk. Variant URLs never change content, so responses are cacheable forever.
+
+VARIANT_ENCODE_DURATION = registry.histogram(
+    "mineshear_image_variant_encode_seconds", "Time to produce an image variant (read original, resize, encode, write).", ["format"]
+)
+VARIANT_REQUESTS = registry.counter(
+    "mineshear_image_variant_requests_total", "Image variant requests by disk cache result.", ["result"]
+)
+
+QUALITY = {"webp": 75, "avif": 50, "jpeg": 80} # Roughly equivalent visual quality per format
+EXTENSIONS = {"webp": "webp", "avif": "avif", "jpeg": "jpg"}
+FORMATS = {"webp": "webp", "avif": "avif", "jpg": "jpeg", "jpeg": "jpeg"} # URL extension -> format
+
+
+def parse_widths(value: str) -> List[int]:
+    return sorted({int(width) for width in value.split(",") if width.strip()})
+
+
+def variant_width(requested: int, original: Optional[int], widths: List[int]) -> int:
+    """The bucket at or above `requested` (the largest bucket beyond that), capped at the original width."""
+    bucket = next((width for width in widths if width >= requested), widths[-1])
+    return min(bucket, original) if original else bucket
+
+
+class DiskLRU:
+    """
+    Files in a directory, evicted least recently used first once their total size exceeds
+    max_bytes. The index lives in memory (rebuilt from the directory at startup, oldest access
+    first); all methods except write() must be called from the event loop.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict() # name -> size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                if file_name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, file_name)
+                stat = os.stat(path)
+                found.append((stat.st_atime, os.path.relpath(path, directory), stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_bytes += size
+        self._evict()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        if name in self.entries:
+            path = self.path(name)
+            if os.path.exists(path): # Another worker may have evicted it
+                self.entries.move_to_end(name)
+                self.hits += 1
+                return path
+            self.total_bytes -= self.entries.pop(name)
+        self.misses += 1
+        return None
+
+    def write(self, name: str, data: bytes) -> str:
+        """Writes the file atomically. Blocking: run it in a thread, then call add()."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return path
+
+    def add(self, name: str, size: int):
+        if name in self.entries:
+            self.total_bytes -= self.entries.pop(name)
+        self.entries[name] = size
+        self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path(name)) # Responses already streaming it keep their open file
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ImageVariantService:
+    def __init__(self, store: ImageAssetStore, cache: DiskLRU, widths: List[int], default_width: int, processes: int = 2):
+        self.store = store
+        self.cache = cache
+        self.widths = widths
+        self.default_width = default_width
+        self.processes = max(1, processes)
+        self.formats = ["webp", "jpeg"] + (["avif"] if avif_supported() else [])
+        self.flight = SingleFlight()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.encodes = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    # --- URLs ---
+
+    def url(self, asset_id: str, width: int, fmt: str = "webp") -> str:
+        return f"{self.store.url_for(asset_id)}/{width}.{EXTENSIONS[fmt]}"
+
+    def src(self, asset_id: str, original_width: Optional[int]) -> str:
+        """Default-size WebP variant, e.g. for Markdown images."""
+        return self.url(asset_id, variant_width(self.default_width, original_width, self.widths))
+
+    def srcset(self, asset_id: str, original_width: Optional[int], fmt: str = "webp") -> str:
+        """`srcset` value listing every distinct variant width of the image."""
+        entries: Dict[int, int] = {} # actual width -> bucket in the URL
+        for bucket in self.widths:
+            entries.setdefault(variant_width(bucket, original_width, self.widths), bucket)
+        return ", ".join(f"{self.url(asset_id, bucket, fmt)} {width}w" for width, bucket in entries.items())
+
+    def picture_html(self, asset_id: str, original_width: Optional[int], original_height: Optional[int], alt: str) -> str:
+        """<picture> with AVIF (when available) and WebP sources, sized to the column."""
+        sizes = f"(max-width: {self.default_width}px) 100vw, {self.default_width}px"
+        sources = "".join(
+            f'<source type="{MIME_TYPES[fmt]}" srcset="{html.escape(self.srcset(asset_id, original_width, fmt))}" sizes="{sizes}">'
+            for fmt in ("avif",) if fmt in self.formats
+        )
+        dimensions = f' width="{original_width}" height="{original_height}"' if original_width and original_height else ""
+        return (
+            f'<picture>{sources}<img src="{html.escape(self.src(asset_id, original_width))}"'
+            f' srcset="{html.escape(self.srcset(asset_id, original_width))}" sizes="{sizes}"'
+            f'{dimensions} alt="{html.escape(alt)}" loading="lazy" decoding="async"></picture>'
+        )
+
+    # --- Serving ---
+
+    async def get_variant(self, asset_id: str, width: int, extension: str) -> Optional[Tuple[str, str]]:
+        """
+        (file path, content type) of the variant, encoding it if needed. None if the image
+        doesn't exist; ValueError for a format we can't produce.
+        """
+        fmt = FORMATS.get(extension)
+        if fmt not in self.formats:
+            raise ValueError(f"Unsupported image format: {extension}")
+        asset = await self.store.get_asset(asset_id)
+        if asset is None:
+            return None
+        width = variant_width(width, asset.get("width"), self.widths)
+        name = os.path.join(asset_id[:2], f"{asset_id}-{width}.{EXTENSIONS[fmt]}")
+        path = self.cache.get(name)
+        VARIANT_REQUESTS.inc(result="hit" if path else "miss")
+        if path is None:
+            path = await self.flight.do(name, self._render, asset_id, width, fmt, name)
+        return path, MIME_TYPES[fmt]
+
+    async def _render(self, asset_id: str, width: int, fmt: str, name: str) -> str:
+        started = time.perf_counter()
+        data = await self.store.blobs.get(asset_id)
+        if data is None:
+            raise FileNotFoundError(f"Original of image {asset_id} is missing")
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(self._executor(), encode_variant, data, width, fmt, QUALITY[fmt])
+        path = await asyncio.to_thread(self.cache.write, name, encoded)
+        self.cache.add(name, len(encoded))
+        self.encodes += 1
+        VARIANT_ENCODE_DURATION.observe(time.perf_counter() - started, format=fmt)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "formats": self.formats,
+            "widths": self.widths,
+            "encodes": self.encodes,
+            "shared_encodes": self.flight.shared,
+            "disk_cache": self.cache.stats(),
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global service, created and closed by the FastAPI lifespan; None unless the image store is enabled.
+variant_service: Optional[ImageVariantService] = None
+
+def start_variant_service() -> Optional[ImageVariantService]:
+    global variant_service
+    store = get_image_store()
+    if store is None or not settings.IMAGE_VARIANTS_ENABLED:
+        return None
+    variant_service = ImageVariantService(
+        store,
+        DiskLRU(settings.IMAGE_VARIANT_CACHE_DIR, settings.IMAGE_VARIANT_CACHE_MAX_BYTES),
+        parse_widths(settings.IMAGE_VARIANT_WIDTHS),
+        default_width=settings.IMAGE_VARIANT_DEFAULT_WIDTH,
+        processes=settings.IMAGE_VARIANT_PROCESSES,
+    )
+    print(f"Image variants: {', '.join(variant_service.formats)} at widths {settings.IMAGE_VARIANT_WIDTHS}")
+    return variant_service
+
+def get_variant_service() -> Optional[ImageVariantService]:
+    return variant_service
+
+def close_variant_service():
+    global variant_service
+    if variant_service is not None:
+        variant_service.close()
+        variant_service = None
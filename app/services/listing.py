@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.db.repository import Row
+
+# Cursor-paginated, projected listings (GET /notebooks, GET /tasks).
+# Listings are ordered newest first by created_at, with the document ID as a tiebreaker, so a
+# page boundary is exactly (created_at, id) of the last item. That pair is handed to the client as
+# an opaque cursor and fed back to the repository as start_after, so every page costs one indexed
+# query reading `limit + 1` documents, no matter how deep the client pages. Only summary fields are
+# fetched, never the notebook body. On Firestore the composite indexes these queries need are in
+# firestore.indexes.json (deploy with `firebase deploy --only firestore:indexes`); the SQLite
+# backend creates the equivalent indexes itself.
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def naive_utc(value: datetime) -> datetime:
+    # Firestore returns timezone-aware timestamps for fields written as datetimes, while fields
+    # written as ISO strings come back naive (UTC); normalize so they can be compared.
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def created_at_bound(value: datetime) -> str:
+    """created_at is stored as a naive UTC ISO string (model_dump(mode='json')); filters must match that."""
+    return naive_utc(value).isoformat()
+
+
+def encode_cursor(created_at: str, doc_id: str) -> str:
+    raw = json.dumps([created_at, doc_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, doc_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    if not isinstance(created_at, str) or not isinstance(doc_id, str):
+        raise InvalidCursorError("Malformed cursor")
+    return created_at, doc_id
+
+
+async def fetch_page(
+    list_documents: Callable[..., Awaitable[List[Row]]],
+    equals: Dict[str, Any],
+    fields: Sequence[str],
+    limit: int,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Runs one page of a repository listing (e.g. repo.list_tasks with user_id bound). Returns
+    [(doc_id, projected_data)] and the cursor for the next page, or None on the last page.
+    """
+    start_after = decode_cursor(cursor) if cursor else None
+    # One extra document tells us whether there is a next page without a second query.
+    rows = await list_documents(
+        equals=equals,
+        fields=list(dict.fromkeys([*fields, "created_at"])),
+        limit=limit + 1,
+        created_after=created_at_bound(created_after) if created_after is not None else None,
+        created_before=created_at_bound(created_before) if created_before is not None else None,
+        start_after=start_after,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_id, last_data = rows[-1]
+        next_cursor = encode_cursor(last_data["created_at"], last_id)
+    return rows, next_cursor
@@ -0,0 +1,123 @@
+import enum
+import hashlib
+import html
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from app.core.cache import TTLCache
+from app.models.notebook import ImageRequest
+from app.services.placeholder_parser import Placeholder
+
+if TYPE_CHECKING:
+    from app.services.image_variants import ImageVariantService
+
+# Notebook compiler: turns the LLM text plus per-placeholder image results into the final document.
+# Placeholder spans are recorded once during extraction (see placeholder_parser), so the output
+# is built in a single pass over the text, and each result is matched to its placeholder by
+# position rather than by query text (two placeholders may share the same description).
+
+
+class FailedImagePolicy(str, enum.Enum):
+    DROP = "drop" # Remove the placeholder entirely
+    NOTE = "note" # Replace it with a short "image not available" note
+    KEEP_PLACEHOLDER = "keep_placeholder" # Leave the raw 'image - [...]' text in place
+
+
+class CompiledNotebook(NamedTuple):
+    markdown: str
+    html: Optional[str] = None
+
+
+UNAVAILABLE_NOTE = "[Image not available: {query}]"
+
+# Rendered HTML keyed by a hash of the Markdown. Identical notebooks (e.g. LLM cache hits that
+# resolved to the same images) are rendered once.
+_html_cache = TTLCache(max_entries=256, ttl_seconds=3600)
+
+
+def _as_dict(image_request: Union[ImageRequest, Dict[str, Any]]) -> Dict[str, Any]:
+    return image_request.model_dump(mode="json") if isinstance(image_request, ImageRequest) else image_request
+
+
+def _image_url(image_request: Dict[str, Any]) -> Optional[str]:
+    if image_request.get("status") == "VALIDATED":
+        return image_request.get("validated_image_url")
+    return None
+
+
+def compile_markdown(
+    text: str,
+    placeholders: Sequence[Placeholder],
+    image_requests: Sequence[Union[ImageRequest, Dict[str, Any]]],
+    failed_policy: FailedImagePolicy = FailedImagePolicy.KEEP_PLACEHOLDER,
+) -> str:
+    """
+    Builds the final Markdown in one pass. `image_requests[i]` is the result for `placeholders[i]`;
+    placeholders without a result are treated as failed.
+    """
+    parts: List[str] = []
+    cursor = 0
+    for placeholder in placeholders:
+        parts.append(text[cursor:placeholder.start])
+        image_request = _as_dict(image_requests[placeholder.index]) if placeholder.index < len(image_requests) else {}
+        url = _image_url(image_request)
+        if url:
+            parts.append(f"![{placeholder.query}]({url})")
+        elif failed_policy == FailedImagePolicy.NOTE:
+            parts.append(UNAVAILABLE_NOTE.format(query=placeholder.query))
+        elif failed_policy == FailedImagePolicy.KEEP_PLACEHOLDER:
+            parts.append(text[placeholder.start:placeholder.end])
+        # DROP: emit nothing
+        cursor = placeholder.end
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
+def render_html(
+    text: str,
+    placeholders: Sequence[Placeholder],
+    image_requests: Sequence[Union[ImageRequest, Dict[str, Any]]],
+    failed_policy: FailedImagePolicy = FailedImagePolicy.KEEP_PLACEHOLDER,
+    variants: Optional["ImageVariantService"] = None,
+) -> str:
+    """
+    Renders the same document as HTML from the span index: text is escaped, images become <img>
+    tags and blank lines separate paragraphs. With `variants`, stored images become responsive
+    <picture> elements (srcset of resized variants).
+    """
+    parts: List[str] = []
+    cursor = 0
+    for placeholder in placeholders:
+        parts.append(html.escape(text[cursor:placeholder.start]))
+        image_request = _as_dict(image_requests[placeholder.index]) if placeholder.index < len(image_requests) else {}
+        url = _image_url(image_request)
+        if url and variants is not None and image_request.get("asset_id"):
+            parts.append(variants.picture_html(image_request["asset_id"], image_request.get("width"), image_request.get("height"), placeholder.query))
+        elif url:
+            parts.append(f'<img src="{html.escape(url)}" alt="{html.escape(placeholder.query)}" loading="lazy">')
+        elif failed_policy == FailedImagePolicy.NOTE:
+            parts.append(f'<span class="image-unavailable">{html.escape(UNAVAILABLE_NOTE.format(query=placeholder.query))}</span>')
+        elif failed_policy == FailedImagePolicy.KEEP_PLACEHOLDER:
+            parts.append(html.escape(text[placeholder.start:placeholder.end]))
+        cursor = placeholder.end
+    parts.append(html.escape(text[cursor:]))
+    paragraphs = (paragraph.strip() for paragraph in "".join(parts).split("\n\n"))
+    return "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs if paragraph)
+
+
+def compile_notebook(
+    text: str,
+    placeholders: Sequence[Placeholder],
+    image_requests: Sequence[Union[ImageRequest, Dict[str, Any]]],
+    failed_policy: FailedImagePolicy = FailedImagePolicy.KEEP_PLACEHOLDER,
+    with_html: bool = False,
+    variants: Optional["ImageVariantService"] = None,
+) -> CompiledNotebook:
+    markdown = compile_markdown(text, placeholders, image_requests, failed_policy)
+    if not with_html:
+        return CompiledNotebook(markdown)
+    cache_key = (hashlib.sha256(markdown.encode("utf-8")).hexdigest(), failed_policy.value, variants is not None)
+    rendered = _html_cache.get(cache_key)
+    if rendered is None:
+        rendered = render_html(text, placeholders, image_requests, failed_policy, variants)
+        _html_cache.set(cache_key, rendered)
+    return CompiledNotebook(markdown, rendered)
@@ -1,21 +1,25 @@
-from fastapi import BackgroundTasks
-from app.db.firestore import get_firestore_client
-from app.models.notebook import Notebook, NotebookStatus, NotebookInDBBase
+import asyncio
+import functools
+from typing import List, Optional
+from app.core.admission import AdmissionTicket
+from app.db.repository import Repository, get_repository
+from app.db.notebook_content import CONTENT_FIELDS, decode_content
+from app.db.read_cache import CachedDocument, compute_etag, document_cache
+from app.services.listing import fetch_page, naive_utc
+from app.models.notebook import Notebook, NotebookContent, NotebookStatus, NotebookInDBBase, NotebookPage, NotebookSummary
 from app.models.task import Task, TaskStatus, ToolType, TaskInDBBase
-from app.background.notebook_tasks import generate_notebook_content_task # We'll create this task function soon
+from app.models.batch import BatchItem, BatchItemStatus, NotebookBatch, NotebookBatchInDBBase, NotebookBatchStatus
+from app.background.notebook_tasks import generate_notebook_content_task
+from app.background.scheduler import get_scheduler
 from datetime import datetime
 
-async def create_notebook_and_task(
-    topic: str, 
-    user_id: str, 
-    background_tasks: BackgroundTasks
-) -> tuple[Notebook, Task]:
-    """
-    Creates initial Notebook and Task documents in Firestore and 
-    schedules the notebook generation as a background task.
-    """
-    db = get_firestore_client()
-
+def _build_notebook_and_task(
+    topic: str,
+    user_id: str,
+    bypass_cache: bool = False,
+    batch_id: Optional[str] = None
+) -> tuple[NotebookInDBBase, TaskInDBBase]:
+    """Builds (without saving) the initial Notebook and Task documents for one topic."""
     # 1. Create an initial Notebook document
     notebook_data = {
         "topic_input": topic,
@@ -26,43 +30,58 @@ async def create_notebook_and_task(
     # Use NotebookInDBBase to get all default fields populated (like ID, timestamps)
     notebook_to_create = NotebookInDBBase(**notebook_data)
     
-    # Save to Firestore
-    # Note: Firestore client uses synchronous methods by default.
-    # For truly async operations with Firestore, firebase_admin.firestore.AsyncClient should be used.
-    # We are keeping it simple for now, assuming this service method might be called in contexts
-    # where a brief sync operation is acceptable, or background tasks handle longer work.
-    notebook_ref = db.collection("users").document(user_id).collection("notebooks").document(notebook_to_create.notebook_id)
-    notebook_ref.set(notebook_to_create.model_dump(mode='json')) # Pydantic v2 uses model_dump()
-    
-    print(f"Created notebook document: {notebook_to_create.notebook_id} for user {user_id}")
-
     # 2. Create a Task document
     task_data = {
         "user_id": user_id,
         "tool_type": ToolType.NOTEBOOK_GENERATOR,
-        "input_payload": {"topic": topic, "notebook_id": notebook_to_create.notebook_id},
+        "input_payload": {"topic": topic, "notebook_id": notebook_to_create.notebook_id, "bypass_cache": bypass_cache},
         "status": TaskStatus.PENDING,
         "result_document_id": notebook_to_create.notebook_id,
+        "batch_id": batch_id,
         # task_id, created_at, updated_at will be set by TaskInDBBase default factories
     }
     task_to_create = TaskInDBBase(**task_data)
+    return notebook_to_create, task_to_create
 
-    # Save to Firestore
-    task_ref = db.collection("tasks").document(task_to_create.task_id)
-    # Storing tasks in a top-level collection for easier querying of all tasks
-    task_ref.set(task_to_create.model_dump(mode='json'))
-    print(f"Created task document: {task_to_create.task_id} for notebook {notebook_to_create.notebook_id}")
+def _notebook_metadata(notebook: NotebookInDBBase) -> dict:
+    # The body lives in separate content documents written by the pipeline (see app.db.notebook_content)
+    return notebook.model_dump(mode='json', exclude=set(CONTENT_FIELDS)) # Pydantic v2 uses model_dump()
 
-    # 3. Add the actual generation process to BackgroundTasks
-    # This will call a function (e.g., from app.background.notebook_tasks)
-    background_tasks.add_task(
+def _submit_generation(notebook: NotebookInDBBase, task: TaskInDBBase, bypass_cache: bool, ticket: Optional[AdmissionTicket] = None):
+    # Hand the generation pipeline to the stage scheduler (see app.background.scheduler)
+    pipeline = get_scheduler().submit_pipeline(
         generate_notebook_content_task, 
-        task_id=task_to_create.task_id, 
-        user_id=user_id, 
-        notebook_id=notebook_to_create.notebook_id, 
-        topic=topic
+        task_id=task.task_id, 
+        user_id=notebook.user_id, 
+        notebook_id=notebook.notebook_id, 
+        topic=notebook.topic_input,
+        bypass_cache=bypass_cache
     )
-    print(f"Added background task for task_id: {task_to_create.task_id}, notebook_id: {notebook_to_create.notebook_id}")
+    if ticket is not None:
+        ticket.bind(pipeline) # Its in-flight slot is freed when the pipeline finishes
+
+async def create_notebook_and_task(
+    topic: str, 
+    user_id: str,
+    bypass_cache: bool = False,
+    ticket: Optional[AdmissionTicket] = None
+) -> tuple[Notebook, Task]:
+    """
+    Creates initial Notebook and Task documents in the database and 
+    submits the notebook generation pipeline to the stage scheduler.
+    `ticket` is the request's admission (see app.core.admission), held by the pipeline.
+    """
+    repo = get_repository()
+    notebook_to_create, task_to_create = _build_notebook_and_task(topic, user_id, bypass_cache)
+
+    # Save both documents in one batch: a single round trip, and never a task without its notebook.
+    # Tasks live in a top-level collection for easier querying of all tasks.
+    await _commit_chunk(repo, [(notebook_to_create, task_to_create)])
+    print(f"Created notebook document: {notebook_to_create.notebook_id} for user {user_id}")
+    print(f"Created task document: {task_to_create.task_id} for notebook {notebook_to_create.notebook_id}")
+
+    _submit_generation(notebook_to_create, task_to_create, bypass_cache, ticket)
+    print(f"Submitted generation pipeline for task_id: {task_to_create.task_id}, notebook_id: {notebook_to_create.notebook_id}")
 
     # Convert to the response models (Notebook and Task) which might have slightly different fields or representations if needed
     # In this case, NotebookInDBBase and TaskInDBBase are already suitable for returning
@@ -71,11 +90,201 @@ async def create_notebook_and_task(
 
     return created_notebook, created_task
 
-# Placeholder for other notebook service functions
+async def _commit_chunk(repo: Repository, pairs: List[tuple[NotebookInDBBase, TaskInDBBase]]):
+    batch = repo.batch()
+    for notebook, task in pairs:
+        batch.create_notebook(notebook.user_id, notebook.notebook_id, _notebook_metadata(notebook))
+        batch.create_task(task.task_id, task.model_dump(mode='json'))
+    await batch.commit()
+
+async def _delete_chunk(repo: Repository, pairs: List[tuple[NotebookInDBBase, TaskInDBBase]]):
+    batch = repo.batch()
+    for notebook, task in pairs:
+        batch.delete_notebook(notebook.user_id, notebook.notebook_id)
+        batch.delete_task(task.task_id)
+    await batch.commit()
+
+async def create_notebook_batch(
+    topics: List[str],
+    user_id: str,
+    bypass_cache: bool = False,
+    ticket: Optional[AdmissionTicket] = None
+) -> NotebookBatch:
+    """
+    Creates the Notebook and Task documents for many topics with chunked batch writes
+    (each chunk is one commit, sized to the backend's per-batch limit), then a batch document
+    listing them, and submits every pipeline under the new batch ID. Topics are expected to be
+    validated already.
+    """
+    repo = get_repository()
+    batch_to_create = NotebookBatchInDBBase(user_id=user_id, bypass_cache=bypass_cache)
+
+    pairs = [_build_notebook_and_task(topic, user_id, bypass_cache, batch_to_create.batch_id) for topic in topics]
+    for notebook, task in pairs:
+        batch_to_create.items.append(BatchItem(topic=notebook.topic_input, notebook_id=notebook.notebook_id, task_id=task.task_id))
+
+    # Two writes per topic. Chunks are independent, so commit them concurrently.
+    chunk_size = max(1, repo.max_batch_writes // 2) if repo.max_batch_writes else max(1, len(pairs))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    results = await asyncio.gather(*(_commit_chunk(repo, chunk) for chunk in chunks), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # Don't leave half a batch of PENDING documents that nothing will ever process.
+        committed = [chunk for chunk, result in zip(chunks, results) if not isinstance(result, BaseException)]
+        await asyncio.gather(*(_delete_chunk(repo, chunk) for chunk in committed), return_exceptions=True)
+        raise errors[0]
+
+    # Written last, so a batch document always refers to existing notebooks and tasks.
+    batch_write = repo.batch()
+    batch_write.create_batch(batch_to_create.batch_id, batch_to_create.model_dump(mode='json'))
+    await batch_write.commit()
+    print(f"Created batch {batch_to_create.batch_id} with {len(pairs)} notebooks for user {user_id} in {len(chunks)} batch writes")
+
+    for notebook, task in pairs:
+        _submit_generation(notebook, task, bypass_cache, ticket)
+    print(f"Submitted {len(pairs)} generation pipelines for batch {batch_to_create.batch_id}")
+
+    return NotebookBatch(**batch_to_create.model_dump())
+
+async def get_batch_status(batch_id: str, user_id: str) -> Optional[CachedDocument]:
+    """
+    Aggregates the progress of every task in a batch from a single multi-document read.
+    Returned with an ETag so clients can poll it conditionally.
+    """
+    repo = get_repository()
+    batch_data = await repo.get_batch(batch_id)
+    if batch_data is None:
+        return None
+    batch = NotebookBatch(**{**batch_data, "batch_id": batch_id})
+    if batch.user_id != user_id:
+        print(f"User {user_id} attempted to access batch {batch_id} owned by {batch.user_id}")
+        return None
+
+    tasks = await repo.get_tasks(item.task_id for item in batch.items)
+    status_counts = {task_status: 0 for task_status in TaskStatus}
+    items = []
+    updated_at = naive_utc(batch.created_at)
+    for item in batch.items:
+        task_data = tasks.get(item.task_id)
+        if task_data is None:
+            # Deleted since; report it as failed rather than pending forever.
+            item_status, error_message = TaskStatus.FAILED, "Task not found"
+        else:
+            task = Task(**{**task_data, "task_id": item.task_id})
+            item_status, error_message = task.status, task.error_message
+            updated_at = max(updated_at, naive_utc(task.updated_at))
+        status_counts[item_status] += 1
+        items.append(BatchItemStatus(**item.model_dump(), status=item_status, error_message=error_message))
+
+    total = len(items)
+    finished = status_counts[TaskStatus.COMPLETED] + status_counts[TaskStatus.FAILED]
+    summary = NotebookBatchStatus(
+        batch_id=batch_id,
+        total=total,
+        status_counts=status_counts,
+        completed=status_counts[TaskStatus.COMPLETED],
+        failed=status_counts[TaskStatus.FAILED],
+        progress=finished / total if total else 1.0,
+        is_finished=finished == total,
+        created_at=batch.created_at,
+        updated_at=updated_at,
+        items=items,
+    )
+    version = ",".join(f"{task_status.value}={count}" for task_status, count in status_counts.items())
+    return CachedDocument(summary, compute_etag(batch_id, {"updated_at": updated_at, "status": version}))
+
+async def get_notebook_document(notebook_id: str, user_id: str) -> Optional[CachedDocument]:
+    """
+    Retrieves a notebook's metadata and status (with its ETag) through the short-lived read cache.
+    The body is not read; see get_notebook_content_document.
+    Notebooks live under users/{user_id}, so the lookup itself enforces ownership.
+    """
+    repo = get_repository()
+
+    async def load() -> Optional[CachedDocument]:
+        notebook_data = await repo.get_notebook(user_id, notebook_id)
+        if notebook_data is None:
+            return None
+        notebook = Notebook(**{**notebook_data, "notebook_id": notebook_id}) # Doc ID wins over any stored copy
+        return CachedDocument(notebook, compute_etag(notebook_id, notebook_data))
+
+    return await document_cache.get_or_load(document_cache.notebook_key(user_id, notebook_id), load)
+
+async def get_notebook_content_document(notebook_id: str, user_id: str) -> Optional[CachedDocument]:
+    """
+    Retrieves the notebook body (with its ETag): all content chunks in one read, decompressed
+    off the event loop. Cached separately from the metadata.
+    """
+    repo = get_repository()
+    for attempt in range(2):
+        metadata = await get_notebook_document(notebook_id, user_id)
+        if metadata is None:
+            return None
+        notebook: Notebook = metadata.model
+        if notebook.content is None:
+            # No separately stored body (yet): older notebooks keep it inline.
+            content = NotebookContent(notebook_id=notebook_id, **{field: getattr(notebook, field) for field in CONTENT_FIELDS})
+            return CachedDocument(content, metadata.etag)
+        descriptor = notebook.content.model_dump()
+        etag = compute_etag(notebook_id, {"updated_at": descriptor["checksum"], "status": "content"})
+
+        async def load() -> Optional[CachedDocument]:
+            chunks = await repo.get_notebook_content(user_id, notebook_id, descriptor["chunks"])
+            content_data = await asyncio.to_thread(decode_content, descriptor, chunks)
+            content = NotebookContent(**{**content_data, "notebook_id": notebook_id})
+            return CachedDocument(content, etag)
+
+        key = document_cache.notebook_content_key(user_id, notebook_id)
+        try:
+            document = await document_cache.get_or_load(key, load)
+            if document.etag == etag:
+                return document
+            # Cached body of an older version (written by another worker); drop it and read again.
+            document_cache.invalidate(key)
+            return await document_cache.get_or_load(key, load)
+        except ValueError:
+            # Checksum mismatch: the cached metadata predates a rewrite of the body. Re-read both once.
+            if attempt:
+                raise
+            document_cache.invalidate_notebook(user_id, notebook_id)
+            document_cache.invalidate_notebook_content(user_id, notebook_id)
+
+async def get_notebook_with_content(notebook_id: str, user_id: str) -> Optional[CachedDocument]:
+    """Metadata and body merged into one Notebook, as GET /notebooks/{id}?include_content=true returns it."""
+    metadata = await get_notebook_document(notebook_id, user_id)
+    if metadata is None:
+        return None
+    content = await get_notebook_content_document(notebook_id, user_id)
+    if content is None:
+        return None
+    notebook = metadata.model.model_copy(update={field: getattr(content.model, field) for field in CONTENT_FIELDS})
+    return CachedDocument(notebook, compute_etag(notebook_id, {"updated_at": metadata.etag, "status": content.etag}))
+
 async def get_notebook_by_id(notebook_id: str, user_id: str) -> Optional[Notebook]:
-    db = get_firestore_client()
-    notebook_ref = db.collection("users").document(user_id).collection("notebooks").document(notebook_id)
-    doc = notebook_ref.get()
-    if doc.exists:
-        return Notebook(**doc.to_dict(), notebook_id=doc.id) # Pass doc.id if not stored in doc
-    return None
+    document = await get_notebook_document(notebook_id, user_id)
+    return document.model if document is not None else None
+
+async def list_notebooks(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[NotebookStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+) -> NotebookPage:
+    """
+    One page of the user's notebooks, newest first, with summary fields only.
+    Raises InvalidCursorError for a malformed cursor.
+    """
+    repo = get_repository()
+    equals = {}
+    if status is not None:
+        equals["status"] = status.value
+    fields = [field for field in NotebookSummary.model_fields if field != "notebook_id"]
+    rows, next_cursor = await fetch_page(
+        functools.partial(repo.list_notebooks, user_id), equals, fields, limit, created_after, created_before, cursor
+    )
+    return NotebookPage(
+        items=[NotebookSummary(**data, notebook_id=doc_id) for doc_id, data in rows],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,76 @@
+import re
+from typing import List, NamedTuple
+
+# Image placeholders in LLM output look like: image - [A wide shot of a mountain at sunset]
+PLACEHOLDER_PREFIX = "image - ["
+PLACEHOLDER_PATTERN = re.compile(r"image - \[(.*?)\]")
+
+
+class Placeholder(NamedTuple):
+    index: int # Position among the placeholders of the document (0-based)
+    query: str # The image description inside the brackets
+    start: int # Offset of the placeholder in the full text
+    end: int # Offset just past the closing bracket
+
+
+def extract_placeholders(text: str) -> List[Placeholder]:
+    """Finds all placeholders in a complete text."""
+    return [
+        Placeholder(index, match.group(1), match.start(), match.end())
+        for index, match in enumerate(PLACEHOLDER_PATTERN.finditer(text))
+    ]
+
+
+class IncrementalPlaceholderParser:
+    """
+    Extracts placeholders from text that arrives in chunks, e.g. a streamed LLM response.
+    feed() returns each placeholder as soon as its closing bracket has arrived, even when the
+    placeholder is split across chunk boundaries. Results (including offsets) are identical to
+    running extract_placeholders() over the concatenated text.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._pending = "" # Unresolved tail of the text that may still contain the start of a placeholder
+        self._pending_offset = 0 # Absolute offset of _pending[0]
+        self._length = 0
+        self.placeholders: List[Placeholder] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> List[Placeholder]:
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._pending += chunk
+
+        found = []
+        scanned_to = 0
+        for match in PLACEHOLDER_PATTERN.finditer(self._pending):
+            placeholder = Placeholder(
+                len(self.placeholders),
+                match.group(1),
+                self._pending_offset + match.start(),
+                self._pending_offset + match.end(),
+            )
+            self.placeholders.append(placeholder)
+            found.append(placeholder)
+            scanned_to = match.end()
+
+        # Keep only what a future match could still start in: an open placeholder (its query can't
+        # span a newline, just like the regex), or else a possible partial prefix at the very end.
+        rest = self._pending[scanned_to:]
+        open_start = rest.find(PLACEHOLDER_PREFIX, rest.rfind("\n") + 1)
+        if open_start < 0:
+            open_start = max(0, len(rest) - (len(PLACEHOLDER_PREFIX) - 1))
+        self._pending = rest[open_start:]
+        self._pending_offset = self._length - len(self._pending)
+        return found
+
+    def close(self) -> str:
+        """Ends the stream and returns the full text. An unterminated placeholder is left as plain text."""
+        self._pending = ""
+        return self.text
@@ -1,23 +1,82 @@
-from typing import Optional
-from app.db.firestore import get_firestore_client
-from app.models.task import Task
+import functools
+from datetime import datetime
+from typing import Optional, Tuple
+from app.db.read_cache import CachedDocument, compute_etag, document_cache
+from app.db.repository import get_repository
+from app.models.task import Task, TaskPage, TaskStatus, TaskSummary, ToolType
+from app.services.listing import fetch_page
 
-async def get_task_by_id(task_id: str, user_id: str) -> Optional[Task]:
+async def get_task_document(task_id: str, user_id: str) -> Optional[CachedDocument]:
     """
-    Retrieves a specific task by its ID from Firestore.
+    Retrieves a specific task (with its ETag) through the short-lived read cache.
     Ensures that the task belongs to the requesting user for basic access control.
     """
-    db = get_firestore_client()
-    task_ref = db.collection("tasks").document(task_id)
-    doc = task_ref.get()
+    repo = get_repository()
+
+    async def load() -> Optional[CachedDocument]:
+        task_data = await repo.get_task(task_id)
+        if task_data is None:
+            return None
+        task = Task(**{**task_data, "task_id": task_id}) # task_id=doc.id ensures it's part of the model
+        return CachedDocument(task, compute_etag(task_id, task_data))
 
-    if doc.exists:
-        task_data = doc.to_dict()
+    document = await document_cache.get_or_load(document_cache.task_key(task_id), load)
+    if document is not None:
         # Basic authorization: Check if the task belongs to the user_id making the request
-        if task_data.get("user_id") == user_id:
-            return Task(**task_data, task_id=doc.id) # task_id=doc.id ensures it's part of the model
+        if document.model.user_id == user_id:
+            return document
         else:
             # Task exists, but does not belong to the user. Treat as not found for security.
-            print(f"User {user_id} attempted to access task {task_id} owned by {task_data.get('user_id')}")
+            print(f"User {user_id} attempted to access task {task_id} owned by {document.model.user_id}")
             return None 
     return None
+
+async def get_task_snapshot(task_id: str, user_id: str) -> Optional[Tuple[Task, Optional[str]]]:
+    """
+    The task and its notebook's status, read from storage rather than the read cache (which can
+    lag other workers' writes), for the starting point of an event stream. None if not the user's.
+    """
+    repo = get_repository()
+    task_data = await repo.get_task(task_id)
+    if task_data is None or task_data.get("user_id") != user_id:
+        return None
+    task = Task(**{**task_data, "task_id": task_id})
+    notebook = await repo.get_notebook(user_id, task.result_document_id) if task.result_document_id else None
+    return task, (notebook or {}).get("status")
+
+async def get_task_by_id(task_id: str, user_id: str) -> Optional[Task]:
+    """
+    Retrieves a specific task by its ID from the database (or the read cache).
+    Ensures that the task belongs to the requesting user for basic access control.
+    """
+    document = await get_task_document(task_id, user_id)
+    return document.model if document is not None else None
+
+
+async def list_tasks(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[TaskStatus] = None,
+    tool_type: Optional[ToolType] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+) -> TaskPage:
+    """
+    One page of the user's tasks, newest first, with summary fields only.
+    Raises InvalidCursorError for a malformed cursor.
+    """
+    repo = get_repository()
+    equals = {}
+    if status is not None:
+        equals["status"] = status.value
+    if tool_type is not None:
+        equals["tool_type"] = tool_type.value
+    fields = [field for field in TaskSummary.model_fields if field != "task_id"]
+    rows, next_cursor = await fetch_page(
+        functools.partial(repo.list_tasks, user_id), equals, fields, limit, created_after, created_before, cursor
+    )
+    return TaskPage(
+        items=[TaskSummary(**data, task_id=doc_id) for doc_id, data in rows],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,302 @@
+"""
+End-to-end benchmark: POST /notebooks/generate -> background pipeline -> GET /tasks/{id} polling.
+
+Runs the FastAPI app in-process (httpx ASGI transport, lifespan included) against the in-memory
+Firestore fake (or a throwaway SQLite database with --storage sqlite) with auth bypassed, so no
+Firebase project is needed. The mock AI services get
+their latency distribution and failure rates from the MOCK_* settings, which the flags below set.
+
+    python benchmarks/run_benchmark.py --notebooks 200 --concurrency 50
+    python benchmarks/run_benchmark.py --latency-distribution lognormal --llm-failure-rate 0.05 \
+        --compare benchmarks/results/<earlier run>.json
+
+Reports requests/sec, request and end-to-end completion percentiles, event-loop lag and
+storage operation counts, and writes everything to a JSON file for comparing runs.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notebooks", type=int, default=100, help="Notebooks to generate in total")
+    parser.add_argument("--concurrency", type=int, default=20, help="Simulated clients, each generating one notebook at a time")
+    parser.add_argument("--distinct-topics", type=int, default=0, help="Cycle through this many topics (0: every notebook gets its own topic)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between GET /tasks/{id} polls")
+    parser.add_argument("--timeout", type=float, default=300, help="Give up on a notebook after this many seconds")
+    parser.add_argument("--latency-distribution", default="fixed", choices=("fixed", "uniform", "exponential", "lognormal"))
+    parser.add_argument("--llm-latency", type=float, default=3.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--scraper-latency", type=float, default=2.0)
+    parser.add_argument("--scraper-failure-rate", type=float, default=0.0)
+    parser.add_argument("--validator-latency", type=float, default=1.0)
+    parser.add_argument("--validator-failure-rate", type=float, default=0.0)
+    parser.add_argument("--validator-rejection-rate", type=float, default=0.1, help="Share of images the mock validator rejects")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the mock latency, failure and rejection draws")
+    parser.add_argument("--storage", default="firestore", choices=("firestore", "sqlite"), help="Storage backend (firestore: the in-memory fake)")
+    parser.add_argument("--admission", action="store_true", help="Keep admission control on (rejected notebooks count as REJECTED)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the LLM and image caches")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra settings override, repeatable")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's own log output")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace):
+    # Settings are read once at import, so this has to happen before anything from `app` is imported.
+    overrides = {
+        "FIRESTORE_BACKEND": "memory",
+        "AUTH_DEV_BYPASS": "true",
+        "STORAGE_BACKEND": args.storage,
+        # Every simulated client is the same dev user, so the per-user limit would throttle the load itself.
+        "ADMISSION_CONTROL_ENABLED": "true" if args.admission else "false",
+        "MOCK_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "MOCK_LLM_LATENCY_SECONDS": str(args.llm_latency),
+        "MOCK_LLM_FAILURE_RATE": str(args.llm_failure_rate),
+        "MOCK_SCRAPER_LATENCY_SECONDS": str(args.scraper_latency),
+        "MOCK_SCRAPER_FAILURE_RATE": str(args.scraper_failure_rate),
+        "MOCK_VALIDATOR_LATENCY_SECONDS": str(args.validator_latency),
+        "MOCK_VALIDATOR_FAILURE_RATE": str(args.validator_failure_rate),
+        "MOCK_VALIDATOR_REJECTION_RATE": str(args.validator_rejection_rate),
+    }
+    if args.storage == "sqlite":
+        overrides["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="mineshear-benchmark-"), "benchmark.db")
+    if args.seed is not None:
+        overrides["MOCK_RANDOM_SEED"] = str(args.seed)
+    if args.no_cache:
+        overrides.update(LLM_CACHE_ENABLED="false", IMAGE_CACHE_ENABLED="false")
+    for item in args.env:
+        name, _, value = item.partition("=")
+        overrides[name] = value
+    os.environ.update(overrides)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return overrides
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def nearest_rank(p: float) -> float:
+        return ordered[min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": round(nearest_rank(50), 4),
+        "p90": round(nearest_rank(90), 4),
+        "p95": round(nearest_rank(95), 4),
+        "p99": round(nearest_rank(99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task that sleeps `interval` seconds."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class LoadGenerator:
+    def __init__(self, client, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.request_latencies: Dict[str, List[float]] = {"generate": [], "task_poll": []}
+        self.not_modified = 0
+        self.completion_times: List[float] = []
+        self.outcomes: Dict[str, int] = {"COMPLETED": 0, "FAILED": 0, "TIMEOUT": 0, "REJECTED": 0, "ERROR": 0}
+
+    def topic(self, i: int) -> str:
+        if self.args.distinct_topics:
+            i %= self.args.distinct_topics
+        return f"benchmark topic {i}"
+
+    async def _request(self, kind: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.request_latencies[kind].append(time.perf_counter() - started)
+        return response
+
+    async def generate_one(self, i: int):
+        started = time.perf_counter()
+        response = await self._request("generate", "POST", "/api/v1/notebooks/generate", json={"topic": self.topic(i)})
+        if response.status_code in (429, 503):
+            self.outcomes["REJECTED"] += 1 # Admission control; not retried
+            return
+        if response.status_code != 202:
+            self.outcomes["ERROR"] += 1
+            return
+        task_id = response.json()["task_id"]
+        etag = None
+        deadline = started + self.args.timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.poll_interval)
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await self._request("task_poll", "GET", f"/api/v1/tasks/{task_id}", headers=headers)
+            if response.status_code == 304:
+                self.not_modified += 1
+                continue
+            if response.status_code != 200:
+                self.outcomes["ERROR"] += 1
+                return
+            etag = response.headers.get("etag")
+            task_status = response.json()["status"]
+            if task_status in TERMINAL_STATUSES:
+                self.outcomes[task_status] += 1
+                if task_status == "COMPLETED":
+                    self.completion_times.append(time.perf_counter() - started)
+                return
+        self.outcomes["TIMEOUT"] += 1
+
+    async def run(self):
+        next_index = iter(range(self.args.notebooks))
+
+        async def client_loop():
+            for i in next_index: # Shared iterator: each simulated client takes the next notebook
+                await self.generate_one(i)
+
+        await asyncio.gather(*(client_loop() for _ in range(max(1, self.args.concurrency))))
+
+
+async def run_benchmark(args: argparse.Namespace, overrides: Dict[str, str]) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.db.repository import get_repository
+    from app.background import scheduler as scheduler_module
+    from app.api.v1.endpoints.system import get_cache_stats, get_upstream_stats
+
+    monitor = LoopLagMonitor()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            load = LoadGenerator(client, args)
+            monitor.start()
+            started = time.perf_counter()
+            await load.run()
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+            storage_backend = get_repository().name
+            storage_ops = get_repository().stats()
+            scheduler_stats = scheduler_module.get_scheduler().stats()
+            cache_stats = await get_cache_stats()
+            upstream_stats = await get_upstream_stats()
+
+    total_requests = sum(len(latencies) for latencies in load.request_latencies.values())
+    completed = load.outcomes["COMPLETED"]
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose")},
+        "settings_overrides": overrides,
+        "wall_time_seconds": round(elapsed, 3),
+        "outcomes": load.outcomes,
+        "throughput": {
+            "requests_total": total_requests,
+            "requests_per_second": round(total_requests / elapsed, 2),
+            "notebooks_per_second": round(completed / elapsed, 3),
+            "not_modified_polls": load.not_modified,
+        },
+        "request_latency_seconds": {kind: percentiles(values) for kind, values in load.request_latencies.items()},
+        "completion_seconds": percentiles(load.completion_times),
+        "event_loop_lag_seconds": percentiles(monitor.lags),
+        "storage_backend": storage_backend,
+        "storage_operations": {
+            **storage_ops,
+            "per_notebook": {key: round(value / max(1, args.notebooks), 2) for key, value in storage_ops.items()},
+        },
+        "scheduler": scheduler_stats,
+        "caches": cache_stats,
+        "upstreams": upstream_stats,
+    }
+
+
+def print_summary(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    rows = [
+        ("wall time (s)", ("wall_time_seconds",)),
+        ("requests/s", ("throughput", "requests_per_second")),
+        ("notebooks/s", ("throughput", "notebooks_per_second")),
+        ("completion p50 (s)", ("completion_seconds", "p50")),
+        ("completion p95 (s)", ("completion_seconds", "p95")),
+        ("completion p99 (s)", ("completion_seconds", "p99")),
+        ("generate p95 (s)", ("request_latency_seconds", "generate", "p95")),
+        ("task poll p95 (s)", ("request_latency_seconds", "task_poll", "p95")),
+        ("loop lag p99 (s)", ("event_loop_lag_seconds", "p99")),
+        ("loop lag max (s)", ("event_loop_lag_seconds", "max")),
+        ("storage reads", ("storage_operations", "reads")),
+        ("storage writes", ("storage_operations", "writes")),
+        ("storage commits", ("storage_operations", "commits")),
+    ]
+
+    def lookup(data, path):
+        for key in path:
+            data = data.get(key) if isinstance(data, dict) else None
+        return data
+
+    print(f"\nOutcomes: {results['outcomes']}")
+    print(f"{'metric':<22}{'this run':>14}" + (f"{'baseline':>14}{'change':>10}" if baseline else ""))
+    for label, path in rows:
+        value = lookup(results, path)
+        line = f"{label:<22}{str(value):>14}"
+        if baseline:
+            base = lookup(baseline, path)
+            change = f"{(value - base) / base * 100:+.1f}%" if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base else "-"
+            line += f"{str(base):>14}{change:>10}"
+        print(line)
+
+
+def main():
+    args = parse_args()
+    overrides = configure_environment(args)
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+
+    # The app logs every step with print(); keep the report readable unless asked otherwise.
+    app_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with app_output:
+        results = asyncio.run(run_benchmark(args, overrides))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Throughput of the local CLIP image validator (IMAGE_VALIDATOR_BACKEND=clip) on this machine's CPU.
+
+For each batch size, embeds a fixed set of synthetic JPEGs through the ONNX image encoder and
+reports images/sec, both for inference alone and including decode + preprocessing (which runs
+per image before each batch). Also times the text encoder. No network access is needed, only an
+exported model (see app/services/ai/clip_validator.py).
+
+    python benchmarks/validator_throughput.py --model-dir models/clip
+    python benchmarks/validator_throughput.py --batch-sizes 1,8,32 --images 512 --threads 4
+
+Pick IMAGE_VALIDATION_BATCH_MAX_SIZE around the point where images/sec stops improving, and
+CLIP_INTRA_OP_THREADS for the node's core count.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default="models/clip", help="Directory with image_encoder.onnx, text_encoder.onnx and tokenizer.json")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64", help="Comma-separated batch sizes")
+    parser.add_argument("--images", type=int, default=256, help="Images embedded per batch size")
+    parser.add_argument("--image-size", default="800x600", help="Synthetic JPEG dimensions, WIDTHxHEIGHT")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0: default)")
+    parser.add_argument("--texts", type=int, default=256, help="Texts embedded for the text encoder timing")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmarks/results/validator-<timestamp>.json)")
+    return parser.parse_args()
+
+
+def synthetic_jpegs(count: int, width: int, height: int) -> List[bytes]:
+    """Noise plus a gradient, so decoding and resizing do realistic work. A few distinct images, reused."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    distinct = []
+    for _ in range(min(count, 16)):
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        pixels = np.clip(rng.normal(0, 40, (height, width, 3)) + gradient, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+        distinct.append(buffer.getvalue())
+    return [distinct[i % len(distinct)] for i in range(count)]
+
+
+def measure_images(embedder, images: List[bytes], batch_size: int) -> Dict[str, Any]:
+    np = embedder.np
+    # Warm up: the first runs allocate buffers for this shape
+    warmup = np.stack([embedder.preprocess(images[0])] * batch_size)
+    embedder.embed_images(warmup)
+
+    preprocess_seconds = inference_seconds = 0.0
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        t0 = time.perf_counter()
+        pixels = np.stack([embedder.preprocess(data) for data in chunk])
+        t1 = time.perf_counter()
+        embedder.embed_images(pixels)
+        t2 = time.perf_counter()
+        preprocess_seconds += t1 - t0
+        inference_seconds += t2 - t1
+    total = preprocess_seconds + inference_seconds
+    return {
+        "batch_size": batch_size,
+        "images": len(images),
+        "inference_images_per_sec": round(len(images) / inference_seconds, 1),
+        "end_to_end_images_per_sec": round(len(images) / total, 1),
+        "preprocess_ms_per_image": round(preprocess_seconds / len(images) * 1000, 2),
+        "batch_latency_ms": round(inference_seconds / -(-len(images) // batch_size) * 1000, 1),
+    }
+
+
+def measure_texts(embedder, count: int, batch_size: int) -> Dict[str, Any]:
+    texts = [f"A photograph of example subject number {i} in its natural setting" for i in range(count)]
+    embedder.embed_texts(texts[:batch_size])
+    started = time.perf_counter()
+    for start in range(0, count, batch_size):
+        embedder.embed_texts(texts[start:start + batch_size])
+    elapsed = time.perf_counter() - started
+    return {"batch_size": batch_size, "texts": count, "texts_per_sec": round(count / elapsed, 1)}
+
+
+def main():
+    args = parse_args()
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from app.services.ai.clip_validator import ClipEmbedder
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+    width, _, height = args.image_size.partition("x")
+    embedder = ClipEmbedder(args.model_dir, intra_op_threads=args.threads)
+    images = synthetic_jpegs(args.images, int(width), int(height))
+
+    results: Dict[str, Any] = {
+        "model_dir": args.model_dir,
+        "cpu_count": os.cpu_count(),
+        "threads": args.threads,
+        "image_size": args.image_size,
+        "images": [],
+        "texts": [],
+    }
+    print(f"{'batch':>6}{'infer img/s':>14}{'e2e img/s':>12}{'prep ms/img':>13}{'batch ms':>10}")
+    for batch_size in batch_sizes:
+        row = measure_images(embedder, images, batch_size)
+        results["images"].append(row)
+        print(f"{batch_size:>6}{row['inference_images_per_sec']:>14}{row['end_to_end_images_per_sec']:>12}"
+              f"{row['preprocess_ms_per_image']:>13}{row['batch_latency_ms']:>10}")
+    for batch_size in batch_sizes:
+        results["texts"].append(measure_texts(embedder, args.texts, batch_size))
+    print("text encoder: " + ", ".join(f"batch {row['batch_size']}: {row['texts_per_sec']}/s" for row in results["texts"]))
+
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"validator-{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
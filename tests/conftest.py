@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from app.db.async_firestore import AsyncFirestore
+from app.db.firestore_repository import FirestoreRepository
+from app.db.memory import InMemoryFirestoreClient
+from app.db.sqlite_repository import SQLiteRepository
+
+# Tests run coroutines with asyncio.run() rather than an async plugin, so the suite only needs pytest.
+
+
+@pytest.fixture
+def memory_client() -> InMemoryFirestoreClient:
+    return InMemoryFirestoreClient()
+
+
+@pytest.fixture
+def async_db(memory_client):
+    adb = AsyncFirestore(memory_client, pool_size=4)
+    yield adb
+    adb.close()
+
+
+@pytest.fixture(params=["firestore", "sqlite"])
+def repository(request, tmp_path):
+    """Each storage backend, so repository tests check both against the same contract."""
+    if request.param == "firestore":
+        adb = AsyncFirestore(InMemoryFirestoreClient(), pool_size=4)
+        yield FirestoreRepository(adb)
+        adb.close()
+    else:
+        repo = SQLiteRepository(str(tmp_path / "test.db"), pool_size=2)
+        yield repo
+        asyncio.run(repo.close())
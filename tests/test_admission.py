@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.admission import AdmissionController, AdmissionRejected, MemoryAdmissionStore, retry_after_header
+from app.core.config import settings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    # Buckets and their cache entries read time.monotonic(); the tests never sleep for real.
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def _controller(**kwargs) -> AdmissionController:
+    options = {"user_rate_per_minute": 60, "user_burst": 10, "max_in_flight": 500}
+    return AdmissionController(MemoryAdmissionStore(), **{**options, **kwargs})
+
+
+def _rejection(controller: AdmissionController, user_id: str, cost: int = 1) -> AdmissionRejected:
+    with pytest.raises(AdmissionRejected) as info:
+        asyncio.run(controller.admit(user_id, cost))
+    return info.value
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    controller = _controller() # 1 token per second, 10 at most
+    for _ in range(10):
+        asyncio.run(controller.admit("u1"))
+    rejected = _rejection(controller, "u1")
+    assert (rejected.status_code, rejected.reason) == (429, "rate_limited")
+    assert rejected.retry_after == pytest.approx(1.0)
+    assert retry_after_header(rejected.retry_after) == "1"
+
+    asyncio.run(controller.admit("u2")) # Buckets are per user
+
+    clock.now += 3
+    for _ in range(3):
+        asyncio.run(controller.admit("u1"))
+    assert _rejection(controller, "u1").reason == "rate_limited"
+
+    clock.now += 3600 # Refills up to the burst, no further
+    asyncio.run(controller.admit("u1", cost=10))
+    assert _rejection(controller, "u1").reason == "rate_limited"
+
+
+def test_batch_cost_and_retry_after(clock):
+    controller = _controller()
+    asyncio.run(controller.admit("u1", cost=7))
+    rejected = _rejection(controller, "u1", cost=5)
+    assert rejected.retry_after == pytest.approx(2.0) # 3 tokens left, 5 needed
+    clock.now += 2
+    asyncio.run(controller.admit("u1", cost=5))
+
+
+def test_batch_larger_than_the_burst_needs_a_full_bucket(clock):
+    controller = _controller(user_rate_per_minute=30, user_burst=60) # The defaults
+    asyncio.run(controller.admit("u1", cost=1))
+    rejected = _rejection(controller, "u1", cost=100)
+    assert rejected.status_code == 429
+    assert rejected.retry_after == pytest.approx(2.0) # Until the bucket is full again
+
+    clock.now += 2
+    ticket = asyncio.run(controller.admit("u1", cost=100))
+    assert len(ticket._unbound) == 100
+
+    # The batch left the bucket 40 tokens in debt: the next notebook waits for 41 tokens at 0.5/s.
+    rejected = _rejection(controller, "u1")
+    assert rejected.retry_after == pytest.approx(82.0)
+    clock.now += 82
+    asyncio.run(controller.admit("u1"))
+
+
+def test_batch_of_100_topics_is_admitted_with_default_settings(clock):
+    assert settings.BULK_GENERATE_MAX_TOPICS >= 100 > settings.ADMISSION_USER_BURST
+    controller = _controller(
+        user_rate_per_minute=settings.ADMISSION_USER_RATE_PER_MINUTE,
+        user_burst=settings.ADMISSION_USER_BURST,
+        max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    )
+    asyncio.run(controller.admit("u1", cost=100))
+    assert controller.admitted == 100
+
+
+def test_in_flight_cap_is_checked_before_the_user_bucket(clock):
+    controller = _controller(max_in_flight=5)
+    asyncio.run(controller.admit("u1", cost=5))
+    rejected = _rejection(controller, "u2", cost=1)
+    assert (rejected.status_code, rejected.reason) == (503, "saturated")
+    assert rejected.retry_after == controller.saturated_retry_after
+    # u2's tokens were not spent on the rejected request
+    assert asyncio.run(controller.store.take_tokens("user:u2", 10, 1, 10))[0]
+
+    rejected = _rejection(controller, "u3", cost=6)
+    assert (rejected.status_code, rejected.reason) == (422, "too_large")
+
+
+def test_rate_limited_requests_release_their_leases(clock):
+    controller = _controller(user_burst=2)
+    asyncio.run(controller.admit("u1", cost=2))
+    _rejection(controller, "u1")
+    assert asyncio.run(controller.store.in_flight()) == 2
+
+
+def test_leases_are_released_when_pipelines_finish(clock):
+    async def scenario():
+        controller = _controller(max_in_flight=2)
+        # Leases no pipeline took are released explicitly
+        ticket = await controller.admit("u1", cost=2)
+        await ticket.release()
+        assert await controller.store.in_flight() == 0
+
+        ticket = await controller.admit("u1", cost=2)
+        pipelines = [asyncio.ensure_future(asyncio.sleep(0)) for _ in range(2)]
+        for pipeline in pipelines:
+            ticket.bind(pipeline)
+        assert await controller.store.in_flight() == 2
+        await asyncio.gather(*pipelines)
+        await controller.close() # Waits for the pending releases
+        assert await controller.store.in_flight() == 0
+    asyncio.run(scenario())
+
+
+def test_disabled_and_failing_stores_admit_everything(clock):
+    controller = _controller(enabled=False, user_burst=1)
+    for _ in range(5):
+        asyncio.run(controller.admit("u1", cost=2))
+
+    class BrokenStore(MemoryAdmissionStore):
+        async def acquire_leases(self, lease_ids, limit, ttl_seconds):
+            raise ConnectionError("redis is down")
+
+    controller = AdmissionController(BrokenStore(), user_burst=1)
+    asyncio.run(controller.admit("u1", cost=1))
+    assert controller.store_errors == 1
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.core.batching import MicroBatcher
+
+
+class Recorder:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, items):
+        self.calls.append(list(items))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise ValueError("model unavailable")
+        return [item * 10 for item in items]
+
+
+def test_concurrent_items_share_batches_up_to_the_size_limit():
+    dispatch = Recorder()
+    batcher = MicroBatcher(dispatch, max_batch_size=4, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    assert asyncio.run(scenario()) == [i * 10 for i in range(10)]
+    assert dispatch.calls == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]] # The last one after max_wait_ms
+    assert batcher.stats()["largest_batch"] == 4 and batcher.stats()["batches"] == 3
+
+
+def test_a_failed_batch_fails_every_caller_in_it():
+    batcher = MicroBatcher(Recorder(fail=True), max_batch_size=8, max_wait_ms=1)
+
+    async def scenario():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert [str(result) for result in asyncio.run(scenario())] == ["model unavailable"] * 2
+
+
+def test_callers_that_gave_up_are_left_out_of_the_batch():
+    dispatch = Recorder()
+    batcher = MicroBatcher(dispatch, max_batch_size=8, max_wait_ms=20)
+
+    async def scenario():
+        abandoned = asyncio.ensure_future(batcher.submit(1))
+        kept = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        return await kept
+    assert asyncio.run(scenario()) == 20
+    assert dispatch.calls == [[2]]
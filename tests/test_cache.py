@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+from app.core.cache import DiskCacheBackend
+
+
+def _files(directory) -> list:
+    return sorted(os.listdir(directory))
+
+
+def test_disk_cache_evicts_least_recently_used_entries_beyond_max_bytes(tmp_path):
+    value = "x" * 100 # About 150 bytes per file with its envelope
+    cache = DiskCacheBackend(str(tmp_path), max_bytes=500)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await cache.set(key, value, ttl_seconds=60)
+        assert await cache.get("a") == value # Now b is the least recently used
+        await cache.set("d", value, ttl_seconds=60)
+        return await cache.get("b")
+
+    assert asyncio.run(scenario()) is None
+    assert _files(tmp_path) == ["a.json", "c.json", "d.json"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.total_bytes <= 500
+
+
+def test_disk_cache_rebuilds_its_index_and_bound_at_startup(tmp_path):
+    asyncio.run(DiskCacheBackend(str(tmp_path)).set("a", "x" * 100, ttl_seconds=60))
+    asyncio.run(DiskCacheBackend(str(tmp_path)).set("b", "x" * 100, ttl_seconds=60))
+    (tmp_path / ".tmp-partial").write_text("{") # Another writer's file in progress
+    cache = DiskCacheBackend(str(tmp_path), max_bytes=250)
+    assert list(cache.entries) in (["b"], ["a"]) # Same atime resolution: either may go first
+    assert len([name for name in _files(tmp_path) if name.endswith(".json")]) == 1
+    assert ".tmp-partial" in _files(tmp_path)
+
+
+def test_disk_cache_drops_expired_entries_and_leaves_no_temp_files(tmp_path):
+    cache = DiskCacheBackend(str(tmp_path))
+
+    async def scenario():
+        await asyncio.gather(*(cache.set("k", index, ttl_seconds=60) for index in range(20)))
+        fresh = await cache.get("k")
+        await cache.set("old", "v", ttl_seconds=-1)
+        return fresh, await cache.get("old")
+
+    fresh, expired = asyncio.run(scenario())
+    assert fresh in range(20) # Concurrent writers of one key never leave a torn file
+    assert expired is None
+    assert _files(tmp_path) == ["k.json"]
+    assert list(cache.entries) == ["k"]
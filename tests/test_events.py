@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+from app.api.v1.endpoints import tasks as tasks_endpoint
+from app.core import events
+from app.core.events import EventBus, InProcessEventBackend, RedisEventBackend
+from app.models.event import TaskEvent, TaskEventType
+from app.models.notebook import ImageRequest
+from app.models.task import Task, TaskStatus, ToolType
+from app.models.user import User
+
+
+def _status(task_status: str) -> TaskEvent:
+    return TaskEvent(task_id="t1", type=TaskEventType.STATUS, task_status=task_status)
+
+
+def _image(index: int) -> TaskEvent:
+    return TaskEvent(task_id="t1", type=TaskEventType.IMAGE, image_index=index, image=ImageRequest(query="q", status="FETCHED"))
+
+
+class ConnectedRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def test_stream_starts_from_the_snapshot_without_stale_status_events(monkeypatch):
+    user = User(user_id="u1", email="u1@example.com", created_at=datetime(2024, 1, 1))
+    task = Task(task_id="t1", user_id="u1", tool_type=ToolType.NOTEBOOK_GENERATOR, input_payload={}, status=TaskStatus.PROCESSING)
+
+    async def get_task_snapshot(task_id, user_id):
+        return task, "PROCESSING_TEXT"
+    monkeypatch.setattr(tasks_endpoint.task_service, "get_task_snapshot", get_task_snapshot)
+
+    async def scenario():
+        bus = EventBus(InProcessEventBackend())
+        await bus.start()
+        monkeypatch.setattr(events, "event_bus", bus)
+        await bus.publish(_status("PENDING"))
+        await bus.publish(_image(0))
+
+        response = await tasks_endpoint.stream_task_events("t1", ConnectedRequest(), current_user=user)
+        stream = response.body_iterator
+        snapshot = await stream.__anext__()
+        assert snapshot.startswith("event: STATUS\n") and '"notebook_status":"PROCESSING_TEXT"' in snapshot
+        assert '"image_index":0' in await stream.__anext__() # Image progress is caught up on
+        await bus.publish(_status("COMPLETED")) # The stale PENDING transition was not replayed
+        assert '"task_status":"COMPLETED"' in await stream.__anext__()
+        assert [chunk async for chunk in stream] == []
+        assert bus.stats()["subscribers"] == 0
+    asyncio.run(scenario())
+
+
+def test_stream_ends_on_a_terminal_event_the_snapshot_missed(monkeypatch):
+    user = User(user_id="u1", email="u1@example.com", created_at=datetime(2024, 1, 1))
+    stale = Task(task_id="t1", user_id="u1", tool_type=ToolType.NOTEBOOK_GENERATOR, input_payload={}, status=TaskStatus.PROCESSING)
+
+    async def get_task_snapshot(task_id, user_id):
+        return stale, "PROCESSING_IMAGES"
+    monkeypatch.setattr(tasks_endpoint.task_service, "get_task_snapshot", get_task_snapshot)
+
+    async def scenario():
+        bus = EventBus(InProcessEventBackend())
+        await bus.start()
+        monkeypatch.setattr(events, "event_bus", bus)
+        await bus.publish(_image(0))
+        await bus.publish(_status("COMPLETED")) # Published before the snapshot's write was visible
+
+        response = await tasks_endpoint.stream_task_events("t1", ConnectedRequest(), current_user=user)
+        chunks = [chunk async for chunk in response.body_iterator] # Would hang waiting on the live queue
+        assert len(chunks) == 3
+        assert '"image_index":0' in chunks[1]
+        assert '"task_status":"COMPLETED"' in chunks[2]
+        assert bus.stats()["subscribers"] == 0
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+
+
+def test_redis_listener_survives_malformed_messages():
+    delivered = []
+    backend = RedisEventBackend.__new__(RedisEventBackend) # No Redis connection needed
+    backend._deliver = lambda channel, message: delivered.append((channel, TaskEvent.model_validate_json(message).task_status))
+    backend._pubsub = FakePubSub([
+        {"type": "psubscribe"},
+        {"type": "pmessage", "channel": b"task-events:t1", "data": b"not json"},
+        {"type": "pmessage", "channel": None, "data": b"{}"},
+        {"type": "pmessage", "channel": b"task-events:t1", "data": _status("COMPLETED").model_dump_json().encode()},
+    ])
+    asyncio.run(backend._listen())
+    assert delivered == [("t1", "COMPLETED")]
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.core import http_clients
+from app.core.config import settings
+from app.core.http_clients import UpstreamHttpConfig, start_http_clients, upstream_http_configs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so the pool can reuse the connection
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _names(configs) -> list:
+    return [config.name for config in configs]
+
+
+def test_only_configured_upstreams_get_a_client(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_DEV_BYPASS", True)
+    for name in ("LLM_API_BASE_URL", "IMAGE_SCRAPER_BASE_URL", "IMAGE_VALIDATOR_BASE_URL"):
+        monkeypatch.setattr(settings, name, None)
+    monkeypatch.setattr(settings, "IMAGE_VALIDATOR_BACKEND", "mock")
+    monkeypatch.setattr(settings, "IMAGE_STORE_BACKEND", "none")
+    assert upstream_http_configs() == []
+    assert start_http_clients() is None and http_clients.get_http_clients() is None # All mocked: no httpx needed
+
+    monkeypatch.setattr(settings, "LLM_API_BASE_URL", "https://llm.example/v1")
+    monkeypatch.setattr(settings, "IMAGE_STORE_BACKEND", "local")
+    monkeypatch.setattr(settings, "AUTH_DEV_BYPASS", False)
+    assert _names(upstream_http_configs()) == ["llm", "image-fetch", "firebase-auth"]
+
+
+def test_requests_to_a_stub_server_reuse_one_connection(stub_server):
+    async def scenario():
+        registry = start_http_clients(configs=[UpstreamHttpConfig("image-scraper", stub_server, timeout=5)])
+        try:
+            client = registry.get("image-scraper")
+            for _ in range(3):
+                response = await client.get("/search")
+                assert response.json() == {"ok": True}
+            assert registry.get("llm") is None # Not configured
+            return registry.stats()["image-scraper"]
+        finally:
+            await http_clients.close_http_clients()
+    stats = asyncio.run(scenario())
+    assert (stats["requests"], stats["new_connections"], stats["tls_handshakes"]) == (3, 1, 0)
+    assert stats["connection_reuse_ratio"] == pytest.approx(0.667)
+    assert stats["base_url"] == stub_server
+    assert http_clients.get_http_clients() is None
+
+
+def test_transports_replace_the_network_per_upstream():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"text": "hello"})
+
+    async def scenario():
+        registry = start_http_clients(
+            transports={"llm": httpx.MockTransport(handler)},
+            configs=[UpstreamHttpConfig("llm", "https://llm.example/v1", timeout=5)],
+        )
+        try:
+            response = await registry.get("llm").post("/complete", json={"topic": "glaciers"})
+            assert response.json() == {"text": "hello"}
+            stats = registry.stats()["llm"]
+            # A custom transport has no httpcore pool to inspect, and opens no connections
+            assert (stats["requests"], stats["new_connections"], stats["pool"]["connections"]) == (1, 0, 0)
+        finally:
+            await http_clients.close_http_clients()
+    asyncio.run(scenario())
+    assert seen == ["https://llm.example/v1/complete"]
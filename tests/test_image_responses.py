@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.api.v1.endpoints import images
+from app.api.v1.responses import immutable_file_response
+
+ASSET_ID = "ab" * 32
+DATA = bytes(range(256)) * 1024
+
+
+def _request(headers=None) -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw, "query_string": b""})
+
+
+async def _body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+@pytest.fixture
+def image_file(tmp_path) -> str:
+    path = tmp_path / "640.webp"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def test_file_evicted_after_the_response_is_built_is_still_served(image_file):
+    async def scenario():
+        response = await immutable_file_response(_request(), image_file, "image/webp", '"v1"', {})
+        os.unlink(image_file) # Disk cache eviction while the response is queued
+        assert response.headers["content-length"] == str(len(DATA))
+        assert await _body(response) == DATA
+    asyncio.run(scenario())
+
+
+def test_ranges_and_conditional_requests(image_file):
+    async def respond(headers):
+        return await immutable_file_response(_request(headers), image_file, "image/webp", '"v1"', {})
+
+    partial = asyncio.run(respond({"Range": "bytes=10-19"}))
+    assert (partial.status_code, partial.body, partial.headers["content-range"]) == (206, DATA[10:20], f"bytes 10-19/{len(DATA)}")
+    assert asyncio.run(respond({"Range": "bytes=-5"})).body == DATA[-5:]
+    assert asyncio.run(respond({"Range": f"bytes={len(DATA)}-"})).status_code == 416
+    assert asyncio.run(respond({"If-None-Match": '"v1"'})).status_code == 304
+    assert asyncio.run(respond({"Range": "bytes=0-0", "If-Range": '"v0"'})).status_code == 200
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(immutable_file_response(_request(), image_file + ".missing", "image/webp", '"v1"', {}))
+
+
+class EvictingVariants:
+    """The first lookup returns a path that was evicted in the meantime, as under cache pressure."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lookups = 0
+
+    async def get_variant(self, asset_id, width, extension):
+        self.lookups += 1
+        return (self.path + ".evicted" if self.lookups == 1 else self.path), "image/webp"
+
+
+def test_variant_evicted_before_it_is_opened_is_rendered_again(image_file, monkeypatch):
+    service = EvictingVariants(image_file)
+    monkeypatch.setattr(images, "get_variant_service", lambda: service)
+    app = FastAPI()
+    app.include_router(images.router, prefix="/images")
+
+    response = TestClient(app).get(f"/images/{ASSET_ID}/640.webp")
+    assert (response.status_code, response.content) == (200, DATA)
+    assert service.lookups == 2
@@ -0,0 +1,153 @@
+import asyncio
+import io
+import os
+import random
+
+import pytest
+from PIL import Image
+
+from app.db import repository as repository_module
+from app.services.image_store import PHASH_BANDS, ImageAssetStore, LocalImageBlobStore, fingerprint, phash_bands
+
+
+def _noise(seed: int, size: int = 64) -> Image.Image:
+    rng = random.Random(seed)
+    image = Image.new("L", (size, size))
+    image.putdata([rng.randrange(256) for _ in range(size * size)])
+    return image.resize((256, 256)).convert("RGB") # Blocky, so re-encoding keeps its gradients
+
+
+def _encode(image: Image.Image, image_format: str = "PNG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+class StubFetcher:
+    """Serves fixed bytes per URL and counts downloads."""
+
+    def __init__(self, images):
+        self.images = images
+        self.fetched = []
+
+    async def fetch(self, url: str) -> bytes:
+        self.fetched.append(url)
+        return self.images[url]
+
+    def stats(self):
+        return {"fetched": len(self.fetched)}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def store_repository(repository, monkeypatch):
+    monkeypatch.setattr(repository_module, "repository", repository)
+    return repository
+
+
+def _store(tmp_path, images) -> ImageAssetStore:
+    return ImageAssetStore(LocalImageBlobStore(str(tmp_path / "images")), StubFetcher(images), max_distance=6)
+
+
+def _stored_files(store: ImageAssetStore):
+    return [name for _, _, names in os.walk(store.blobs.directory) for name in names]
+
+
+def test_ingest_stores_a_new_image_once_and_remembers_its_source(store_repository, tmp_path):
+    original = _encode(_noise(1))
+    store = _store(tmp_path, {"https://a.example/1.png": original})
+
+    async def scenario():
+        asset_id = await store.ingest("https://a.example/1.png")
+        assert await store.ingest("https://a.example/1.png") == asset_id # In-memory source cache
+        store.sources.clear()
+        assert await store.ingest("https://a.example/1.png") == asset_id # The repository's image_sources index
+        return asset_id
+
+    asset_id = asyncio.run(scenario())
+    assert store.fetcher.fetched == ["https://a.example/1.png"]
+    assert store.outcomes == {"known_source": 2, "exact": 0, "similar": 0, "new": 1}
+    assert _stored_files(store) == [asset_id]
+    with open(store.blobs.local_path(asset_id), "rb") as f:
+        assert f.read() == original
+    asset = asyncio.run(store_repository.get_image_asset(asset_id))
+    assert asset["content_type"] == "image/png" and asset["width"] == 256
+
+
+def test_ingest_resolves_the_same_bytes_at_another_url_without_storing_them_again(store_repository, tmp_path):
+    original = _encode(_noise(1))
+    store = _store(tmp_path, {"https://a.example/1.png": original, "https://mirror.example/copy.png": original})
+
+    async def scenario():
+        return await store.ingest("https://a.example/1.png"), await store.ingest("https://mirror.example/copy.png")
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert store.outcomes["exact"] == 1
+    assert len(_stored_files(store)) == 1
+
+
+def test_ingest_maps_a_near_duplicate_to_the_first_stored_copy(store_repository, tmp_path):
+    original = _noise(1)
+    reencoded = _encode(original.resize((200, 200)), "JPEG", quality=80)
+    store = _store(tmp_path, {"https://a.example/1.png": _encode(original), "https://b.example/1.jpg": reencoded})
+    distance = bin(fingerprint(_encode(original))[3] ^ fingerprint(reencoded)[3]).count("1")
+    assert distance <= 6 # Precondition: the re-encoded copy really is perceptually the same
+
+    async def scenario():
+        return await store.ingest("https://a.example/1.png"), await store.ingest("https://b.example/1.jpg")
+
+    first, second = asyncio.run(scenario())
+    assert second == first
+    assert store.outcomes["similar"] == 1
+    assert len(_stored_files(store)) == 1
+
+
+def test_ingest_stores_a_different_image_separately(store_repository, tmp_path):
+    store = _store(tmp_path, {"https://a.example/1.png": _encode(_noise(1)), "https://a.example/2.png": _encode(_noise(2))})
+
+    async def scenario():
+        return await store.ingest("https://a.example/1.png"), await store.ingest("https://a.example/2.png")
+
+    first, second = asyncio.run(scenario())
+    assert first != second
+    assert store.outcomes["new"] == 2
+    assert sorted(_stored_files(store)) == sorted([first, second])
+
+
+def test_hashes_within_distance_seven_always_share_a_band():
+    rng = random.Random(0)
+    for _ in range(2000):
+        phash = rng.getrandbits(64)
+        flipped = phash
+        for bit in rng.sample(range(64), rng.randint(0, PHASH_BANDS - 1)):
+            flipped ^= 1 << bit
+        assert set(phash_bands(phash)) & set(phash_bands(flipped))
+    # Worst case: one bit flipped in each of seven bands still leaves the eighth intact
+    worst = 0
+    for band in range(PHASH_BANDS - 1):
+        worst ^= 1 << (8 * band)
+    assert set(phash_bands(0)) & set(phash_bands(worst)) == {"7:00"}
+    # Eight flips, one per band, can hide a match: hence max_distance is capped at 7
+    assert not set(phash_bands(0)) & set(phash_bands(worst | 1 << 56))
+
+
+def test_repository_finds_image_assets_by_band(repository):
+    async def scenario():
+        await repository.save_image_asset("a" * 64, {"phash": "00", "phash_bands": ["0:00", "1:00"]})
+        await repository.save_image_asset("b" * 64, {"phash": "ff", "phash_bands": ["0:ff", "1:00"]})
+        by_first = [asset_id for asset_id, _ in await repository.find_image_assets(["0:00"], limit=10)]
+        by_shared = sorted(asset_id for asset_id, _ in await repository.find_image_assets(["1:00", "5:5a"], limit=10))
+        none = await repository.find_image_assets(["2:00"], limit=10)
+        # Saving an asset again replaces its bands rather than adding to them
+        await repository.save_image_asset("a" * 64, {"phash": "01", "phash_bands": ["0:01", "1:01"]})
+        after_update = [asset_id for asset_id, _ in await repository.find_image_assets(["0:00"], limit=10)]
+        return by_first, by_shared, none, after_update
+
+    by_first, by_shared, none, after_update = asyncio.run(scenario())
+    assert by_first == ["a" * 64]
+    assert by_shared == ["a" * 64, "b" * 64]
+    assert none == []
+    assert after_update == []
@@ -0,0 +1,74 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.ai.clip_validator import ClipValidationBackend
+from app.services.ai.image_validator import ImageValidatorService, ValidationCandidate
+
+
+class ContextBackend:
+    """Stands in for the CLIP backend: passes an image only if its context mentions glaciers."""
+    name = "fake-clip"
+    context_key = ClipValidationBackend.context_key
+
+    def __init__(self):
+        self.scored = 0
+
+    async def validate(self, candidates):
+        self.scored += len(candidates)
+        return [(True, c.image_url) if "glacier" in c.text_context else (False, None) for c in candidates]
+
+
+def _clip_service() -> ImageValidatorService:
+    service = ImageValidatorService()
+    service.backend = ContextBackend()
+    return service
+
+
+def test_clip_verdicts_are_cached_per_context():
+    service = _clip_service()
+    url, query = "https://img.example/ice.jpg", "Ice field"
+    on_topic = ValidationCandidate(url, "A glacier is a river of ice. image - [Ice field] It moves slowly.", query)
+    off_topic = ValidationCandidate(url, "Our bakery menu. image - [Ice field] Try the cakes.", query)
+
+    async def scenario():
+        assert await service.validate_images([on_topic]) == [(True, url)]
+        # Same URL and query, different surroundings: not answered from the cache
+        assert await service.validate_images([off_topic]) == [(False, None)]
+        # Each is cached under its own context, the rejection included
+        assert await service.validate_images([on_topic, off_topic]) == [(True, url), (False, None)]
+    asyncio.run(scenario())
+    assert service.backend.scored == 2
+    assert service.negative_hits == 1
+
+
+def test_clip_context_key_ignores_case_and_whitespace():
+    backend = ContextBackend()
+    a = ValidationCandidate("u", "A glacier  is a river of ice. image - [Ice field]", "Ice field")
+    b = ValidationCandidate("u", "a glacier is a River of ice. image - [Ice field]", "Ice field")
+    c = ValidationCandidate("u", "A glacier is a lake of ice. image - [Ice field]", "Ice field")
+    assert backend.context_key(a) == backend.context_key(b) != backend.context_key(c)
+
+
+def test_duplicate_candidates_in_a_batch_are_validated_once():
+    service = _clip_service()
+    candidate = ValidationCandidate("https://img.example/a.jpg", "glacier text", "Ice")
+    assert asyncio.run(service.validate_images([candidate] * 3)) == [(True, candidate.image_url)] * 3
+    assert service.backend.scored == 1
+
+
+def _mock_verdicts(monkeypatch, seed: int, rejection_rate: float = 0.5) -> list:
+    monkeypatch.setattr(settings, "MOCK_RANDOM_SEED", seed)
+    monkeypatch.setattr(settings, "MOCK_VALIDATOR_REJECTION_RATE", rejection_rate)
+    monkeypatch.setattr(settings, "MOCK_VALIDATOR_PER_ITEM_SECONDS", 0)
+    service = ImageValidatorService()
+    service.latency.mean_seconds = 0
+    candidates = [ValidationCandidate(f"https://img.example/{i}.jpg", "text", f"query {i}") for i in range(40)]
+    return [valid for valid, _ in asyncio.run(service.validate_images(candidates))]
+
+
+def test_mock_rejections_are_reproducible_with_a_seed(monkeypatch):
+    first = _mock_verdicts(monkeypatch, seed=7)
+    assert first == _mock_verdicts(monkeypatch, seed=7)
+    assert first != _mock_verdicts(monkeypatch, seed=8)
+    assert 0 < first.count(False) < len(first)
+    assert all(_mock_verdicts(monkeypatch, seed=7, rejection_rate=0))
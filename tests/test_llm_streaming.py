@@ -0,0 +1,62 @@
+import asyncio
+
+from app.services.ai.llm import LLMService
+from app.services.ai.mock_latency import LatencyModel
+
+
+def _service() -> LLMService:
+    service = LLMService()
+    service.cache = None
+    service.latency = LatencyModel(0.05) # Spread over the ~15 chunks of the mock text
+    return service
+
+
+async def _collect(stream) -> str:
+    return "".join([chunk async for chunk in stream])
+
+
+def test_concurrent_streams_of_a_topic_share_one_upstream_call():
+    async def scenario():
+        service = _service()
+        owner = service.stream_text_with_image_cues("glacier")
+        first = await owner.__anext__() # The owner is registered once it has produced a chunk
+        joined, rest = await asyncio.gather(_collect(service.stream_text_with_image_cues("Glacier ")), _collect(owner))
+        assert joined == first + rest == LLMService._mock_text("glacier")
+        assert (service.upstream_calls, service.coalesced_streams) == (1, 1)
+    asyncio.run(scenario())
+
+
+def test_waiters_stream_themselves_when_the_owner_stops_early():
+    async def scenario():
+        service = _service()
+        owner = service.stream_text_with_image_cues("glacier")
+        await owner.__anext__()
+        waiter = asyncio.ensure_future(_collect(service.stream_text_with_image_cues("glacier")))
+        await asyncio.sleep(0.01) # The waiter is now waiting on the owner's stream
+        await owner.aclose() # E.g. the owning pipeline was cancelled
+
+        assert await waiter == LLMService._mock_text("glacier")
+        assert service.upstream_calls == 2
+        assert service.cache_stats()["in_flight"] == 0
+    asyncio.run(scenario())
+
+
+def test_bypass_cache_never_joins_a_stream_in_flight():
+    async def scenario():
+        service = _service()
+        owner = service.stream_text_with_image_cues("glacier")
+        first = await owner.__anext__()
+        fresh, rest = await asyncio.gather(
+            _collect(service.stream_text_with_image_cues("glacier", bypass_cache=True)), _collect(owner)
+        )
+        assert fresh == first + rest
+        assert (service.upstream_calls, service.coalesced_streams, service.bypassed) == (2, 0, 1)
+
+        # Same for the non-streaming call
+        calls = service.upstream_calls
+        await asyncio.gather(
+            service.generate_text_with_image_cues("moraine"),
+            service.generate_text_with_image_cues("moraine", bypass_cache=True),
+        )
+        assert service.upstream_calls == calls + 2
+    asyncio.run(scenario())
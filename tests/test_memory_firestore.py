@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.db.memory import DOCUMENT_ID, InMemoryNotFound, InMemoryQuery
+
+
+def test_set_get_update_delete(memory_client):
+    ref = memory_client.collection("users").document("u1").collection("notebooks").document("n1")
+    assert not ref.get().exists
+
+    ref.set({"status": "PENDING", "meta": {"a": 1, "b": 2}})
+    ref.update({"status": "COMPLETED", "meta.b": 3})
+    snapshot = ref.get()
+    assert snapshot.to_dict() == {"status": "COMPLETED", "meta": {"a": 1, "b": 3}}
+    assert snapshot.get("meta.b") == 3
+
+    ref.delete()
+    assert not ref.get().exists
+    with pytest.raises(InMemoryNotFound):
+        ref.update({"status": "FAILED"})
+
+
+def test_snapshots_are_copies(memory_client):
+    ref = memory_client.collection("tasks").document("t1")
+    data = {"tags": ["a"]}
+    ref.set(data)
+    data["tags"].append("b")
+    ref.get().to_dict()["tags"].append("c")
+    assert ref.get().to_dict() == {"tags": ["a"]}
+
+
+def test_batch_is_atomic(memory_client):
+    tasks = memory_client.collection("tasks")
+    batch = memory_client.batch()
+    batch.set(tasks.document("t1"), {"status": "PENDING"})
+    batch.update(tasks.document("missing"), {"status": "FAILED"})
+    assert len(batch) == 2
+    with pytest.raises(InMemoryNotFound):
+        batch.commit()
+    assert not tasks.document("t1").get().exists
+
+    batch = memory_client.batch()
+    batch.set(tasks.document("t1"), {"status": "PENDING"})
+    batch.update(tasks.document("t1"), {"status": "COMPLETED"}) # Sees the set queued before it
+    batch.commit()
+    assert tasks.document("t1").get().to_dict() == {"status": "COMPLETED"}
+    assert memory_client.stats["commits"] == 1
+
+
+def test_get_all_returns_a_snapshot_per_reference(memory_client):
+    tasks = memory_client.collection("tasks")
+    tasks.document("t1").set({"n": 1})
+    snapshots = list(memory_client.get_all([tasks.document("t1"), tasks.document("t2")]))
+    assert [(snapshot.id, snapshot.exists) for snapshot in snapshots] == [("t1", True), ("t2", False)]
+
+
+def _seed(memory_client):
+    tasks = memory_client.collection("tasks")
+    rows = [
+        ("a", {"user_id": "u1", "status": "DONE", "created_at": "2024-01-01", "size": 1}),
+        ("b", {"user_id": "u1", "status": "PENDING", "created_at": "2024-01-02", "size": 2}),
+        ("c", {"user_id": "u1", "status": "DONE", "created_at": "2024-01-02", "size": 3}),
+        ("d", {"user_id": "u2", "status": "DONE", "created_at": "2024-01-03", "size": 4}),
+        ("e", {"user_id": "u1", "status": "DONE"}), # No created_at: excluded when ordering by it
+    ]
+    for document_id, data in rows:
+        tasks.document(document_id).set(data)
+    # Documents in subcollections are not part of the collection.
+    tasks.document("a").collection("events").document("x").set({"user_id": "u1", "created_at": "2099-01-01"})
+    return tasks
+
+
+def test_query_filters_orders_and_breaks_ties_by_id(memory_client):
+    tasks = _seed(memory_client)
+    query = tasks.where("user_id", "==", "u1").order_by("created_at", InMemoryQuery.DESCENDING)
+    assert [snapshot.id for snapshot in query.stream()] == ["c", "b", "a"]
+
+    query = tasks.where("user_id", "==", "u1").where("status", "==", "DONE").order_by("created_at")
+    assert [snapshot.id for snapshot in query.stream()] == ["a", "c"]
+
+    query = tasks.where("created_at", ">=", "2024-01-02").where("created_at", "<", "2024-01-03")
+    assert sorted(snapshot.id for snapshot in query.stream()) == ["b", "c"]
+
+    query = tasks.where("status", "in", ["PENDING"])
+    assert [snapshot.id for snapshot in query.get()] == ["b"]
+
+    with pytest.raises(ValueError):
+        tasks.where("status", "~", "x")
+
+
+def test_query_cursor_limit_and_projection(memory_client):
+    tasks = _seed(memory_client)
+    query = (
+        tasks.where("user_id", "==", "u1")
+        .order_by("created_at", InMemoryQuery.DESCENDING)
+        .order_by(DOCUMENT_ID, InMemoryQuery.DESCENDING)
+        .select(["status"])
+    )
+    first = list(query.limit(2).stream())
+    assert [(snapshot.id, snapshot.to_dict()) for snapshot in first] == [("c", {"status": "DONE"}), ("b", {"status": "PENDING"})]
+
+    # A dict cursor (as the repository passes it) and a snapshot cursor resume at the same place.
+    rest = query.start_after({"created_at": "2024-01-02", DOCUMENT_ID: "b"}).stream()
+    assert [snapshot.id for snapshot in rest] == ["a"]
+    full_snapshot = tasks.document("b").get()
+    assert [snapshot.id for snapshot in query.start_after(full_snapshot).stream()] == ["a"]
+
+
+def test_query_reads_are_counted(memory_client):
+    tasks = _seed(memory_client)
+    reads = memory_client.stats["reads"]
+    assert list(tasks.where("user_id", "==", "nobody").stream()) == []
+    assert memory_client.stats["reads"] == reads + 1 # An empty result is billed as one read
+    list(tasks.where("user_id", "==", "u1").limit(2).stream())
+    assert memory_client.stats["reads"] == reads + 3
+
+    memory_client.reset()
+    assert memory_client.stats["reads"] == 0 and not tasks.document("a").get().exists
+
+
+def test_async_layer_runs_calls_off_the_event_loop(async_db):
+    async def scenario():
+        ref = async_db.task_ref("t1")
+        assert await async_db.get(ref) is None
+        await async_db.set(ref, {"status": "PENDING"})
+        await async_db.update(ref, {"status": "COMPLETED"})
+        assert await async_db.get(ref) == {"status": "COMPLETED"}
+        found = await async_db.get_all([ref, async_db.task_ref("t2")])
+        assert found == {"t1": {"status": "COMPLETED"}}
+
+        # Many concurrent calls complete, bounded by the pool
+        await asyncio.gather(*(async_db.set(async_db.task_ref(f"x{i}"), {"i": i}) for i in range(50)))
+        assert len(await async_db.get_all(async_db.task_ref(f"x{i}") for i in range(50))) == 50
+    asyncio.run(scenario())
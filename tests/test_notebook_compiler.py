@@ -0,0 +1,69 @@
+import pytest
+
+from app.models.notebook import ImageRequest
+from app.services.notebook_compiler import FailedImagePolicy, compile_markdown, compile_notebook, render_html
+from app.services.placeholder_parser import extract_placeholders
+
+TEXT = "Ice <caves>. image - [A glacier]\n\nMelt & flow. image - [Fail & retry]"
+RESULTS = [
+    ImageRequest(query="A glacier", status="VALIDATED", validated_image_url="https://img.example/g.jpg?a=1&b=2"),
+    {"query": "Fail & retry", "status": "FAILED", "error_message": "No images found by scraper"},
+]
+
+MARKDOWN = {
+    FailedImagePolicy.DROP: "Ice <caves>. ![A glacier](https://img.example/g.jpg?a=1&b=2)\n\nMelt & flow. ",
+    FailedImagePolicy.NOTE: "Ice <caves>. ![A glacier](https://img.example/g.jpg?a=1&b=2)\n\nMelt & flow. [Image not available: Fail & retry]",
+    FailedImagePolicy.KEEP_PLACEHOLDER: "Ice <caves>. ![A glacier](https://img.example/g.jpg?a=1&b=2)\n\nMelt & flow. image - [Fail & retry]",
+}
+IMG = '<img src="https://img.example/g.jpg?a=1&amp;b=2" alt="A glacier" loading="lazy">'
+HTML = {
+    FailedImagePolicy.DROP: f"<p>Ice &lt;caves&gt;. {IMG}</p>\n<p>Melt &amp; flow.</p>",
+    FailedImagePolicy.NOTE: (
+        f"<p>Ice &lt;caves&gt;. {IMG}</p>\n"
+        '<p>Melt &amp; flow. <span class="image-unavailable">[Image not available: Fail &amp; retry]</span></p>'
+    ),
+    FailedImagePolicy.KEEP_PLACEHOLDER: f"<p>Ice &lt;caves&gt;. {IMG}</p>\n<p>Melt &amp; flow. image - [Fail &amp; retry]</p>",
+}
+
+
+@pytest.mark.parametrize("policy", list(FailedImagePolicy))
+def test_failed_image_policies(policy):
+    placeholders = extract_placeholders(TEXT)
+    assert compile_markdown(TEXT, placeholders, RESULTS, policy) == MARKDOWN[policy]
+    assert render_html(TEXT, placeholders, RESULTS, policy) == HTML[policy]
+    assert compile_notebook(TEXT, placeholders, RESULTS, policy, with_html=True) == (MARKDOWN[policy], HTML[policy])
+
+
+def test_placeholders_without_a_result_count_as_failed():
+    placeholders = extract_placeholders(TEXT)
+    assert compile_markdown(TEXT, placeholders, RESULTS[:1], FailedImagePolicy.DROP) == MARKDOWN[FailedImagePolicy.DROP]
+    fetched_only = [ImageRequest(query="A glacier", status="FETCHED", original_url="https://img.example/raw.jpg")]
+    assert compile_markdown(TEXT, placeholders, fetched_only, FailedImagePolicy.DROP) == "Ice <caves>. \n\nMelt & flow. "
+
+
+def test_duplicate_queries_are_matched_by_position():
+    text = "image - [Ice] then image - [Ice]"
+    results = [
+        {"query": "Ice", "status": "VALIDATED", "validated_image_url": "https://img.example/1.jpg"},
+        {"query": "Ice", "status": "VALIDATED", "validated_image_url": "https://img.example/2.jpg"},
+    ]
+    markdown = compile_markdown(text, extract_placeholders(text), results)
+    assert markdown == "![Ice](https://img.example/1.jpg) then ![Ice](https://img.example/2.jpg)"
+
+
+class FakeVariants:
+    def picture_html(self, asset_id, width, height, alt):
+        return f"<picture data-asset={asset_id} data-size={width}x{height}>{alt}</picture>"
+
+
+def test_stored_images_become_picture_elements_with_variants():
+    text = "image - [Stored] image - [Remote]"
+    results = [
+        {"query": "Stored", "status": "VALIDATED", "validated_image_url": "/images/abc/640.webp", "asset_id": "abc", "width": 1200, "height": 800},
+        {"query": "Remote", "status": "VALIDATED", "validated_image_url": "https://img.example/r.jpg"},
+    ]
+    rendered = render_html(text, extract_placeholders(text), results, variants=FakeVariants())
+    assert rendered == (
+        '<p><picture data-asset=abc data-size=1200x800>Stored</picture> '
+        '<img src="https://img.example/r.jpg" alt="Remote" loading="lazy"></p>'
+    )
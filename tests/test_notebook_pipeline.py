@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.background import notebook_tasks
+from app.background.scheduler import start_scheduler, stop_scheduler
+from app.core.events import close_event_bus
+from app.db import repository as repository_module
+from app.services.placeholder_parser import Placeholder
+
+
+@pytest.fixture
+def pipeline_repository(repository, monkeypatch):
+    monkeypatch.setattr(repository_module, "repository", repository)
+
+    async def seed():
+        batch = repository.batch()
+        batch.create_notebook("u1", "n1", {"status": "PENDING", "topic_input": "glaciers"})
+        batch.create_task("t1", {"user_id": "u1", "status": "PENDING"})
+        await batch.commit()
+    asyncio.run(seed())
+    return repository
+
+
+def test_cancelled_pipeline_starts_no_image_work_from_a_late_llm_job(pipeline_repository, monkeypatch):
+    image_queries = []
+
+    async def process_image_query(query, *args, **kwargs):
+        image_queries.append(query)
+
+    async def stubborn_llm_job(topic, bypass_cache, on_placeholder):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            pass # E.g. stuck in an upstream call that doesn't honour cancellation
+        on_placeholder(Placeholder(0, "Ice", 0, 13), "image - [Ice]")
+        finished.set()
+        return "image - [Ice]"
+
+    monkeypatch.setattr(notebook_tasks, "process_image_query", process_image_query)
+    monkeypatch.setattr(notebook_tasks, "stream_llm_text", stubborn_llm_job)
+
+    async def scenario():
+        scheduler = start_scheduler()
+        try:
+            pipeline = scheduler.submit_pipeline(notebook_tasks.generate_notebook_content_task, "t1", "u1", "n1", "glaciers")
+            await asyncio.wait_for(started.wait(), 5)
+            pipeline.cancel()
+            await asyncio.gather(pipeline, return_exceptions=True)
+            await asyncio.wait_for(finished.wait(), 5)
+            await asyncio.sleep(0.01)
+        finally:
+            await stop_scheduler()
+            await close_event_bus()
+
+    started, finished = asyncio.Event(), asyncio.Event()
+    asyncio.run(scenario())
+    assert image_queries == []
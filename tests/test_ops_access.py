@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+
+
+@pytest.fixture
+def client() -> TestClient:
+    # Not entered as a context manager, so the lifespan (Firestore, scheduler, ...) never starts.
+    return TestClient(app)
+
+
+def test_ops_endpoints_are_hidden_by_default(client, monkeypatch):
+    monkeypatch.setattr(settings, "OPS_ENDPOINTS_ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+    assert client.get(settings.API_V1_STR + "/system/scheduler").status_code == 404
+
+
+def test_ops_endpoints_need_the_metrics_token_if_set(client, monkeypatch):
+    monkeypatch.setattr(settings, "OPS_ENDPOINTS_ENABLED", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    assert client.get(settings.API_V1_STR + "/system/scheduler").json() == {}
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "mineshear_" in response.text
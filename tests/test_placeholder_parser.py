@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from app.services.placeholder_parser import IncrementalPlaceholderParser, Placeholder, extract_placeholders
+
+# Fragments that exercise the tricky parts: the prefix split anywhere, nested or repeated
+# prefixes, empty queries, newlines inside an open placeholder and stray brackets.
+FRAGMENTS = ["image - [", "image - ", "ima", "ge - [", "[", "]", "\n", "Mountain", " at dusk", "x", "image", " - ", "- ["]
+
+
+def _parse_in_chunks(text: str, sizes) -> tuple:
+    parser = IncrementalPlaceholderParser()
+    streamed, position = [], 0
+    for size in sizes:
+        streamed += parser.feed(text[position:position + size])
+        position += size
+    streamed += parser.feed(text[position:])
+    return streamed, parser.close(), parser.placeholders
+
+
+def test_placeholder_split_across_chunks():
+    text = "Intro. image - [A glacier] and image - [An iceberg]\nEnd."
+    expected = extract_placeholders(text)
+    assert [p.query for p in expected] == ["A glacier", "An iceberg"]
+    for split in range(1, len(text)):
+        streamed, full, _ = _parse_in_chunks(text, [split])
+        assert streamed == expected and full == text
+
+
+def test_placeholders_are_reported_when_their_bracket_arrives():
+    parser = IncrementalPlaceholderParser()
+    assert parser.feed("Text image - [A gla") == []
+    assert parser.feed("cier") == []
+    assert parser.feed("] more") == [Placeholder(0, "A glacier", 5, 24)]
+    assert parser.feed("") == []
+
+
+def test_newline_ends_an_open_placeholder_and_unterminated_ones_stay_text():
+    text = "image - [broken\nimage - [ok] tail image - [never closed"
+    streamed, full, _ = _parse_in_chunks(text, [3, 9, 4, 11])
+    assert [p.query for p in streamed] == ["ok"] == [p.query for p in extract_placeholders(text)]
+    assert full == text
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_extract_placeholders_for_random_texts_and_chunkings(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 80)))
+    sizes = [rng.randint(0, 12) for _ in range(rng.randint(0, 40))]
+    streamed, full, placeholders = _parse_in_chunks(text, sizes)
+    expected = extract_placeholders(text)
+    assert streamed == placeholders == expected
+    assert full == text
+    for placeholder in expected:
+        assert text[placeholder.start:placeholder.end] == f"image - [{placeholder.query}]"
@@ -0,0 +1,50 @@
+import asyncio
+
+from app.core.racing import race_candidates
+
+
+def _race(attempt, candidates, **kwargs):
+    return asyncio.run(race_candidates(candidates, attempt, accept=bool, **kwargs))
+
+
+def test_first_accepted_candidate_wins_and_slower_ones_are_cancelled():
+    async def attempt(delay):
+        await asyncio.sleep(delay)
+        return delay
+    outcome = _race(attempt, [0.5, 0.01, 0.5])
+    assert (outcome.winner, outcome.result) == (1, 0.01)
+    assert (outcome.started, outcome.rejected, outcome.cancelled) == (3, 0, 2)
+
+
+def test_rejections_errors_and_outside_cancellation_move_on_to_the_next_candidate():
+    async def attempt(candidate):
+        await asyncio.sleep(0)
+        if candidate == "cancelled":
+            asyncio.current_task().cancel() # E.g. a shared batch call was cancelled
+            await asyncio.sleep(1)
+        if candidate == "error":
+            raise ValueError("unreachable")
+        return candidate if candidate != "rejected" else None
+    outcome = _race(attempt, ["cancelled", "error", "rejected", "ok"], hedge_delay=10)
+    assert (outcome.winner, outcome.result) == (3, "ok")
+    assert (outcome.started, outcome.rejected, outcome.cancelled) == (4, 3, 0)
+    assert [str(error) for error in outcome.errors] == ["unreachable"]
+
+
+def test_attempts_finishing_with_the_winner_are_not_counted_as_cancelled():
+    async def attempt(candidate):
+        await asyncio.sleep(0)
+        return candidate
+    outcome = _race(attempt, ["", "a", "b"])
+    assert (outcome.winner, outcome.result) == (1, "a") # The lowest accepted index
+    assert (outcome.started, outcome.rejected, outcome.cancelled) == (3, 1, 0)
+    assert outcome.unused == 1 # "b" was accepted too, but only one candidate is used
+
+
+def test_budget_cancels_everything_still_running():
+    async def attempt(delay):
+        await asyncio.sleep(delay)
+        return delay
+    outcome = _race(attempt, [1, 1], budget=0.05)
+    assert outcome.timed_out and outcome.winner is None
+    assert outcome.cancelled == 2
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.db.memory import InMemoryNotFound
+from app.db.repository import DocumentNotFound
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _task(user_id: str, created_at: str, **fields) -> dict:
+    return {"user_id": user_id, "status": "PENDING", "tool_type": "notebook_generator", "created_at": created_at, **fields}
+
+
+def test_create_update_and_delete(repository):
+    async def scenario():
+        batch = repository.batch()
+        batch.create_notebook("u1", "n1", {"status": "PENDING", "created_at": "2024-01-01T00:00:00", "meta": {"a": 1, "b": 2}})
+        batch.create_task("t1", _task("u1", "2024-01-01T00:00:00"))
+        batch.create_batch("b1", {"user_id": "u1", "created_at": "2024-01-01T00:00:00", "items": []})
+        assert len(batch) == 3
+        await batch.commit()
+
+        batch = repository.batch()
+        batch.update_notebook("u1", "n1", {"status": "COMPLETED", "meta.b": 3})
+        batch.update_task("t1", {"status": "COMPLETED"})
+        await batch.commit()
+        assert await repository.get_notebook("u1", "n1") == {
+            "status": "COMPLETED", "created_at": "2024-01-01T00:00:00", "meta": {"a": 1, "b": 3},
+        }
+        assert (await repository.get_task("t1"))["status"] == "COMPLETED"
+        assert (await repository.get_batch("b1"))["items"] == []
+        assert await repository.get_notebook("u2", "n1") is None # Notebooks live under their user
+
+        batch = repository.batch()
+        batch.delete_notebook("u1", "n1")
+        batch.delete_task("t1")
+        await batch.commit()
+        assert await repository.get_notebook("u1", "n1") is None
+        assert await repository.get_task("t1") is None
+    _run(scenario())
+
+
+def test_batch_is_all_or_nothing(repository):
+    async def scenario():
+        batch = repository.batch()
+        batch.create_task("t1", _task("u1", "2024-01-01T00:00:00"))
+        batch.update_task("missing", {"status": "FAILED"})
+        # The SQLite backend raises DocumentNotFound, Firestore (and its fake) their own NotFound.
+        with pytest.raises((DocumentNotFound, InMemoryNotFound)):
+            await batch.commit()
+        assert await repository.get_task("t1") is None
+    _run(scenario())
+
+
+def test_notebook_content_chunks_shrink_with_the_body(repository):
+    async def scenario():
+        batch = repository.batch()
+        batch.create_notebook("u1", "n1", {"status": "PENDING"})
+        batch.set_notebook_content("u1", "n1", [b"aaa", b"bbb", b"ccc"])
+        await batch.commit()
+        assert await repository.get_notebook_content("u1", "n1", 3) == [b"aaa", b"bbb", b"ccc"]
+
+        batch = repository.batch()
+        batch.set_notebook_content("u1", "n1", [b"short"], previous_chunks=3)
+        await batch.commit()
+        assert await repository.get_notebook_content("u1", "n1", 3) == [b"short", b"", b""]
+    _run(scenario())
+
+
+def test_get_tasks_returns_only_existing_tasks(repository):
+    async def scenario():
+        batch = repository.batch()
+        for task_id in ("t1", "t2"):
+            batch.create_task(task_id, _task("u1", "2024-01-01T00:00:00"))
+        await batch.commit()
+        found = await repository.get_tasks(["t1", "t2", "t3"])
+        assert sorted(found) == ["t1", "t2"]
+        assert await repository.get_tasks([]) == {}
+    _run(scenario())
+
+
+def _seed_tasks(repository):
+    async def seed():
+        batch = repository.batch()
+        batch.create_task("a", _task("u1", "2024-01-01T00:00:00", status="COMPLETED"))
+        batch.create_task("b", _task("u1", "2024-01-02T00:00:00"))
+        batch.create_task("c", _task("u1", "2024-01-02T00:00:00", status="COMPLETED"))
+        batch.create_task("d", _task("u1", "2024-01-03T00:00:00", tool_type="story_book_generator"))
+        batch.create_task("e", _task("u2", "2024-01-04T00:00:00"))
+        await batch.commit()
+    _run(seed())
+
+
+def test_list_tasks_pages_newest_first_with_id_tiebreaks(repository):
+    _seed_tasks(repository)
+
+    async def scenario():
+        first = await repository.list_tasks("u1", {}, ["status"], limit=2)
+        assert first == [("d", {"status": "PENDING"}), ("c", {"status": "COMPLETED"})]
+        # Resume after (created_at, id) of the last row; "b" shares c's created_at
+        rest = await repository.list_tasks("u1", {}, ["status"], limit=10, start_after=("2024-01-02T00:00:00", "c"))
+        assert [row_id for row_id, _ in rest] == ["b", "a"]
+    _run(scenario())
+
+
+def test_list_tasks_filters_and_projects(repository):
+    _seed_tasks(repository)
+
+    async def scenario():
+        rows = await repository.list_tasks("u1", {"status": "COMPLETED"}, ["status", "created_at"], limit=10)
+        assert rows == [("c", {"status": "COMPLETED", "created_at": "2024-01-02T00:00:00"}), ("a", {"status": "COMPLETED", "created_at": "2024-01-01T00:00:00"})]
+        rows = await repository.list_tasks("u1", {"tool_type": "story_book_generator"}, ["tool_type"], limit=10)
+        assert [row_id for row_id, _ in rows] == ["d"]
+        rows = await repository.list_tasks(
+            "u1", {}, [], limit=10, created_after="2024-01-02T00:00:00", created_before="2024-01-03T00:00:00"
+        )
+        assert [row_id for row_id, _ in rows] == ["c", "b"]
+    _run(scenario())
+
+
+def test_list_notebooks_is_per_user(repository):
+    async def scenario():
+        batch = repository.batch()
+        batch.create_notebook("u1", "n1", {"status": "COMPLETED", "created_at": "2024-01-01T00:00:00", "topic_input": "ice"})
+        batch.create_notebook("u1", "n2", {"status": "PENDING", "created_at": "2024-01-02T00:00:00", "topic_input": "fire"})
+        batch.create_notebook("u2", "n3", {"status": "COMPLETED", "created_at": "2024-01-03T00:00:00", "topic_input": "air"})
+        await batch.commit()
+        rows = await repository.list_notebooks("u1", {}, ["topic_input"], limit=10)
+        assert rows == [("n2", {"topic_input": "fire"}), ("n1", {"topic_input": "ice"})]
+        rows = await repository.list_notebooks("u1", {"status": "COMPLETED"}, ["status"], limit=10)
+        assert rows == [("n1", {"status": "COMPLETED"})]
+    _run(scenario())
+
+
+def test_image_assets_and_sources(repository):
+    async def scenario():
+        await repository.save_image_asset("x1", {"width": 640, "phash_bands": ["0:aa", "1:bb"]})
+        await repository.save_image_asset("x2", {"width": 320, "phash_bands": ["0:cc", "1:bb"]})
+        await repository.save_image_asset("x3", {"width": 100, "phash_bands": ["0:dd", "1:ee"]})
+        assert (await repository.get_image_asset("x1"))["width"] == 640
+        assert await repository.get_image_asset("missing") is None
+
+        found = await repository.find_image_assets(["0:aa", "1:bb"], limit=10)
+        assert sorted(asset_id for asset_id, _ in found) == ["x1", "x2"]
+        assert len(await repository.find_image_assets(["1:bb"], limit=1)) == 1
+
+        await repository.save_image_source("s1", {"asset_id": "x1", "url": "https://img.example/a.jpg"})
+        assert (await repository.get_image_source("s1"))["asset_id"] == "x1"
+        assert await repository.get_image_source("s2") is None
+    _run(scenario())
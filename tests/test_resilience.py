@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import resilience
+from app.core.resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientClient,
+    RetryableError,
+    UpstreamTimeout,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    # Only for the synchronous breaker/limiter logic: asyncio's own timers read time.monotonic() too.
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def _client(**kwargs) -> ResilientClient:
+    options = {"timeout_seconds": 1.0, "max_attempts": 3, "retry_base_delay": 0}
+    return ResilientClient("test-upstream", **{**options, **kwargs})
+
+
+class FlakyUpstream:
+    """Fails with the given errors, in order, then answers "ok"."""
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self) -> str:
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_breaker_opens_after_the_threshold_and_closes_after_a_successful_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_seconds=30)
+    for _ in range(2):
+        breaker.before_call("up")
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before_call("up")
+    assert info.value.retry_after == pytest.approx(20)
+
+    clock.now += 20 # Cool-down over: the next call is a probe
+    breaker.before_call("up")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure() # A failed probe reopens at once, whatever the threshold
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+    clock.now += 30
+    breaker.before_call("up")
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_half_open_breaker_lets_only_a_few_probes_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=5, half_open_max_calls=2)
+    breaker.record_failure()
+    clock.now += 5
+    breaker.before_call("up")
+    breaker.before_call("up")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("up")
+    breaker.release_probe() # A probe ended without a verdict: its slot goes to the next caller
+    breaker.before_call("up")
+    assert breaker.probes_in_flight == 2
+
+
+def test_retryable_errors_are_retried_until_the_upstream_answers():
+    client = _client()
+    upstream = FlakyUpstream(RetryableError("503"), ConnectionError("reset"))
+    assert asyncio.run(client.call(upstream)) == "ok"
+    assert upstream.attempts == 3
+    assert client.retries == 2
+    assert client.breaker.consecutive_failures == 0
+
+
+def test_non_retryable_errors_fail_at_once_and_leave_the_breaker_alone():
+    client = _client()
+    upstream = FlakyUpstream(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        asyncio.run(client.call(upstream))
+    assert upstream.attempts == 1
+    assert client.retries == 0
+    assert client.breaker.consecutive_failures == 0
+
+
+def test_retries_stop_after_max_attempts():
+    client = _client(max_attempts=2)
+    upstream = FlakyUpstream(*[RetryableError("503")] * 5)
+    with pytest.raises(RetryableError):
+        asyncio.run(client.call(upstream))
+    assert upstream.attempts == 2
+    assert client.failures == 2
+
+
+def test_retry_delays_are_full_jitter_up_to_the_capped_exponential(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: bounds.append((low, high)) or 0.0)
+    client = _client(retry_base_delay=0.5, retry_max_delay=3.0)
+    for attempt in range(1, 6):
+        client._backoff(attempt)
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 3.0), (0, 3.0)]
+
+
+def test_limiter_backs_off_on_high_latency_at_most_once_per_smoothed_latency(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial=10, tolerance=2.0, backoff=0.5, min_baseline=0.01)
+
+    def finish(latency: float):
+        asyncio.run(limiter.acquire())
+        limiter.release(latency)
+
+    finish(0.1) # Sets the baseline
+    assert limiter.limit == 10
+    finish(1.0) # Smoothed latency 0.28 > 2 x 0.1
+    assert limiter.limit == 5
+    finish(1.0) # Still slow, but this window was already punished
+    assert limiter.limit == 5
+    clock.now += 1
+    finish(1.0)
+    assert limiter.limit == 2.5
+
+
+def test_limiter_grows_only_while_its_limit_is_in_use(clock):
+    limiter = AdaptiveConcurrencyLimiter(initial=4, min_baseline=0.01)
+    asyncio.run(limiter.acquire())
+    limiter.release(0.1) # One call in flight out of four: no evidence more would help
+    assert limiter.limit == 4
+    asyncio.run(limiter.acquire())
+    asyncio.run(limiter.acquire())
+    limiter.release(0.1)
+    assert limiter.limit == 4.25
+
+
+def test_timeouts_shrink_the_concurrency_limit():
+    client = _client(timeout_seconds=0.01, max_attempts=1, limiter=AdaptiveConcurrencyLimiter(initial=10, backoff=0.5))
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(client.call(hang))
+    assert client.timeouts == 1
+    assert client.limiter.limit == 5
+    assert client.limiter.in_flight == 0
+
+
+def _consume(client: ResilientClient, make_stream):
+    async def scenario():
+        items = []
+        try:
+            async for item in client.stream(make_stream):
+                items.append(item)
+        except RetryableError as e:
+            return items, e
+        return items, None
+    return asyncio.run(scenario())
+
+
+def test_stream_retries_a_failure_before_the_first_item():
+    attempts = []
+
+    async def make_stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RetryableError("503")
+        yield "a"
+        yield "b"
+
+    client = _client()
+    assert _consume(client, make_stream) == (["a", "b"], None)
+    assert len(attempts) == 2
+    assert client.retries == 1
+
+
+def test_stream_is_not_retried_once_an_item_was_passed_on():
+    attempts = []
+
+    async def make_stream():
+        attempts.append(1)
+        yield "a"
+        raise RetryableError("connection dropped")
+
+    client = _client()
+    items, error = _consume(client, make_stream)
+    assert items == ["a"] # A retry would repeat what the caller has already seen
+    assert isinstance(error, RetryableError)
+    assert len(attempts) == 1
+    assert client.retries == 0
+    assert client.breaker.consecutive_failures == 1
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.api.v1.endpoints import system
+from app.background import scheduler as scheduler_module
+from app.background.scheduler import Stage, StageScheduler, current_scheduler, start_scheduler, stop_scheduler
+
+
+def test_scheduler_stats_never_start_a_scheduler():
+    async def scenario():
+        assert current_scheduler() is None
+        assert await system.get_scheduler_stats() == {}
+        assert scheduler_module.scheduler is None
+
+        started = start_scheduler()
+        assert current_scheduler() is started
+        assert await started.run(Stage.ASSEMBLE, asyncio.sleep, 0, result="done") == "done"
+        assert "assemble" in (await system.get_scheduler_stats())["stages"]
+
+        await stop_scheduler()
+        assert current_scheduler() is None
+        assert await system.get_scheduler_stats() == {}
+    asyncio.run(scenario())
+
+
+def test_a_job_raising_cancelled_error_does_not_take_its_worker_down():
+    async def scenario():
+        scheduler = StageScheduler({Stage.ASSEMBLE: 1})
+        scheduler.start()
+
+        async def broken():
+            raise asyncio.CancelledError()
+        with pytest.raises(asyncio.CancelledError):
+            await scheduler.run(Stage.ASSEMBLE, broken)
+        # The only worker is still there to run the next job
+        assert await asyncio.wait_for(scheduler.run(Stage.ASSEMBLE, asyncio.sleep, 0, result="ok"), 1) == "ok"
+        assert scheduler.stats()["stages"]["assemble"]["failed"] == 1
+        await scheduler.stop()
+    asyncio.run(scenario())
+
+
+def test_cancelling_the_caller_cancels_the_running_job():
+    async def scenario():
+        scheduler = StageScheduler({Stage.LLM: 1})
+        scheduler.start()
+        started, stopped = asyncio.Event(), asyncio.Event()
+
+        async def long_job():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            finally:
+                stopped.set()
+        caller = asyncio.ensure_future(scheduler.run(Stage.LLM, long_job))
+        await started.wait()
+        caller.cancel()
+        await asyncio.wait_for(stopped.wait(), 1)
+        assert await scheduler.run(Stage.LLM, asyncio.sleep, 0, result="next") == "next"
+        await scheduler.stop()
+    asyncio.run(scenario())
@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.core import http_clients, security
+from app.core.security import FirebaseTokenVerifier, InvalidTokenError, PublicKeyCache
+
+PROJECT = "demo-project"
+
+
+def _key_and_certificate():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+KEY, CERTIFICATE = _key_and_certificate()
+
+
+def _token(kid: str = "k1", **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "aud": PROJECT,
+        "iss": f"https://securetoken.google.com/{PROJECT}",
+        "sub": "user-1",
+        "iat": now,
+        "exp": now + 3600,
+        "email": "user@example.com",
+        **overrides,
+    }
+    return jwt.encode(claims, KEY, algorithm="RS256", headers={"kid": kid})
+
+
+class FakeFetcher:
+    def __init__(self, max_age: float = 3600):
+        self.max_age = max_age
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"k1": CERTIFICATE}, self.max_age
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+def _verifier(fetcher: FakeFetcher, min_refresh_interval: float = 30) -> FirebaseTokenVerifier:
+    return FirebaseTokenVerifier(PROJECT, key_cache=PublicKeyCache(fetcher, min_refresh_interval=min_refresh_interval))
+
+
+def _rejected(verifier: FirebaseTokenVerifier, token: str) -> str:
+    with pytest.raises(InvalidTokenError) as info:
+        asyncio.run(verifier.verify(token))
+    return str(info.value)
+
+
+def test_valid_token_is_verified_once_then_served_from_the_cache(monkeypatch):
+    verifier = _verifier(FakeFetcher())
+    token = _token()
+    claims = asyncio.run(verifier.verify(token))
+    assert (claims["uid"], claims["email"]) == ("user-1", "user@example.com")
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("a cached token must not be verified again")
+    monkeypatch.setattr(jwt, "decode", no_decode)
+    assert asyncio.run(verifier.verify(token)) == claims
+    assert verifier.stats()["tokens"]["hits"] == 1
+
+
+def test_wrong_audience_issuer_or_expired_tokens_are_rejected():
+    verifier = _verifier(FakeFetcher())
+    assert "audience" in _rejected(verifier, _token(aud="another-project")).lower()
+    assert "issuer" in _rejected(verifier, _token(iss="https://securetoken.google.com/another-project")).lower()
+    assert "expired" in _rejected(verifier, _token(iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)).lower()
+    _rejected(verifier, _token(sub=""))
+    _rejected(verifier, "not-a-jwt")
+
+
+def test_unknown_key_ids_refresh_the_keys_at_most_once_per_interval(clock):
+    fetcher = FakeFetcher()
+    verifier = _verifier(fetcher, min_refresh_interval=30)
+    asyncio.run(verifier.verify(_token()))
+    assert fetcher.calls == 1
+
+    # A key ID that isn't in the cached set triggers one refresh, in case Google rotated the keys...
+    clock.now += 60
+    assert "Unknown signing key ID" in _rejected(verifier, _token(kid="forged"))
+    assert fetcher.calls == 2
+    # ...but forged key IDs can't force a fetch per request.
+    for _ in range(5):
+        _rejected(verifier, _token(kid="forged"))
+    assert fetcher.calls == 2
+    clock.now += 30
+    _rejected(verifier, _token(kid="forged"))
+    assert fetcher.calls == 3
+
+    # The cached set is also refreshed once it expires.
+    clock.now += 3600
+    asyncio.run(verifier.verify(_token(sub="user-2")))
+    assert fetcher.calls == verifier.key_cache.refreshes == 4
+
+
+def test_certificates_are_fetched_through_the_pooled_client(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        return httpx.Response(200, json={"k1": CERTIFICATE}, headers={"Cache-Control": "public, max-age=19000"})
+
+    async def scenario():
+        registry = http_clients.start_http_clients(transports={"firebase-auth": httpx.MockTransport(handler)})
+        try:
+            assert await security.fetch_google_certificates() == ({"k1": CERTIFICATE}, 19000.0)
+            assert registry.stats()["firebase-auth"]["requests"] == 1
+        finally:
+            await http_clients.close_http_clients()
+    asyncio.run(scenario())
+    assert requests == [security.GOOGLE_CERTS_URL]
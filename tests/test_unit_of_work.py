@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.db.notebook_content import decode_content
+from app.db.unit_of_work import NotebookTaskUnitOfWork
+from app.models.notebook import NotebookStatus
+from app.models.task import TaskStatus
+
+
+def _seed(repository, task: bool = True):
+    async def seed():
+        batch = repository.batch()
+        batch.create_notebook("u1", "n1", {"status": "PENDING", "topic_input": "glaciers"})
+        if task:
+            batch.create_task("t1", {"user_id": "u1", "status": "PENDING"})
+        await batch.commit()
+    asyncio.run(seed())
+
+
+async def _stored_content(repository) -> dict:
+    descriptor = (await repository.get_notebook("u1", "n1"))["content"]
+    return decode_content(descriptor, await repository.get_notebook_content("u1", "n1", descriptor["chunks"]))
+
+
+def test_flush_writes_notebook_task_and_content_together(repository):
+    _seed(repository)
+
+    async def scenario():
+        uow = NotebookTaskUnitOfWork(repository, "u1", "n1", "t1", milestones_only=False)
+        assert not await uow.flush() # Nothing to write
+        uow.set_status(NotebookStatus.PROCESSING_TEXT, TaskStatus.PROCESSING)
+        uow.update_notebook(llm_generated_text_with_placeholders="Ice. image - [Glacier]")
+        assert await uow.flush()
+        assert not uow.is_dirty and uow.flush_count == 1
+
+        notebook = await repository.get_notebook("u1", "n1")
+        assert notebook["status"] == "PROCESSING_TEXT" and "updated_at" in notebook
+        assert "llm_generated_text_with_placeholders" not in notebook # The body is in the content chunks
+        assert (await repository.get_task("t1"))["status"] == "PROCESSING"
+        assert await _stored_content(repository) == {"llm_generated_text_with_placeholders": "Ice. image - [Glacier]"}
+
+        # Later body changes are merged into the body written before
+        uow.update_notebook(final_content="Ice. ![Glacier](https://img.example/g.jpg)")
+        assert await uow.flush(milestone=True)
+        assert await _stored_content(repository) == {
+            "llm_generated_text_with_placeholders": "Ice. image - [Glacier]",
+            "final_content": "Ice. ![Glacier](https://img.example/g.jpg)",
+        }
+    asyncio.run(scenario())
+
+
+def test_rewritten_body_drops_chunks_it_no_longer_needs(repository, monkeypatch):
+    monkeypatch.setattr(settings, "NOTEBOOK_CONTENT_CODEC", "identity")
+    monkeypatch.setattr(settings, "NOTEBOOK_CONTENT_CHUNK_BYTES", 16)
+    _seed(repository)
+
+    async def scenario():
+        uow = NotebookTaskUnitOfWork(repository, "u1", "n1", "t1", milestones_only=False)
+        uow.update_notebook(final_content="x" * 100)
+        await uow.flush()
+        chunks = (await repository.get_notebook("u1", "n1"))["content"]["chunks"]
+        assert chunks > 2
+
+        uow.update_notebook(final_content="")
+        await uow.flush()
+        assert (await repository.get_notebook("u1", "n1"))["content"]["chunks"] == 2
+        stored = await repository.get_notebook_content("u1", "n1", chunks)
+        assert b"".join(stored[:2]) == b'{"final_content":""}' and stored[2:] == [b""] * (chunks - 2)
+    asyncio.run(scenario())
+
+
+def test_milestones_only_defers_intermediate_flushes(repository):
+    _seed(repository)
+
+    async def scenario():
+        uow = NotebookTaskUnitOfWork(repository, "u1", "n1", "t1", milestones_only=True)
+        uow.set_status(NotebookStatus.PROCESSING_TEXT, TaskStatus.PROCESSING)
+        assert not await uow.flush()
+        assert (await repository.get_task("t1"))["status"] == "PENDING"
+        uow.set_status(NotebookStatus.COMPLETED, TaskStatus.COMPLETED)
+        assert await uow.flush(milestone=True)
+        assert (await repository.get_task("t1"))["status"] == "COMPLETED"
+        assert (await repository.get_notebook("u1", "n1"))["status"] == "COMPLETED"
+    asyncio.run(scenario())
+
+
+def test_failed_commit_keeps_changes_pending(repository):
+    _seed(repository, task=False) # The task update will fail, and with it the whole batch
+
+    async def scenario():
+        uow = NotebookTaskUnitOfWork(repository, "u1", "n1", "t1", milestones_only=False)
+        uow.set_status(NotebookStatus.FAILED, TaskStatus.FAILED, error_message="boom")
+        with pytest.raises(Exception):
+            await uow.flush()
+        assert uow.is_dirty and uow.flush_count == 0
+        assert (await repository.get_notebook("u1", "n1"))["status"] == "PENDING"
+
+        batch = repository.batch()
+        batch.create_task("t1", {"user_id": "u1", "status": "PENDING"})
+        await batch.commit()
+        assert await uow.flush()
+        assert (await repository.get_task("t1"))["error_message"] == "boom"
+    asyncio.run(scenario())